@@ -0,0 +1,74 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Benchmark in-process extraction against patool, per archive
+
+Both fully extract the archive and compute its manifest digest, patool then
+walks the extracted tree to do so. In-process extraction is also timed without
+writing any files, as when converting, where only the egg-info files are
+written.
+
+Usage: python3 benchmarks/extraction.py SDIST [SDIST ...]
+
+E.g. with a corpus of sdists downloaded by ``pip download --no-binary :all:``.
+'''
+
+from pypi_to_0install.convert._archive import read_archive
+from pypi_to_0install.convert._manifest import Manifest
+from patoolib import extract_archive
+from tempfile import TemporaryDirectory
+from pathlib import Path
+import timeit
+import sys
+
+def in_process(archive, extract=lambda path: True):
+    with TemporaryDirectory() as directory, archive.open('rb') as file:
+        manifest, _ = read_archive(file, archive.name, Path(directory), extract=extract)
+        return manifest.digest(manifest.top_directory or '')
+
+def in_process_no_write(archive):
+    return in_process(archive, extract=lambda path: False)
+    
+def with_patool(archive):
+    with TemporaryDirectory() as directory:
+        extract_archive(str(archive), outdir=directory, interactive=False, verbosity=-1)
+        manifest = Manifest.from_directory(Path(directory))
+        return manifest.digest(manifest.top_directory or '')
+    
+def main():
+    archives = [Path(path) for path in sys.argv[1:]]
+    if not archives:
+        sys.exit(__doc__)
+    repeat = 5
+    print('{:>10} {:>12} {:>12} {:>12}  {}'.format('size (kB)', 'patool', 'in-process', 'no writes', 'archive'))
+    totals = [0.0, 0.0, 0.0]
+    for archive in archives:
+        times = [
+            min(timeit.repeat(lambda: extract(archive), number=1, repeat=repeat))
+            for extract in (with_patool, in_process, in_process_no_write)
+        ]
+        # Note: the digests can differ in mtimes of directories which do not
+        # exist in the archive, so they are not compared
+        for i, time in enumerate(times):
+            totals[i] += time
+        print('{:>10.0f} {:>11.1f}ms {:>11.1f}ms {:>11.1f}ms  {}'.format(archive.stat().st_size / 1000, *[time * 1000 for time in times], archive.name))
+    means = [total / len(archives) * 1000 for total in totals]
+    print('{:>10} {:>11.1f}ms {:>11.1f}ms {:>11.1f}ms  mean of {} archives'.format('', *means, len(archives)))
+    
+if __name__ == '__main__':
+    main()
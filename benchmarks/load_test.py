@@ -0,0 +1,91 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Load test pypi_to_0install end to end against a stub PyPI
+
+Serves a synthetic index with stub_pypi, runs pypi_to_0install's main on it
+in a new directory and reports the time taken and the number of feeds
+written. A second run, in which no package changed, is timed as well.
+
+Usage: python3 benchmarks/load_test.py COUNT [options]
+
+E.g. ``python3 benchmarks/load_test.py 10000 --versions 5 --fan-out 3``. Any
+options after ``--`` are passed to pypi_to_0install.
+'''
+
+from stub_pypi import StubPyPI, add_index_arguments, index_from_arguments
+from tempfile import TemporaryDirectory
+from pathlib import Path
+import subprocess
+import threading
+import argparse
+import time
+import sys
+import os
+
+repository_root = Path(__file__).resolve().parent.parent
+
+def run(server, directory, extra_args):
+    '''
+    Run pypi_to_0install, return the seconds it took
+    '''
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (str(repository_root), os.environ.get('PYTHONPATH')))))
+    start = time.monotonic()
+    subprocess.check_call(
+        [
+            sys.executable, str(repository_root / 'pypi_to_0install' / 'main.py'),
+            '--directory', str(directory),
+            '--pypi', server.url + 'pypi',
+            '--pypi-mirror', server.url,
+            '--pypi-rate', '100000',
+            '--pypi-max-rate', '100000',
+        ] + extra_args,
+        env=environment,
+    )
+    return time.monotonic() - start
+
+def main():
+    argv = sys.argv[1:]
+    extra_args = []
+    if '--' in argv:
+        extra_args = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keep', metavar='DIRECTORY', help='Run in DIRECTORY instead of in a temporary directory')
+    add_index_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    server = StubPyPI(index_from_arguments(args))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with TemporaryDirectory() as temporary_directory:
+            directory = Path(args.keep or temporary_directory)
+            first = run(server, directory, extra_args)
+            feeds = len(list((directory / 'feeds').glob('*.xml')))
+            second = run(server, directory, extra_args)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+    print('{} packages, {} feeds written'.format(args.count, feeds))
+    print('First run:  {:.1f}s, {:.1f} packages/s'.format(first, args.count / first))
+    print('Second run: {:.1f}s (nothing changed)'.format(second))
+    
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Benchmark getting the classifiers of PKG-INFO files
+
+Compares parse_metadata on the bytes in memory to pkginfo.UnpackedSDist on the
+egg-info directory, which was used before. pkginfo is no longer a requirement;
+if it is not installed (``pip install pkginfo``), only parse_metadata is timed.
+
+Usage: python3 benchmarks/metadata.py PKG-INFO [PKG-INFO ...]
+'''
+
+from pypi_to_0install.convert._metadata import parse_metadata
+from tempfile import TemporaryDirectory
+from pathlib import Path
+import timeit
+import sys
+
+try:
+    import pkginfo
+except ImportError:
+    pkginfo = None
+
+def main():
+    files = [Path(path) for path in sys.argv[1:]]
+    if not files:
+        sys.exit(__doc__)
+    number = 100
+    with TemporaryDirectory() as directory:
+        egg_info = Path(directory) / 'pkg.egg-info'
+        egg_info.mkdir()
+        print('{:>10} {:>12} {:>12}  {}'.format('size (kB)', 'pkginfo', 'in memory', 'file'))
+        totals = [0.0, 0.0]
+        for file in files:
+            data = file.read_bytes()
+            (egg_info / 'PKG-INFO').write_bytes(data)
+            functions = (
+                pkginfo and (lambda: pkginfo.UnpackedSDist(str(egg_info)).classifiers),
+                lambda: parse_metadata(data, ['Classifier']).get('classifier', []),
+            )
+            times = [
+                function and min(timeit.repeat(function, number=number, repeat=5)) / number
+                for function in functions
+            ]
+            for i, time in enumerate(times):
+                if time is not None:
+                    totals[i] += time
+            print('{:>10.1f} {} {}  {}'.format(len(data) / 1000, *map(_format_time, times), file))
+        means = [None if function is None else total / len(files) for function, total in zip(functions, totals)]
+        print('{:>10} {} {}  mean of {} files'.format('', *map(_format_time, means), len(files)))
+
+def _format_time(time):
+    '''
+    Format seconds as ms in a column, '-' if None
+    '''
+    if time is None:
+        return '{:>12}'.format('-')
+    return '{:>10.3f}ms'.format(time * 1000)
+    
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Benchmark how long the 0install solver takes to select from our feeds
+
+The feeds are copied to a temporary directory as local feeds: references
+between them (``<requires interface>`` and ``<feed src>``) are rewritten to
+the paths of the copies, so no feed is downloaded. The solver does not
+download implementations either, it only selects them. For each package, the
+solver is run on a new configuration, so the time includes parsing the feeds
+as it would on a client.
+
+For each package, reports the time to solve and, over the feeds reachable from
+it, their total size, number of implementations and number of ranges in
+version expressions (``range | range`` counts 2).
+
+Usage: python3 benchmarks/solve_time.py FEEDS_DIRECTORY [PACKAGE ...]
+
+FEEDS_DIRECTORY is e.g. the ``feeds`` directory of a run of
+benchmarks/load_test.py with ``--keep DIRECTORY``. Packages are given by their
+feed's file name without ``.xml``; by default, the packages with the most
+feeds reachable from them are used.
+'''
+
+from zeroinstall.injector import model
+from zeroinstall.injector.config import load_config
+from zeroinstall.injector.driver import Driver
+from zeroinstall.injector.requirements import Requirements
+from tempfile import TemporaryDirectory
+from collections import namedtuple
+from pathlib import Path
+from lxml import etree
+import argparse
+import timeit
+import sys
+
+_nsmap = {'zi': 'http://zero-install.sourceforge.net/2004/injector/interface'}
+
+_FeedInfo = namedtuple('_FeedInfo', 'size implementations ranges references')
+
+def localize(feeds_directory, directory):
+    '''
+    Copy feeds as local feeds which reference each other by path
+    
+    Returns
+    -------
+    {name :: str : _FeedInfo}
+        Info of each copy by name, its file name without ``.xml``
+    '''
+    feed_files = sorted(feeds_directory.glob('*.xml'))
+    trees = {}
+    paths = {}  # uri -> path of copy
+    for feed_file in feed_files:
+        tree = etree.parse(str(feed_file))
+        trees[feed_file.stem] = tree
+        path = directory / feed_file.name
+        uri = tree.getroot().get('uri')
+        if uri:
+            paths[uri] = str(path)
+    infos = {}
+    for name, tree in trees.items():
+        root = tree.getroot()
+        root.attrib.pop('uri', None)
+        references = set()
+        for reference in root.xpath('//zi:requires/@interface | zi:feed/@src', namespaces=_nsmap):
+            path = paths.get(str(reference))
+            if path:
+                reference.getparent().set(reference.attrname, path)
+                references.add(Path(path).stem)
+        for feed_for in root.findall('zi:feed-for', namespaces=_nsmap):
+            root.remove(feed_for)  # Note: only used when registering a feed, not when solving
+        contents = etree.tostring(tree, encoding='utf-8', xml_declaration=True)
+        (directory / (name + '.xml')).write_bytes(contents)
+        ranges = sum(
+            len(version.split('|'))
+            for version in root.xpath('//zi:requires/@version', namespaces=_nsmap)
+        )
+        implementations = len(root.xpath('//zi:implementation', namespaces=_nsmap))
+        infos[name] = _FeedInfo(len(contents), implementations, ranges, references)
+    return infos
+
+def closure(infos, name):
+    '''
+    Get names of the feeds reachable from a feed, including itself
+    '''
+    reached = set()
+    todo = [name]
+    while todo:
+        name = todo.pop()
+        if name in reached or name not in infos:
+            continue
+        reached.add(name)
+        todo.extend(infos[name].references)
+    return reached
+
+def solve(feed_file):
+    '''
+    Select implementations for feed with a new configuration
+    
+    Returns
+    -------
+    bool
+        Whether a solution was found
+    '''
+    config = load_config()
+    config.network_use = model.network_full  # Note: offline, implementations which are not in the cache would be rejected
+    requirements = Requirements(str(feed_file))
+    driver = Driver(config=config, requirements=requirements)
+    driver.solver.solve_for(requirements)
+    return driver.solver.ready
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('feeds_directory', metavar='FEEDS_DIRECTORY')
+    parser.add_argument('packages', nargs='*', metavar='PACKAGE')
+    parser.add_argument('--count', type=int, default=10, help='Number of packages to pick if none are given. Default: %(default)s.')
+    parser.add_argument('--repeat', type=int, default=3, help='Solves per package, the fastest is reported. Default: %(default)s.')
+    args = parser.parse_args()
+    with TemporaryDirectory() as directory:
+        directory = Path(directory)
+        infos = localize(Path(args.feeds_directory), directory)
+        packages = args.packages
+        if not packages:
+            packages = sorted(infos, key=lambda name: (-len(closure(infos, name)), name))[:args.count]
+        print('{:>10} {:>6} {:>10} {:>8} {:>8} {:>7}  {}'.format('solve', 'found', 'size (kB)', 'feeds', 'impls', 'ranges', 'package'))
+        not_found = []
+        for name in packages:
+            feed_file = directory / (name + '.xml')
+            found = solve(feed_file)
+            if not found:
+                not_found.append(name)
+            time = min(timeit.repeat(lambda: solve(feed_file), number=1, repeat=args.repeat))
+            reached = [infos[name_] for name_ in closure(infos, name)]
+            print('{:>8.1f}ms {:>6} {:>10.1f} {:>8} {:>8} {:>7}  {}'.format(
+                time * 1000, 'yes' if found else 'no',
+                sum(info.size for info in reached) / 1000, len(reached),
+                sum(info.implementations for info in reached),
+                sum(info.ranges for info in reached),
+                name,
+            ))
+        if not_found:
+            # Note: a failing solve may stop early, its time says little
+            print('No solution found for: {}'.format(' '.join(not_found)), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
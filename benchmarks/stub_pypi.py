@@ -0,0 +1,314 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Local stand-in for PyPI serving synthetic packages, for scale testing
+
+Serves the XML-RPC methods used by pypi_to_0install (at ``/pypi``) and the
+sdists of the packages (at ``/packages/``). Packages are generated
+deterministically from a seed, on demand, so even hundreds of thousands of
+packages take little memory.
+
+Usage: python3 benchmarks/stub_pypi.py [--port PORT] COUNT [options]
+
+Then run pypi_to_0install with ``--pypi http://127.0.0.1:PORT/pypi
+--pypi-mirror http://127.0.0.1:PORT/``.
+'''
+
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+from socketserver import ThreadingMixIn
+from functools import lru_cache
+import argparse
+import datetime
+import hashlib
+import tarfile
+import random
+import gzip
+import attr
+import io
+
+_classifiers = [
+    'Environment :: Console',
+    'License :: OSI Approved :: MIT License',
+    'License :: OSI Approved :: BSD License',
+    'Natural Language :: English',
+    'Natural Language :: Dutch',
+    'Programming Language :: Python :: 3',
+]
+
+@attr.s(frozen=True)
+class Release(object):
+    version = attr.ib()  # str
+    requires = attr.ib()  # [str], requirement specifiers, e.g. ['Pkg_000001>=1.0']
+    classifiers = attr.ib()  # [str]
+    upload_time = attr.ib()  # datetime.datetime
+
+class SyntheticIndex(object):
+    
+    '''
+    Synthetic package index
+    
+    Package ``i`` is named ``Pkg_{i:06d}`` (so its canonical name differs) and
+    has changelog serial ``i + 1``. It depends on up to `fan_out` packages with
+    a lower index, so the dependency graph has no cycles.
+    
+    Parameters
+    ----------
+    count : int
+        Number of packages
+    versions : int
+        Number of releases per package
+    fan_out : int
+        Number of dependencies per release
+    description_size : int
+        Characters in each description
+    archive_size : int
+        Approximate size in bytes of each sdist. The sdists contain random
+        data, so they do not compress.
+    seed : int
+    '''
+    
+    def __init__(self, count, versions=3, fan_out=2, description_size=1000, archive_size=10000, seed=0):
+        self.count = count
+        self._versions = versions
+        self._fan_out = fan_out
+        self._description_size = description_size
+        self._archive_size = archive_size
+        self._seed = seed
+        self.names = ['Pkg_{:06d}'.format(i) for i in range(count)]
+        self._indices = {name: i for i, name in enumerate(self.names)}
+    
+    def _random(self, *key):
+        return random.Random('{} {}'.format(self._seed, ' '.join(map(str, key))))
+    
+    @lru_cache(maxsize=1024)
+    def releases(self, name):
+        '''
+        Get releases of package
+        
+        Returns
+        -------
+        [Release]
+            Sorted by version, oldest first
+        '''
+        index = self._indices[name]
+        random_ = self._random(name)
+        releases = []
+        for minor in range(self._versions):
+            version = '1.{}'.format(minor)
+            dependencies = random_.sample(range(index), min(index, self._fan_out))
+            requires = ['{}>={}'.format(self.names[dependency], '1.0') for dependency in sorted(dependencies)]
+            classifiers = sorted(random_.sample(_classifiers, 3))
+            upload_time = datetime.datetime(2017, 1, 1) + datetime.timedelta(days=index % 365, hours=minor)
+            releases.append(Release(version, requires, classifiers, upload_time))
+        return releases
+    
+    def release(self, name, version):
+        for release in self.releases(name):
+            if release.version == version:
+                return release
+        raise KeyError((name, version))
+    
+    def description(self, name):
+        text = 'Synthetic package {}. '.format(name)
+        return (text * (self._description_size // len(text) + 1))[:self._description_size]
+    
+    @lru_cache(maxsize=256)
+    def sdist(self, name, version):
+        '''
+        Get sdist of release
+        
+        Returns
+        -------
+        bytes
+            Contents of the ``.tar.gz``
+        '''
+        release = self.release(name, version)
+        top = '{}-{}'.format(name, version)
+        pkg_info = (
+            'Metadata-Version: 1.1\nName: {}\nVersion: {}\nSummary: Synthetic package\n'
+            .format(name, version)
+            + ''.join('Classifier: {}\n'.format(classifier) for classifier in release.classifiers)
+        ).encode()
+        files = [
+            ('PKG-INFO', pkg_info),
+            ('setup.py', b'from setuptools import setup\nsetup()\n'),
+            ('{}.egg-info/PKG-INFO'.format(name), pkg_info),
+            ('{}.egg-info/requires.txt'.format(name), ''.join(requirement + '\n' for requirement in release.requires).encode()),
+            ('data.bin', self._random(name, version).getrandbits(8 * self._archive_size + 8).to_bytes(self._archive_size + 1, 'little')[:-1]),
+        ]
+        output = io.BytesIO()
+        with gzip.GzipFile(fileobj=output, mode='wb', mtime=0) as compressed:
+            with tarfile.open(fileobj=compressed, mode='w') as tar:
+                for path, contents in files:
+                    info = tarfile.TarInfo('{}/{}'.format(top, path))
+                    info.size = len(contents)
+                    info.mtime = 1483228800
+                    info.mode = 0o644
+                    tar.addfile(info, io.BytesIO(contents))
+        return output.getvalue()
+    
+    def sdist_path(self, name, version):
+        return 'source/{}/{}/{}-{}.tar.gz'.format(name[0], name, name, version)
+
+class XMLRPCInterface(object):
+    
+    '''
+    The XML-RPC methods of PyPI, backed by a SyntheticIndex
+    
+    Parameters
+    ----------
+    index : SyntheticIndex
+    base_url : str
+        URL the server is reachable at, ending in a slash
+    '''
+    
+    def __init__(self, index, base_url):
+        self._index = index
+        self._base_url = base_url
+    
+    def package_releases(self, name, show_hidden=False):
+        releases = self._index.releases(name)
+        if not show_hidden:
+            releases = releases[-1:]
+        return [release.version for release in reversed(releases)]
+    
+    def release_data(self, name, version):
+        release = self._index.release(name, version)
+        return {
+            'name': name,
+            'version': version,
+            'summary': 'Synthetic package',
+            'home_page': 'https://example.com/{}'.format(name),
+            'description': self._index.description(name),
+            'classifiers': release.classifiers,
+            'requires_dist': release.requires,
+        }
+    
+    def release_urls(self, name, version):
+        release = self._index.release(name, version)
+        sdist = self._index.sdist(name, version)
+        path = self._index.sdist_path(name, version)
+        return [{
+            'packagetype': 'sdist',
+            'filename': path.rsplit('/', 1)[-1],
+            'path': path,
+            'url': '{}packages/{}'.format(self._base_url, path),
+            'md5_digest': hashlib.md5(sdist).hexdigest(),
+            'size': len(sdist),
+            'upload_time': release.upload_time,
+        }]
+    
+    def list_packages(self):
+        return self._index.names
+    
+    def list_packages_with_serial(self):
+        return {name: i + 1 for i, name in enumerate(self._index.names)}
+    
+    def changelog_last_serial(self):
+        return self._index.count
+    
+    def changelog_since_serial(self, serial):
+        return [
+            (name, None, 1483228800, 'create', i + 1)
+            for i, name in enumerate(self._index.names[serial:], serial)
+        ]
+
+class _RequestHandler(SimpleXMLRPCRequestHandler):
+    
+    rpc_paths = ('/pypi', '/RPC2')
+    
+    def do_GET(self):
+        prefix = '/packages/source/'
+        if self.path.startswith(prefix):
+            try:
+                _, name, file_name = self.path[len(prefix):].split('/')
+                version = file_name[len(name) + 1:-len('.tar.gz')]
+                body = self.server.index.sdist(name, version)
+            except (ValueError, KeyError):
+                body = None
+            if body is not None:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+        self.send_error(404)
+
+class StubPyPI(ThreadingMixIn, SimpleXMLRPCServer):
+    
+    '''
+    Threaded HTTP server serving a SyntheticIndex
+    
+    Use ``serve_forever`` to serve, e.g. in a thread.
+    
+    Parameters
+    ----------
+    index : SyntheticIndex
+    port : int
+        Port to listen on, 0 for any free port
+    '''
+    
+    daemon_threads = True
+    
+    def __init__(self, index, port=0):
+        super().__init__(('127.0.0.1', port), requestHandler=_RequestHandler, logRequests=False, allow_none=True)
+        self.index = index
+        self.register_introspection_functions()
+        self.register_instance(XMLRPCInterface(index, self.url))
+    
+    @property
+    def url(self):
+        '''
+        URL of the server, ending in a slash
+        '''
+        return 'http://127.0.0.1:{}/'.format(self.server_address[1])
+
+def add_index_arguments(parser):
+    '''
+    Add the SyntheticIndex parameters as arguments to an ArgumentParser
+    '''
+    parser.add_argument('count', type=int, help='Number of packages')
+    parser.add_argument('--versions', type=int, default=3, help='Releases per package. Default: %(default)s.')
+    parser.add_argument('--fan-out', type=int, default=2, help='Dependencies per release. Default: %(default)s.')
+    parser.add_argument('--description-size', type=int, default=1000, help='Characters per description. Default: %(default)s.')
+    parser.add_argument('--archive-size', type=int, default=10000, help='Approximate bytes per sdist. Default: %(default)s.')
+    parser.add_argument('--seed', type=int, default=0)
+
+def index_from_arguments(args):
+    return SyntheticIndex(
+        args.count, versions=args.versions, fan_out=args.fan_out,
+        description_size=args.description_size, archive_size=args.archive_size, seed=args.seed
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8080)
+    add_index_arguments(parser)
+    args = parser.parse_args()
+    server = StubPyPI(index_from_arguments(args), args.port)
+    print('Serving {} packages at {}pypi'.format(args.count, server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
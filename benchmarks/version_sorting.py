@@ -0,0 +1,57 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Benchmark sort_versions against sorting one comparison at a time
+
+Usage: python3 benchmarks/version_sorting.py [version_count ...]
+'''
+
+from pypi_to_0install.convert._version import parse_version, sort_versions
+import random
+import timeit
+import sys
+
+def generate_versions(count, seed=0):
+    '''
+    Generate distinct Python versions, in random order
+    '''
+    random_ = random.Random(seed)
+    versions = set()
+    while len(versions) < count:
+        release = '.'.join(str(random_.randrange(20)) for _ in range(random_.randint(1, 4)))
+        modifier = random_.choice(('', '', '', 'a{}', 'b{}', 'rc{}', '.post{}', '.dev{}')).format(random_.randrange(5))
+        versions.add(release + modifier)
+    versions = list(versions)
+    random_.shuffle(versions)
+    return versions
+
+def main():
+    counts = [int(count) for count in sys.argv[1:]] or [10, 100, 1000, 5000]
+    print('{:>8} {:>16} {:>16} {:>16}'.format('versions', 'max(key=parse)', 'sorted(key=parse)', 'sort_versions'))
+    for count in counts:
+        versions = generate_versions(count)
+        repeat = max(1, 1000 // count)
+        max_time = timeit.timeit(lambda: max(versions, key=parse_version), number=repeat) / repeat
+        sorted_time = timeit.timeit(lambda: sorted(versions, key=parse_version), number=repeat) / repeat
+        batch_time = timeit.timeit(lambda: sort_versions(versions), number=repeat) / repeat
+        expected = [parse_version(version) for version in sorted(versions, key=parse_version)]
+        assert [parse_version(version) for version in sort_versions(versions).sorted] == expected  # Note: equal versions may be ordered differently
+        print('{:>8} {:>15.4f}s {:>15.4f}s {:>15.4f}s'.format(count, max_time, sorted_time, batch_time))
+        
+if __name__ == '__main__':
+    main()
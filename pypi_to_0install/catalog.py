@@ -0,0 +1,251 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Catalog of all feeds, maintained incrementally
+
+The catalog is split in shards by `shard_of` the ZI name. Only shards with
+changed entries are regenerated, so publishing the catalog costs O(changed)
+rather than O(all feeds).
+'''
+
+from pypi_to_0install.sharding import shard_of, ShardConflict
+from pypi_to_0install.various import zi, zi_nsmap, write_file
+from zeroinstall.injector.versions import parse_version as zi_parse_version
+from collections import OrderedDict
+from lxml.builder import ElementMaker
+from lxml import etree
+import logging
+import attr
+import io
+import re
+
+logger = logging.getLogger(__name__)
+
+catalog_nsmap = {None: 'http://0install.de/schema/injector/catalog'}
+pypi_nsmap = {'pypi': 'https://timdiels.github.io/pypi-to-0install/catalog'}
+_xpath_nsmap = {'zi': zi_nsmap[None]}
+_zi = ElementMaker(namespace=zi_nsmap[None], nsmap=dict(zi_nsmap, **pypi_nsmap))  # zi, with the pypi prefix
+
+@attr.s(frozen=True)
+class CatalogEntry(object):
+    
+    '''
+    Catalog entry of a feed
+    '''
+    
+    uri = attr.ib()  # str
+    name = attr.ib()  # str
+    summary = attr.ib()  # str or None
+    homepage = attr.ib()  # str or None
+    version = attr.ib()  # str or None, latest ZI version in the feed
+    
+    @classmethod
+    def from_feed(cls, feed):
+        '''
+        Get catalog entry from feed
+        
+        Parameters
+        ----------
+        feed : lxml.etree.ElementTree
+            Feed as returned by `convert`
+        '''
+        interface = feed.getroot()
+        def text(tag):
+            return interface.findtext('zi:' + tag, namespaces=_xpath_nsmap)
+        versions = interface.xpath('//zi:implementation/@version', namespaces=_xpath_nsmap)
+        version = max(versions, key=zi_parse_version) if versions else None
+        return cls(interface.get('uri'), text('name'), text('summary'), text('homepage'), version)
+    
+    @classmethod
+    def from_element(cls, interface):
+        '''
+        Get catalog entry from <interface> element of a catalog
+        
+        Inverse of `to_element`.
+        '''
+        def text(tag):
+            return interface.findtext('zi:' + tag, namespaces=_xpath_nsmap)
+        version = interface.get('{{{}}}latest-version'.format(pypi_nsmap['pypi']))
+        return cls(interface.get('uri'), text('name'), text('summary'), text('homepage'), version)
+
+    def to_element(self):
+        '''
+        Get <interface> element of the catalog
+        '''
+        attributes = OrderedDict([('uri', self.uri)])
+        if self.version:
+            attributes['{{{}}}latest-version'.format(pypi_nsmap['pypi'])] = self.version
+        interface = _zi.interface(attributes)
+        interface.append(zi.name(self.name))
+        if self.summary:
+            interface.append(zi.summary(self.summary))
+        if self.homepage:
+            interface.append(zi.homepage(self.homepage))
+        return interface
+
+class Catalog(object):
+    
+    '''
+    Catalog of all feeds, as a set of shard files
+    
+    The entries and which shards are out of date are kept in the state, so
+    a shard that was not written due to a crash is written in the next run.
+    
+    Parameters
+    ----------
+    state : State
+    directory : pathlib.Path
+        Directory to write the catalog files to, ``{shard}.xml``
+    shard_count : int
+        Number of shard files. When changed, all shards are regenerated.
+    '''
+    
+    def __init__(self, state, directory, shard_count=16):
+        self._state = state
+        self._directory = directory
+        self._shard_count = shard_count
+        if state.catalog_shard_count != shard_count:
+            state.reshard_catalog(shard_count, lambda zi_name: shard_of(zi_name, shard_count))
+    
+    def update(self, pypi_name, zi_name, feed):
+        '''
+        Update catalog entry of a converted feed
+        
+        Parameters
+        ----------
+        pypi_name : str
+        zi_name : str
+        feed : lxml.etree.ElementTree
+        '''
+        entry = CatalogEntry.from_feed(feed)
+        self._state.set_catalog_entry(pypi_name, zi_name, shard_of(zi_name, self._shard_count), attr.astuple(entry))
+    
+    def write(self, publisher=None):
+        '''
+        Write the shards whose entries changed and remove obsolete shards
+        
+        Parameters
+        ----------
+        publisher : FeedPublisher or None
+            If given, changed catalog files are published to
+            ``catalog/{shard}.xml``
+        '''
+        self._directory.mkdir(parents=True, exist_ok=True)
+        shards = self._state.dirty_catalog_shards()
+        for shard in shards:
+            entries = (CatalogEntry(*row) for row in self._state.catalog_entries(shard))
+            contents = serialize_catalog(entries)
+            path = self._directory / '{}.xml'.format(shard)
+            write_file(path, contents)
+            if publisher:
+                # Note: the shard stays dirty until it is in the repository
+                publisher.add('catalog/' + path.name, contents)
+                publisher.when_committed(lambda shard=shard: self._state.clean_catalog_shard(shard))
+            else:
+                self._state.clean_catalog_shard(shard)
+        
+        # Remove shards left over by a higher shard_count
+        for path in self._directory.glob('*.xml'):
+            match = re.fullmatch(r'(\d+)\.xml', path.name)
+            if match and int(match.group(1)) >= self._shard_count:
+                path.unlink()
+                if publisher:
+                    publisher.remove('catalog/' + path.name)
+        
+        if shards:
+            logger.info('Wrote {} of {} catalog shards'.format(len(shards), self._shard_count))
+
+def merge_catalogs(shard_directories, directory):
+    '''
+    Merge catalog directories of shards into a single catalog directory
+    
+    Catalog files of the same name are combined, entries ordered by URI. Only
+    files whose contents changed are written. Files which are in none of the
+    shards are removed.
+    
+    Parameters
+    ----------
+    shard_directories : iterable(pathlib.Path)
+        Catalog directories of shards
+    directory : pathlib.Path
+        Catalog directory to merge into
+    
+    Returns
+    -------
+    changed_files : [pathlib.Path]
+        Files in `directory` which were added or changed
+    removed_files : [pathlib.Path]
+        Files which were removed from `directory`
+    
+    Raises
+    ------
+    ShardConflict
+        If more than one shard has an entry with the same URI
+    '''
+    shard_directories = list(shard_directories)
+    directory.mkdir(parents=True, exist_ok=True)
+    catalogs = OrderedDict()  # file name -> {uri :: str : CatalogEntry}
+    sources = {}  # uri -> shard directory
+    for shard_directory in shard_directories:
+        for shard_file in sorted(shard_directory.glob('*.xml')):
+            entries = catalogs.setdefault(shard_file.name, {})
+            for interface in etree.parse(str(shard_file)).getroot().iterchildren(zi.interface().tag):
+                entry = CatalogEntry.from_element(interface)
+                if entry.uri in sources:
+                    raise ShardConflict(
+                        '{} is in multiple shards: {} and {}'
+                        .format(entry.uri, sources[entry.uri], shard_directory)
+                    )
+                sources[entry.uri] = shard_directory
+                entries[entry.uri] = entry
+    changed_files = []
+    for name, entries in sorted(catalogs.items()):
+        contents = serialize_catalog(entries[uri] for uri in sorted(entries))
+        file_ = directory / name
+        if file_.exists() and file_.read_bytes() == contents:
+            continue
+        write_file(file_, contents)
+        changed_files.append(file_)
+    removed_files = [file_ for file_ in sorted(directory.glob('*.xml')) if file_.name not in catalogs]
+    for file_ in removed_files:
+        file_.unlink()
+    logger.info('Merged catalogs, {} files changed, {} removed'.format(len(changed_files), len(removed_files)))
+    return changed_files, removed_files
+
+def serialize_catalog(entries):
+    '''
+    Serialize catalog, streaming its entries
+    
+    Parameters
+    ----------
+    entries : iterable(CatalogEntry)
+    
+    Returns
+    -------
+    bytes
+    '''
+    output = io.BytesIO()
+    with etree.xmlfile(output, encoding='utf-8') as file:
+        file.write_declaration()
+        nsmap = dict(catalog_nsmap, **pypi_nsmap)
+        with file.element('{{{}}}catalog'.format(catalog_nsmap[None]), nsmap=nsmap):
+            file.write('\n')
+            for entry in entries:
+                file.write(entry.to_element(), pretty_print=True)
+    output.write(b'\n')
+    return output.getvalue()
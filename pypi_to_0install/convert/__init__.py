@@ -21,20 +21,28 @@ from contextlib import contextmanager
 import contextlib
 import attr
 import pypandoc
-from patoolib import extract_archive
 from tempfile import TemporaryDirectory
-from urllib.request import urlretrieve
+from urllib.request import urlopen
 import urllib.error
-import pkginfo
-from pypi_to_0install.various import zi, zi_nsmap, canonical_name
-from ._version import parse_version
+from pypi_to_0install.various import zi, zi_nsmap
+from ._version import parse_version, sort_versions, InvalidVersion
 from ._specifiers import convert_specifiers
+from ._metadata import parse_metadata, decode
+from ._archive import HashingReader, UnsupportedArchive, ExtractionLimits, ExtractionLimitExceeded, read_archive, extract_with_patool
+from ._group import group_implementations, ungroup_implementation
+from ._split import SplitSettings, split_feed, sub_feed_names
 import logging
-from collections import defaultdict
+import hashlib
+from collections import defaultdict, OrderedDict
 import pkg_resources
 
 logger = logging.getLogger(__name__)
 
+_xpath_nsmap = {'zi': zi_nsmap[None]}
+
+class InvalidDistribution(Exception):
+    pass
+
 def convert(context, pypi_name, zi_name, old_feed):
     '''
     Convert PyPI package to ZI feed
@@ -44,23 +52,38 @@ def convert(context, pypi_name, zi_name, old_feed):
     lxml.etree.ElementTree
     '''
     show_hidden = True
-    versions = context.pypi.package_releases(pypi_name, show_hidden)  # returns [version :: str]
-    max_version = max(versions, key=parse_version)
-    release_data = context.pypi.release_data(pypi_name, max_version)
+    versions = sort_versions(context.pypi.package_releases(pypi_name, show_hidden))  # package_releases returns [version :: str]
+    for version, reason in sorted(versions.invalid.items()):
+        context.feed_logger.warning('Ignoring invalid version: {}'.format(reason))
+    if not versions.sorted:
+        raise InvalidVersion('Package has no valid versions')
+    release_data = context.pypi.release_data(pypi_name, versions.max)
     
     # Create feed with general info
     feed = convert_general(context, pypi_name, zi_name, release_data)
     
     # Add <implementation>s to feed
-    for version in versions:
+    #
+    # Note: versions and release_urls are iterated in canonical order (by
+    # version, then by id) such that converting an unchanged package yields an
+    # identical feed file
+    for version in versions.sorted:
         zi_version = parse_version(version).format_zi()
-        for release_url in context.pypi.release_urls(pypi_name, version):
+        release_urls = sorted(context.pypi.release_urls(pypi_name, version), key=lambda release_url: release_url['path'])
+        for release_url in release_urls:
             package_type = release_url['packagetype']
             action = 'Converting' if package_type == 'sdist' else 'Skipping' 
             logger.info('{} {} distribution: {}'.format(action, package_type, release_url['filename']))
             if action == 'Converting':
-                convert_distribution(context, pypi_name, zi_name, zi_version, feed, old_feed, release_data, release_url)
-                
+                result = convert_distribution(context, pypi_name, zi_name, zi_version, feed, old_feed, release_data, release_url)
+            else:
+                result = 'skipped'
+            if context.state:
+                context.state.set_distribution_result(pypi_name, release_url['path'], result)
+    
+    # Factor what consecutive implementations share into <group>s
+    group_implementations(feed.getroot())
+    
     return feed
 
 _languages = {
@@ -124,10 +147,10 @@ def convert_general(context, pypi_name, zi_name, release_data):
     '''
     Populate feed with general info from latest release_data
     '''
-    interface = zi.interface(**{
-        'uri': context.feeds_uri + zi_name + '.xml',
-        'min-injector-version': '0.48', #TODO check what we use, set accordingly
-    })
+    interface = zi.interface(OrderedDict((
+        ('uri', context.feed_uri(zi_name)),
+        ('min-injector-version', '0.48'), #TODO check what we use, set accordingly
+    )))
     interface.append(zi.name(zi_name))
     
     summary = release_data.get('summary')
@@ -153,43 +176,66 @@ def convert_general(context, pypi_name, zi_name, release_data):
     return etree.ElementTree(interface)
 
 def convert_distribution(context, pypi_name, zi_name, zi_version, feed, old_feed, release_data, release_url): #TODO rm unused params
+    '''
+    Add <implementation> of distribution to feed
+    
+    Returns
+    -------
+    str
+        ``reused`` if the implementation was taken from the old feed,
+        ``converted`` otherwise
+    '''
     # Add from old_feed if it already has it (distributions can be deleted, but not changed or reuploaded)
-    implementations = old_feed.xpath('//implementation[@id={!r}]'.format(release_url['path']))
-    if implementations: #TODO test this, e.g. doe we have to add xpath(namespaces=nsmap)?
+    implementations = old_feed.xpath('//zi:implementation[@id=$id]', namespaces=_xpath_nsmap, id=release_url['path'])
+    if implementations: #TODO test this
         context.feed_logger.info('Reusing from old feed')
-        feed.append(implementations[0])
-        return
+        feed.getroot().append(ungroup_implementation(implementations[0]))  # Note: it may be in a <group>, convert groups again at the end
+        return 'reused'
     
     # Not in old feed, need to convert.
-    with unpack_distribution(context, release_url) as distribution_directory:
+    with unpack_distribution(context, release_url) as distribution:
         # Create <implementation>
         context.feed_logger.debug('Converting')
-        egg_info_directory = next(distribution_directory.glob('*.egg-info'))
-        package = pkginfo.UnpackedSDist(str(egg_info_directory))
+        if distribution.egg_info is None:
+            raise InvalidDistribution('Distribution has no egg-info directory: {}'.format(release_url['filename']))
+        if 'PKG-INFO' not in distribution.egg_info:
+            raise InvalidDistribution('Distribution has no PKG-INFO in its egg-info directory: {}'.format(release_url['filename']))
+        classifiers = parse_metadata(distribution.egg_info['PKG-INFO'], ['Classifier']).get('classifier', [])
         
-        implementation = zi.implementation(
-            id=release_url['path'],
-            version=zi_version,
-            released=release_url['upload_time'].strftime('%Y-%m-%d'),
-            stability=stability(release_data['version']),
-            langs=' '.join(
+        # Note: attributes are passed in a fixed order, lxml keeps them in the
+        # order they are set
+        implementation = zi.implementation(OrderedDict((
+            ('id', release_url['path']),
+            ('version', zi_version),
+            ('released', release_url['upload_time'].strftime('%Y-%m-%d')),
+            ('stability', stability(release_data['version'])),
+            ('langs', ' '.join(sorted(set(
                 _languages[classifier]
-                for classifier in package.classifiers
+                for classifier in classifiers
                 if classifier in _languages
-            ),
-        )
+            )))),
+        )))
         
-        licenses = sorted(classifier for classifier in package.classifiers if classifier.startswith('License ::'))
+        licenses = sorted(classifier for classifier in classifiers if classifier.startswith('License ::'))
         if licenses:
             implementation.set('license', licenses[0])
             
+        # Add how to get it
+        implementation.append(zi('manifest-digest', sha256new=distribution.manifest_digest[len('sha256new_'):]))
+        archive = zi.archive(OrderedDict((
+            ('href', release_url['url']),
+            ('size', str(distribution.size)),
+        )))
+        if distribution.extract:
+            archive.set('extract', distribution.extract)
+        implementation.append(archive)
+        
         # Convert dependencies
-        convert_dependencies(context, implementation, egg_info_directory)
+        convert_dependencies(context, implementation, distribution.egg_info)
         
         # Add to feed
         feed.getroot().append(implementation)
-        print((etree.tostring(feed, pretty_print=True)).decode())
-        assert False
+        return 'converted'
 
 def stability(pypi_version):
     pypi_version = parse_version(pypi_version)
@@ -200,29 +246,124 @@ def stability(pypi_version):
     else:
         return 'stable'
         
+@attr.s(frozen=True)
+class UnpackedDistribution(object):
+    egg_info = attr.ib()  # {name :: str : contents :: bytes} of the files needed for conversion in the egg-info directory, None if it has none
+    manifest_digest = attr.ib()  # str, sha256new digest of the distribution
+    extract = attr.ib()  # str or None, the directory the files are in inside the archive, see <archive extract>
+    size = attr.ib()  # int, size of the archive in bytes
+    
+@contextmanager
+def _scratch_directory(context):
+    '''
+    Borrow a directory from context.workspace, or a temporary directory if none
+    '''
+    if context.workspace:
+        with context.workspace.directory() as directory:
+            yield directory
+    else:
+        with TemporaryDirectory() as directory:
+            yield Path(directory)
+            
+_egg_info_files = {'PKG-INFO', 'requires.txt', 'depends.txt'}
+
+def _is_egg_info_file(path):
+    '''
+    Whether path is a file needed for conversion in the egg-info directory of
+    an sdist
+    '''
+    parts = path.split('/')
+    return len(parts) == 3 and parts[1].endswith('.egg-info') and parts[2] in _egg_info_files
+
+def _egg_info(files, top_directory):
+    '''
+    Get files of the egg-info directory in the top directory
+    
+    Parameters
+    ----------
+    files : {path :: str : bytes}
+        Files for which `_is_egg_info_file`
+    top_directory : str or None
+    
+    Returns
+    -------
+    {name :: str : bytes} or None
+        None if there is no such egg-info directory. If there are multiple,
+        the first by name.
+    '''
+    directories = defaultdict(dict)
+    for path, contents in files.items():
+        top, directory, name = path.split('/')
+        if top == top_directory:
+            directories[directory][name] = contents
+    if not directories:
+        return None
+    return directories[min(directories)]
+
 @contextmanager
 def unpack_distribution(context, release_url):
+    '''
+    Download and unpack distribution
+    
+    The download is read in a single pass: while it is decompressed, its md5 is
+    checked and the manifest digest is computed. Only the files needed for the
+    conversion are kept, in memory; nothing is written to disk unless the
+    archive format can only be unpacked by patool.
+    
+    Raises ExtractionLimitExceeded as soon as the archive exceeds
+    ``context.extraction_limits``.
+    
+    Yields
+    ------
+    UnpackedDistribution
+    '''
     # Get url
     if context.pypi_mirror:
         url = '{}packages/{}'.format(context.pypi_mirror, release_url['path'])
     else:
         url = release_url['url']
     
-    # Download
-    context.feed_logger.debug('Downloading {}'.format(url))
-    distribution_file = Path(urlretrieve(url)[0])  # returns temp file with correct extension
-    
-    # Unpack
-    with TemporaryDirectory() as temporary_directory:
-        temporary_directory = Path(temporary_directory)
-#         temporary_directory = Path('test') #TODO rm debug
+    # Download and unpack
+    context.feed_logger.debug('Downloading and unpacking {}'.format(url))
+    md5 = hashlib.md5()
+    limits = context.extraction_limits
+    timeout = 60.0 if limits.duration is None else limits.duration  # Note: the limit is only checked between reads, a stalled read must time out on its own
+    with _scratch_directory(context) as temporary_directory, urlopen(url, timeout=timeout) as response:
+        unpacked_directory = temporary_directory / 'unpacked'
+        unpacked_directory.mkdir()
+        download = HashingReader(response, [md5])
+        try:
+            manifest, egg_info_files = read_archive(
+                download, release_url['filename'], unpacked_directory,
+                extract=lambda path: False, capture=_is_egg_info_file,
+                spool_directory=temporary_directory, limits=limits
+            )
+        except UnsupportedArchive:
+            context.feed_logger.debug('Unpacking with patool')
+            manifest = extract_with_patool(download, release_url['filename'], unpacked_directory, temporary_directory, limits=limits)
+            egg_info_files = {
+                path.relative_to(unpacked_directory).as_posix(): path.read_bytes()
+                for path in unpacked_directory.glob('*/*.egg-info/*')
+                if path.is_file() and _is_egg_info_file(path.relative_to(unpacked_directory).as_posix())
+            }
+        download.drain()
         
-        context.feed_logger.debug('Unpacking')
-        distribution_directory = Path(extract_archive(str(distribution_file), outdir=str(temporary_directory), interactive=False, verbosity=-1))
-        distribution_directory = next(distribution_directory.iterdir())
+        # Check md5
+        md5_digest = release_url.get('md5_digest')
+        if md5_digest and md5.hexdigest() != md5_digest:
+            raise InvalidDistribution(
+                'MD5 of download does not match PyPI. Expected {}, got {}: {}'
+                .format(md5_digest, md5.hexdigest(), release_url['filename'])
+            )
         
         # Yield
-        yield distribution_directory
+        extract = manifest.top_directory
+        yield UnpackedDistribution(
+            egg_info=_egg_info(egg_info_files, extract),
+            manifest_digest=manifest.digest(extract or ''),
+            extract=extract,
+            size=download.size,
+        )
     
 @attr.s
 class ZIRequirement(object):
@@ -234,9 +375,9 @@ class ZIRequirement(object):
     required = attr.ib()  # True iff importance='required' 
     specifiers = attr.ib()  # [(operator :: str, version :: str)]. Python specifier list
     
-def convert_dependencies(context, implementation, egg_info_path):
+def convert_dependencies(context, implementation, egg_info):
     # Parse requirements
-    all_requirements = parse_requirements(egg_info_path)
+    all_requirements = parse_requirements(egg_info)
     
     # Split into ZI required and recommended
     zi_requirements = defaultdict(lambda: ZIRequirement(required=False, specifiers=[]))  # pypi_name => ZIRequirement
@@ -260,21 +401,33 @@ def convert_dependencies(context, implementation, egg_info_path):
                 zi_requirement.required = True
             zi_requirement.specifiers.extend(requirement.specs)
     
-    # Convert
-    for pypi_name, zi_requirement in zi_requirements.items():
-        requires = zi.requires(
-            interface=context.feed_uri(canonical_name(pypi_name)),
-            importance='essential' if zi_requirement.required else 'recommended'
-        )
+    # Convert, sorted by interface
+    zi_requirements = sorted(
+        (
+            (context.feed_uri(context.names.zi_name(pypi_name)), zi_requirement)
+            for pypi_name, zi_requirement in zi_requirements.items()
+        ),
+        key=lambda item: item[0]
+    )
+    for interface, zi_requirement in zi_requirements:
+        requires = zi.requires(OrderedDict((
+            ('interface', interface),
+            ('importance', 'essential' if zi_requirement.required else 'recommended'),
+        )))
         version_expression = convert_specifiers(context, zi_requirement.specifiers)
         if version_expression:
             requires.set('version', version_expression)
         implementation.append(requires)
     
-def parse_requirements(egg_info_directory):
+def parse_requirements(egg_info):
     '''
     Get required and optional requirements from egg-info directory
     
+    Parameters
+    ----------
+    egg_info : {name :: str : contents :: bytes}
+        Files of the egg-info directory
+    
     Returns
     -------
     {extra :: str or None : [pkg_resources.Requirement]}
@@ -284,8 +437,7 @@ def parse_requirements(egg_info_directory):
     '''
     all_requirements = defaultdict(list)
     for name in 'requires.txt', 'depends.txt':
-        dependencies_file = egg_info_directory / name
-        if dependencies_file.exists():
-            for extra, requirements in pkg_resources.split_sections(dependencies_file.read_text().splitlines()):
+        if name in egg_info:
+            for extra, requirements in pkg_resources.split_sections(decode(egg_info[name]).splitlines()):
                 all_requirements[extra].extend(pkg_resources.parse_requirements(requirements))
     return all_requirements
@@ -0,0 +1,472 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Single pass reading of distribution archives
+
+The archive is read as it is downloaded. Each member is hashed for the
+manifest as it is decompressed and is only written to disk or kept in memory
+if requested.
+
+Tar (optionally gzip, bzip2 or xz compressed) and zip archives are read
+in-process, their format is detected by their magic bytes. Members are only
+ever written inside the target directory: members with absolute paths are
+made relative, members outside the archive (``..``) are skipped and links are
+never written.
+
+Reading is aborted as soon as the archive exceeds its `ExtractionLimits`, so
+that archive bombs and other pathological archives cannot stall the
+conversion or fill the disk.
+
+Other formats are extracted by patool in a subprocess, which is killed when it
+exceeds the duration limit. The other limits are checked on the extracted
+tree.
+'''
+
+from ._manifest import Manifest
+from tempfile import SpooledTemporaryFile
+from pathlib import Path
+import subprocess
+import posixpath
+import signal
+import sys
+import os
+import calendar
+import hashlib
+import tarfile
+import zipfile
+import shutil
+import stat
+import time
+import attr
+
+# [(magic :: bytes, format :: str)], format is a tarfile stream mode or 'zip'
+_magic_numbers = [
+    (b'\x1f\x8b', 'r|gz'),
+    (b'BZh', 'r|bz2'),
+    (b'\xfd7zXZ\x00', 'r|xz'),
+    (b'PK\x03\x04', 'zip'),
+    (b'PK\x05\x06', 'zip'),  # empty zip
+]
+_tar_magic_offset = 257  # uncompressed tar has 'ustar' at this offset
+_head_size = 512
+
+def detect_format(head):
+    '''
+    Detect archive format from its first bytes
+    
+    Parameters
+    ----------
+    head : bytes
+        First 512 bytes of the archive, or all of it if it is smaller
+    
+    Returns
+    -------
+    str or None
+        'zip', tarfile stream mode (e.g. 'r|gz') or None if not supported
+    '''
+    for magic, format_ in _magic_numbers:
+        if head.startswith(magic):
+            return format_
+    if head[_tar_magic_offset:_tar_magic_offset+5] == b'ustar':
+        return 'r|'
+    return None
+
+class UnsupportedArchive(Exception):
+    pass
+
+class ExtractionLimitExceeded(Exception):
+    
+    '''
+    Archive exceeds an ExtractionLimits limit
+    '''
+
+@attr.s(frozen=True)
+class ExtractionLimits(object):
+    
+    '''
+    Limits to the resources reading an archive may take
+    
+    Each limit is None if there is no limit.
+    '''
+    
+    size = attr.ib(default=2**30)  # int, max total uncompressed bytes of the members
+    members = attr.ib(default=100000)  # int, max number of members
+    depth = attr.ib(default=64)  # int, max number of components of a member path
+    duration = attr.ib(default=300.0)  # float, max seconds to read the archive
+
+class _Budget(object):
+    
+    '''
+    Tracks the use of the resources of ExtractionLimits while reading
+    '''
+    
+    def __init__(self, limits, clock):
+        self._limits = limits
+        self._clock = clock
+        self._deadline = None if limits.duration is None else clock() + limits.duration
+        self._size = 0
+        self._members = 0
+        self._compressed_size = 0
+    
+    def _exceeded(self, what, limit):
+        raise ExtractionLimitExceeded('Archive exceeds limit of {} {}'.format(limit, what))
+    
+    def add_member(self, path):
+        self._members += 1
+        if self._limits.members is not None and self._members > self._limits.members:
+            self._exceeded('members', self._limits.members)
+        if self._limits.depth is not None and path.count('/') >= self._limits.depth:
+            self._exceeded('nested directories', self._limits.depth)
+        self.check_duration()
+    
+    def add_size(self, size):
+        self._size += size
+        if self._limits.size is not None and self._size > self._limits.size:
+            self._exceeded('uncompressed bytes', self._limits.size)
+        self.check_duration()
+    
+    def add_compressed_size(self, size):
+        '''
+        Add size of archive data read, before decompressing
+        '''
+        self._compressed_size += size
+        if self._limits.size is not None and self._compressed_size > self._limits.size:
+            self._exceeded('compressed bytes', self._limits.size)
+        self.check_duration()
+    
+    def check_declared_size(self, size):
+        '''
+        Check the total size an archive claims to have, without adding it
+        '''
+        if self._limits.size is not None and size > self._limits.size:
+            self._exceeded('uncompressed bytes', self._limits.size)
+    
+    def check_duration(self):
+        if self._deadline is not None and self._clock() > self._deadline:
+            self.expire()
+    
+    def expire(self):
+        self._exceeded('seconds', self._limits.duration)
+    
+    def remaining_duration(self):
+        '''
+        Get seconds left before the duration limit, None if no limit
+        '''
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - self._clock())
+
+class HashingReader(object):
+    
+    '''
+    File-like wrapper which hashes all data read through it
+    
+    Parameters
+    ----------
+    file : file-like
+        Opened in binary mode
+    hashes : iterable(hashlib hash)
+        Hashes to update with the data read
+    '''
+    
+    def __init__(self, file, hashes):
+        self._file = file
+        self._hashes = list(hashes)
+        self._peeked = b''  # read from file, but not yet returned by read
+        self.size = 0  #: number of bytes read so far
+    
+    def peek(self, size):
+        '''
+        Get the next bytes without consuming them
+        
+        Returns
+        -------
+        bytes
+            The next `size` bytes, fewer at the end of the file
+        '''
+        while len(self._peeked) < size:
+            data = self._read(size - len(self._peeked))
+            if not data:
+                break
+            self._peeked += data
+        return self._peeked[:size]
+    
+    def read(self, size=None):
+        peeked = self._peeked
+        if size is None or size < 0:
+            self._peeked = b''
+            return peeked + self._read(None)
+        elif peeked:
+            self._peeked = peeked[size:]
+            return peeked[:size]
+        else:
+            return self._read(size)
+    
+    def _read(self, size):
+        if size is None:
+            data = self._file.read()
+        else:
+            data = self._file.read(size)
+        for hash_ in self._hashes:
+            hash_.update(data)
+        self.size += len(data)
+        return data
+
+    def drain(self, chunk_size=2**16):
+        '''
+        Read the remainder of the file
+        '''
+        while self.read(chunk_size):
+            pass
+
+def read_archive(file, file_name, directory, extract=lambda path: True, capture=lambda path: False, spool_size=2**26, spool_directory=None, limits=ExtractionLimits(), clock=time.monotonic):
+    '''
+    Read archive in a single pass
+    
+    Parameters
+    ----------
+    file : file-like
+        Archive opened in binary mode, need not be seekable, but must have a
+        ``peek`` method like HashingReader and io.BufferedReader
+    file_name : str
+        Name of the archive file
+    directory : pathlib.Path
+        Directory to write extracted members to
+    extract : (path :: str) -> bool
+        Whether to write a member to disk, given its normalised path, e.g.
+        ``pkg-1.0/setup.py``
+    capture : (path :: str) -> bool
+        Whether to return the contents of a regular file member, given its
+        normalised path
+    spool_size : int
+        Zip files cannot be read in a streaming fashion, they are read into
+        memory first. If larger than this many bytes, they are spooled to a
+        temporary file instead. The size limit applies to the compressed zip
+        as well.
+    spool_directory : pathlib.Path or None
+        Directory to create the spool file in, defaults to the system's
+        temporary directory
+    limits : ExtractionLimits
+        Limits checked while reading
+    clock : () -> float
+        Monotonic clock in seconds
+    
+    Returns
+    -------
+    manifest : Manifest
+        Manifest of the whole archive
+    captured : {path :: str : bytes}
+        Contents of the captured members
+    
+    Raises
+    ------
+    UnsupportedArchive
+        If the format is not supported. Nothing has been consumed from `file`.
+    ExtractionLimitExceeded
+        If a limit was exceeded. Members may have been written to `directory`.
+    '''
+    format_ = detect_format(file.peek(_head_size)[:_head_size])
+    if format_ is None:
+        raise UnsupportedArchive('Unsupported archive format: {}'.format(file_name))
+    budget = _Budget(limits, clock)
+    if format_ == 'zip':
+        with SpooledTemporaryFile(max_size=spool_size, dir=spool_directory and str(spool_directory)) as spool:
+            _spool(file, spool, budget)
+            spool.seek(0)
+            return _read_zip(spool, directory, extract, capture, budget)
+    else:
+        return _read_tar(file, format_, directory, extract, capture, budget)
+
+_patool_script = (
+    'import sys, patoolib; '
+    'patoolib.extract_archive(sys.argv[1], outdir=sys.argv[2], interactive=False, verbosity=-1)'
+)
+
+def extract_with_patool(file, file_name, directory, spool_directory, limits=ExtractionLimits(), clock=time.monotonic):
+    '''
+    Extract archive of a format which `read_archive` does not support
+    
+    The archive is written to the spool directory and extracted with patool in
+    a subprocess, which is killed when it exceeds the duration limit. The size,
+    member and depth limits are checked on the extracted tree.
+    
+    Parameters
+    ----------
+    file : file-like
+        Archive opened in binary mode
+    file_name : str
+        Name of the archive file, patool uses its extension
+    directory : pathlib.Path
+        Existing directory to extract to
+    spool_directory : pathlib.Path
+        Directory to write the archive to
+    limits : ExtractionLimits
+    clock : () -> float
+        Monotonic clock in seconds
+    
+    Returns
+    -------
+    Manifest
+        Manifest of the extracted tree
+    
+    Raises
+    ------
+    UnsupportedArchive
+        If patool could not extract the archive
+    ExtractionLimitExceeded
+        If a limit was exceeded. Members may have been written to `directory`.
+    '''
+    budget = _Budget(limits, clock)
+    archive = spool_directory / file_name
+    with archive.open('wb') as spool:
+        _spool(file, spool, budget)
+    process = subprocess.Popen(
+        [sys.executable, '-c', _patool_script, str(archive), str(directory)],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        start_new_session=True,  # so that the programs patool runs can be killed with it
+    )
+    try:
+        _, stderr = process.communicate(timeout=budget.remaining_duration())
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.communicate()
+        budget.expire()
+    if process.returncode:
+        raise UnsupportedArchive('patool could not extract {}: {}'.format(file_name, stderr.decode(errors='replace').strip()))
+    for root, directories, files in os.walk(str(directory)):
+        for name in directories + files:
+            path = Path(root) / name
+            budget.add_member(path.relative_to(directory).as_posix())
+            if name in files and not path.is_symlink():
+                budget.add_size(path.stat().st_size)
+    return Manifest.from_directory(directory)
+
+def _spool(file, spool, budget):
+    '''
+    Copy archive to spool file, within the budget
+    '''
+    for chunk in iter(lambda: file.read(2**16), b''):
+        budget.add_compressed_size(len(chunk))
+        spool.write(chunk)
+
+def _normalise(path):
+    '''
+    Get normalised member path, None if it points outside of the archive
+    '''
+    if '\x00' in path:
+        return None
+    path = posixpath.normpath(path.lstrip('/'))
+    if path == '.' or path == '..' or path.startswith('../'):
+        return None
+    return path
+
+def _copy(source, directory, path, capture, budget):
+    '''
+    Copy member contents to directory / path, if path is not None
+    
+    Returns
+    -------
+    digest : str
+        sha256 hex digest of the contents
+    contents : bytes or None
+        The contents if `capture`
+    '''
+    digest = hashlib.sha256()
+    chunks = [] if capture else None
+    target = None
+    if path is not None:
+        target_file = directory / path
+        target_file.parent.mkdir(parents=True, exist_ok=True)
+        target = target_file.open('wb')
+    try:
+        for chunk in iter(lambda: source.read(2**16), b''):
+            budget.add_size(len(chunk))
+            digest.update(chunk)
+            if target:
+                target.write(chunk)
+            if capture:
+                chunks.append(chunk)
+    finally:
+        if target:
+            target.close()
+    return digest.hexdigest(), b''.join(chunks) if capture else None
+
+def _read_tar(file, mode, directory, extract, capture, budget):
+    manifest = Manifest()
+    captured = {}
+    files = {}  # path -> (digest, size) of regular files, for resolving hard links
+    with tarfile.open(fileobj=file, mode=mode) as tar:
+        for member in tar:
+            path = _normalise(member.name)
+            if path is None:
+                continue
+            budget.add_member(path)
+            if member.isdir():
+                manifest.add_directory(path)
+            elif member.isfile():
+                digest, contents = _copy(tar.extractfile(member), directory, path if extract(path) else None, capture(path), budget)
+                manifest.add_file(path, digest, member.mtime, member.size, bool(member.mode & 0o111))
+                files[path] = (digest, member.size)
+                if contents is not None:
+                    captured[path] = contents
+            elif member.issym():
+                manifest.add_symlink(path, member.linkname)
+            elif member.islnk():
+                target = _normalise(member.linkname)
+                if target in files:
+                    digest, size = files[target]
+                    manifest.add_file(path, digest, member.mtime, size, bool(member.mode & 0o111))
+                    files[path] = files[target]
+                    if extract(path) and extract(target):
+                        (directory / path).parent.mkdir(parents=True, exist_ok=True)
+                        shutil.copyfile(str(directory / target), str(directory / path))
+                    if capture(path) and target in captured:
+                        captured[path] = captured[target]
+            # Note: devices and fifos are not part of an implementation
+    return manifest, captured
+
+def _read_zip(file, directory, extract, capture, budget):
+    manifest = Manifest()
+    captured = {}
+    with zipfile.ZipFile(file) as zip_file:
+        infos = zip_file.infolist()
+        
+        # Check the sizes declared in the central directory before decompressing
+        # anything. Note: the declared sizes may lie, the actual sizes are
+        # checked as well while decompressing
+        budget.check_declared_size(sum(info.file_size for info in infos))
+        
+        for info in infos:
+            path = _normalise(info.filename)
+            if path is None:
+                continue
+            budget.add_member(path)
+            mode = info.external_attr >> 16  # Note: 0 if not created on Unix
+            if info.filename.endswith('/'):
+                manifest.add_directory(path)
+            elif stat.S_ISLNK(mode):
+                budget.add_size(info.file_size)
+                manifest.add_symlink(path, zip_file.read(info).decode('utf-8', 'surrogateescape'))
+            else:
+                with zip_file.open(info) as source:
+                    digest, contents = _copy(source, directory, path if extract(path) else None, capture(path), budget)
+                mtime = calendar.timegm(info.date_time + (0, 0, 0))
+                manifest.add_file(path, digest, mtime, info.file_size, bool(mode & 0o111))
+                if contents is not None:
+                    captured[path] = contents
+    return manifest, captured
@@ -0,0 +1,132 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Factoring of what implementations share into <group> elements
+
+Consecutive releases usually have the same dependencies. An implementation in
+a ``<group>`` inherits the group's attributes and ``<requires>``, so these
+need only be written once per run of implementations which share them.
+'''
+
+from pypi_to_0install.various import zi, zi_nsmap
+from itertools import groupby
+from lxml import etree
+import copy
+
+_xpath_nsmap = {'zi': zi_nsmap[None]}
+_implementation_tag = zi.implementation().tag
+_group_tag = zi.group().tag
+_requires_tag = zi.requires().tag
+
+# Attributes which may move to a group, the others identify the implementation
+_shared_attributes = ('stability', 'langs', 'license')
+
+# Order of implementation attributes as set by convert_distribution
+_attribute_order = ('id', 'version', 'released') + _shared_attributes
+
+def group_implementations(interface):
+    '''
+    Move what runs of consecutive implementations share to <group>s
+    
+    A run of implementations with the same ``<requires>`` is put in a group
+    with those requires and with the attributes in `_shared_attributes` on
+    which they all agree. A run is only grouped if that makes it smaller. The
+    result is deterministic, so an unchanged feed is grouped the same.
+    
+    Parameters
+    ----------
+    interface : lxml.etree.Element
+        <interface> whose <implementation> children to group, in place. The
+        implementations must not have been grouped already.
+    '''
+    implementations = interface.findall('zi:implementation', namespaces=_xpath_nsmap)
+    for _, run in groupby(implementations, key=_requires_key):
+        run = list(run)
+        if len(run) < 2:
+            continue
+        group = _group(run)
+        if _size(group) < sum(map(_size, run)):
+            interface.replace(run[0], group)
+            for implementation in run[1:]:
+                interface.remove(implementation)
+
+def ungroup_implementation(implementation):
+    '''
+    Get implementation with what it inherits from its groups
+    
+    Parameters
+    ----------
+    implementation : lxml.etree.Element
+        <implementation>, possibly inside <group>s
+    
+    Returns
+    -------
+    lxml.etree.Element
+        Standalone copy of the implementation, as convert_distribution would
+        create it
+    '''
+    attributes = dict(implementation.attrib)
+    inherited = []  # children inherited from groups, outermost group first
+    for group in implementation.iterancestors(_group_tag):
+        for name, value in group.attrib.items():
+            attributes.setdefault(name, value)
+        inherited[:0] = [child for child in group if child.tag not in (_implementation_tag, _group_tag)]
+    ungrouped = zi.implementation()
+    order = {name: i for i, name in enumerate(_attribute_order)}
+    for name in sorted(attributes, key=lambda name: order.get(name, len(order))):
+        ungrouped.set(name, attributes[name])
+    for child in list(implementation) + inherited:
+        ungrouped.append(copy.deepcopy(child))
+    return ungrouped
+
+def _requires_key(implementation):
+    return tuple(
+        etree.tostring(requires, with_tail=False)
+        for requires in implementation.iterchildren(_requires_tag)
+    )
+
+def _group(implementations):
+    '''
+    Get <group> of copies of implementations, which all have the same requires
+    '''
+    group = zi.group()
+    for name in _shared_attributes:
+        values = {implementation.get(name) for implementation in implementations}
+        if len(values) == 1 and None not in values:
+            group.set(name, values.pop())
+    for requires in implementations[0].iterchildren(_requires_tag):
+        group.append(copy.deepcopy(requires))
+    for implementation in implementations:
+        implementation = copy.deepcopy(implementation)
+        for name in group.attrib:
+            del implementation.attrib[name]
+        for requires in list(implementation.iterchildren(_requires_tag)):
+            implementation.remove(requires)
+        group.append(implementation)
+    return group
+
+_namespace_declaration_size = len(' xmlns="{}"'.format(zi_nsmap[None]))
+
+def _size(element):
+    '''
+    Get size of element in the feed file
+    '''
+    # Note: pretty printed so that the deeper indentation inside a group is
+    # counted. Serialized on its own, the element declares the namespace,
+    # inside the feed it does not
+    return len(etree.tostring(element, pretty_print=True, with_tail=False)) - _namespace_declaration_size
@@ -0,0 +1,192 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+ZI manifests, for computing ``<manifest-digest sha256new=...>``
+'''
+
+from collections import defaultdict
+import hashlib
+import base64
+import stat
+import os
+
+class Manifest(object):
+    
+    '''
+    Manifest of a directory tree, built up one entry at a time
+    
+    Entries can be added in any order, e.g. in the order of the members of an
+    archive. Directories are added implicitly by adding their contents.
+    
+    Paths are relative, use ``/`` as separator and must be normalised (no
+    ``.``, ``..`` or empty components).
+    '''
+    
+    def __init__(self):
+        self._entries = {}  # path -> line without name, or None for a directory
+        self._children = defaultdict(set)  # directory path ('' is root) -> {name}
+    
+    def add_directory(self, path):
+        '''
+        Add directory
+        '''
+        if self._entries.get(path, 0) is None:
+            return
+        self._entries[path] = None
+        self._add_to_parent(path)
+    
+    def add_file(self, path, digest, mtime, size, executable=False):
+        '''
+        Add regular file
+        
+        Parameters
+        ----------
+        path : str
+        digest : str
+            sha256 hex digest of the contents
+        mtime : int or float
+            Modification time in seconds since the epoch
+        size : int
+        executable : bool
+        '''
+        self._entries[path] = '{} {} {} {}'.format('X' if executable else 'F', digest, int(mtime), size)
+        self._add_to_parent(path)
+    
+    def add_symlink(self, path, target):
+        '''
+        Add symbolic link
+        
+        Parameters
+        ----------
+        path : str
+        target : str
+        '''
+        target = target.encode('utf-8', 'surrogateescape')
+        self._entries[path] = 'S {} {}'.format(hashlib.sha256(target).hexdigest(), len(target))
+        self._add_to_parent(path)
+    
+    def _add_to_parent(self, path):
+        parent, _, name = path.rpartition('/')
+        self._children[parent].add(name)
+        if parent:
+            self.add_directory(parent)
+    
+    @property
+    def top_directory(self):
+        '''
+        Name of the only entry of the root if it is a directory, else None
+        
+        Source distributions normally have all their files in such a
+        directory, it is what ``<archive extract=...>`` should be set to.
+        '''
+        names = self._children['']
+        if len(names) == 1:
+            name, = names
+            if self._entries[name] is None:
+                return name
+        return None
+    
+    def format(self, root=''):
+        '''
+        Format as sha256new manifest
+        
+        Parameters
+        ----------
+        root : str
+            Directory whose subtree to format, '' for the whole tree
+        
+        Returns
+        -------
+        str
+        '''
+        lines = []
+        def join(*parts):
+            return '/'.join(part for part in parts if part)
+        def format_directory(directory):  # directory relative to root, '' is root
+            if directory:
+                lines.append('D /{}'.format(directory))
+            subdirectories = []
+            for name in sorted(self._children[join(root, directory)]):
+                path = join(directory, name)
+                entry = self._entries[join(root, path)]
+                if entry is None:
+                    subdirectories.append(path)
+                else:
+                    lines.append('{} {}'.format(entry, name))
+            for subdirectory in subdirectories:
+                format_directory(subdirectory)
+        format_directory('')
+        return ''.join(line + '\n' for line in lines)
+    
+    def digest(self, root=''):
+        '''
+        Get sha256new digest
+        
+        Parameters
+        ----------
+        root : str
+            See `format`
+        
+        Returns
+        -------
+        str
+            ``sha256new_`` followed by the digest, the value of
+            ``<manifest-digest sha256new=...>`` is the part after the ``_``
+        '''
+        digest = hashlib.sha256(self.format(root).encode('utf-8', 'surrogateescape')).digest()
+        return 'sha256new_' + base64.b32encode(digest).decode('ascii').rstrip('=')
+    
+    @classmethod
+    def from_directory(cls, directory):
+        '''
+        Get manifest of a directory on disk
+        
+        Parameters
+        ----------
+        directory : pathlib.Path
+        '''
+        manifest = cls()
+        for parent, directory_names, file_names in os.walk(str(directory)):
+            relative = os.path.relpath(parent, str(directory)).replace(os.sep, '/')
+            relative = '' if relative == '.' else relative + '/'
+            for name in directory_names + file_names:
+                path = os.path.join(parent, name)
+                info = os.lstat(path)
+                if stat.S_ISDIR(info.st_mode):
+                    manifest.add_directory(relative + name)
+                elif stat.S_ISLNK(info.st_mode):
+                    manifest.add_symlink(relative + name, os.readlink(path))
+                elif stat.S_ISREG(info.st_mode):
+                    with open(path, 'rb') as file:
+                        digest = file_digest(file)
+                    manifest.add_file(relative + name, digest, info.st_mtime, info.st_size, bool(info.st_mode & 0o111))
+        return manifest
+
+def file_digest(file, chunk_size=2**16):
+    '''
+    Get sha256 hex digest of file contents
+    
+    Parameters
+    ----------
+    file : file-like
+        Opened in binary mode
+    '''
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,93 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Parsing of PKG-INFO and METADATA files from bytes
+
+Only the requested fields are decoded. Old uploads are often not valid UTF-8,
+so each value is decoded separately, falling back to Latin-1.
+'''
+
+from collections import defaultdict
+from functools import lru_cache
+import re
+
+def decode(data):
+    '''
+    Decode text of unknown encoding
+    
+    Parameters
+    ----------
+    data : bytes
+        UTF-8, possibly with a BOM, or Latin-1 text
+    
+    Returns
+    -------
+    str
+    '''
+    if data.startswith(b'\xef\xbb\xbf'):
+        data = data[3:]
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+def parse_metadata(data, fields=None):
+    '''
+    Parse headers of a PKG-INFO or METADATA file
+    
+    Parsing stops at the first empty line, i.e. the body (the description in
+    metadata version 2.1) is skipped. Lines which are neither a field nor
+    the continuation of one are ignored.
+    
+    Parameters
+    ----------
+    data : bytes
+        Contents of the file
+    fields : iterable(str) or None
+        Names of the fields to get, e.g. ``['Classifier']``, or None to get all
+        fields. Names are case-insensitive.
+    
+    Returns
+    -------
+    {name :: str : [str]}
+        Values of each field found, in order of appearance. Names are lower
+        case. Values of fields continued on the next lines have their lines
+        joined by a newline.
+    '''
+    if data.startswith(b'\xef\xbb\xbf'):
+        data = data[3:]
+    data = b'\n' + data  # Note: patterns match the newline before a line, that is faster than ^
+    end = _end_of_headers.search(data)
+    if end:
+        data = data[:end.start() + 1]
+    pattern = _all_fields if fields is None else _fields_pattern(tuple(sorted({field.lower() for field in fields})))
+    headers = defaultdict(list)
+    for match in pattern.finditer(data):
+        name, value = match.groups()
+        lines = (line.strip() for line in value.split(b'\n'))
+        headers[name.strip().decode('latin-1').lower()].append(decode(b'\n'.join(lines)))
+    return dict(headers)
+
+_end_of_headers = re.compile(br'\n\r?\n')
+_value = br'[ \t]*:(.*(?:\n[ \t].*)*)'  # value, including continuation lines
+_all_fields = re.compile(br'\n([^\s:][^:\n]*)' + _value)
+
+@lru_cache()
+def _fields_pattern(fields):
+    names = b'|'.join(re.escape(field.encode('ascii')) for field in fields)
+    return re.compile(br'\n(' + names + br')' + _value, re.IGNORECASE)
@@ -31,17 +31,110 @@ def convert_specifiers(context, specifiers):
     Returns
     -------
     str or None
-        ZI version expression: ``range | range | ...`` or None if no constraint
+        Shortest ZI version expression: ``range | range | ...`` or
+        ``!version``, or None if no constraint. If no version satisfies the
+        specifiers, an expression that matches no version.
+    '''
+    specifiers = list(specifiers)
+    version_expression = _convert_simple(specifiers)
+    if version_expression is not None:
+        return version_expression
+    return _convert_general(context, specifiers)
+
+def _convert_general(context, specifiers):
+    '''
+    Convert any Python version specifiers to ZI constraints
+    
+    See convert_specifiers
     '''
     ast = _specifiers_to_ast(context, specifiers)
     if not ast:
         return None
-    print(ast)
     ast = _remove_and(ast)
-    print(ast)
     ast = _simplify(ast)
+    if ast is None:
+        return None
+    if isinstance(ast, _Or) and not ast.ranges:
+        context.feed_logger.warning(
+            'Specifiers match no version: {}'
+            .format(','.join(operator + version for operator, version in specifiers))
+        )
     return ast.format_zi()
 
+def _parse_simple_version(version):
+    '''
+    Parse version for _convert_simple
+    
+    Returns
+    -------
+    Version or None
+        None if version is not suited for the fast path: if it is invalid (the
+        general path warns about it), a prefix match or in the 0!0 release, where
+        ranges may touch Version.MIN
+    '''
+    if version.endswith('.*'):
+        return None
+    try:
+        version = parse_version(version)
+    except InvalidVersion:
+        return None
+    if version.epoch == 0 and version.release == '0':
+        return None
+    return version
+
+def _convert_simple(specifiers):
+    '''
+    Convert common, simple specifiers directly to a ZI version expression
+    
+    Handles a single ``>=``, ``>``, ``<=``, ``<``, ``==``, ``===`` or ``!=``
+    specifier and the pair ``>=v1,<v2``; this covers most requirements on PyPI.
+    The result is identical to that of _convert_general, but without building
+    and simplifying an AST.
+    
+    Parameters
+    ----------
+    specifiers : [(operator :: str, version :: str)]
+    
+    Returns
+    -------
+    str or None
+        ZI version expression, or None if the specifiers are not simple
+    '''
+    if len(specifiers) == 1:
+        (operator, version), = specifiers
+        if operator not in _simple_formatters:
+            return None
+        version = _parse_simple_version(version)
+        if version is None:
+            return None
+        return _simple_formatters[operator](version)
+    elif len(specifiers) == 2:
+        (operator1, start), (operator2, end) = sorted(specifiers, key=lambda specifier: specifier[0] != '>=')
+        if (operator1, operator2) != ('>=', '<'):
+            return None
+        start = _parse_simple_version(start)
+        end = _parse_simple_version(end)
+        if start is None or end is None:
+            return None
+        end = _lt_end(end)
+        if not start < end:
+            return None  # empty, leave it to the general path
+        return '{}..!{}'.format(start.format_zi(), end.format_zi())
+    else:
+        return None
+    
+# Note: equivalent to _converters[operator](version).format_zi() after
+# simplification, given versions returned by _parse_simple_version
+_simple_formatters = {
+    '>=': lambda version: '{}..'.format(version.format_zi()),
+    '>': lambda version: '{}..'.format(_convert_gt(version).start.format_zi()),
+    '<=': lambda version: '..!{}'.format(version.after_version().format_zi()),
+    '<': lambda version: '..!{}'.format(_lt_end(version).format_zi()),
+    '==': lambda version: version.format_zi(),
+    '===': lambda version: version.format_zi(),
+    '!=': lambda version: '!{}'.format(version.format_zi()),
+}
+
 class AST(object):
     
     '''
@@ -76,6 +169,8 @@ class _Or(AST):
     
     '''
     range (or range)*
+    
+    Without ranges, it matches no version.
     '''
     
     def _validate_ranges(self, attribute, ranges):
@@ -86,6 +181,10 @@ class _Or(AST):
     ranges = attr.ib(convert=tuple, validator=_validate_ranges)  # tuple(_Range)
     
     def format_zi(self):
+        if not self.ranges:
+            # Note: ZI has no expression for the empty set, but does not
+            # reject empty ranges
+            return '{0}..!{0}'.format(Version.MIN.format_zi())
         return ' | '.join(range_.format_zi() for range_ in self.ranges)
     
 @attr.s(frozen=True, repr=False, str=False, cmp=False)
@@ -105,7 +204,7 @@ class _Range(AST):
         if end is None:
             raise ValueError('end cannot be None')
         if end == Version.MIN:
-            raise ValueError('Range cannot end at Version.MAX')
+            raise ValueError('Range cannot end at Version.MIN')
         if end <= self.start:
             raise ValueError('Range cannot be empty')
         
@@ -118,10 +217,13 @@ class _Range(AST):
         
         Returns
         -------
-        _Range
+        _Range or None
+            None if the intersection is empty
         '''
         start = max(self.start, other.start)
         end = min(self.end, other.end)
+        if end <= start:
+            return None
         return _Range(start, end)
     
     def __lt__(self, other):
@@ -165,6 +267,22 @@ class _NotVersion(AST):
 class _InvalidSpecifier(Exception):
     pass
 
+def _ranges(*bounds):
+    '''
+    Get _Or of the ranges which are not empty
+    
+    Parameters
+    ----------
+    bounds : iterable((start :: Version, end :: Version))
+    
+    Returns
+    -------
+    _Or
+        Without ranges, i.e. matching no version, if all are empty, e.g. ..!v
+        with v = Version.MIN
+    '''
+    return _Or(_Range(start, end) for start, end in bounds if start < end)
+
 def _specifiers_to_ast(context, specifiers):
     '''
     Build abstract syntax tree from Python version specifiers
@@ -256,14 +374,20 @@ def _convert_lt(version):
     '''
     Convert <version to AST
     '''
+    return _ranges((Version.MIN, _lt_end(version)))  # ..!end, empty if end is Version.MIN, e.g. <0
+
+def _lt_end(version):
+    '''
+    Get end of the range of <version
+    '''
     # Note: "The exclusive ordered comparison <V MUST NOT allow a pre-release of the specified version unless the specified version is itself a pre-release."
     if not version.is_prerelease:
         # Note: With v of the form epoch!release[.postN], v.dev0..!v are all
         # prereleases of v. Removing the prereleases from ..!v, yields
         # ..!v.dev0
-        return _Range(Version.MIN, version.append_modifier(Modifier('dev', 0)))  # ..!v.dev0
+        return version.append_modifier(Modifier('dev', 0))  # v.dev0
     else:
-        return _Range(Version.MIN, version)  # ..!v
+        return version  # v
 
 def _convert_arbitrary_eq(version):
     '''
@@ -306,10 +430,10 @@ def _convert_ne(version):
     Convert !=version to AST
     '''
     # ..!v | v+.. = !v
-    return _Or((
-        _Range(Version.MIN, version),
-        _Range(version.after_version(), Version.MAX)
-    ))
+    return _ranges(
+        (Version.MIN, version),
+        (version.after_version(), Version.MAX)
+    )
 
 def _convert_eq_prefix_match(version):
     '''
@@ -343,10 +467,10 @@ def _convert_prefix_match(version, is_eq):
         return _Range(start, end)
     else:
         # ..!s | e..
-        return _Or((
-            _Range(Version.MIN, start),
-            _Range(end, Version.MAX)
-        ))
+        return _ranges(
+            (Version.MIN, start),
+            (end, Version.MAX)
+        )
     
 _converters = {
     '>=': _convert_ge,
@@ -388,7 +512,10 @@ def _remove_and(ast):
             # (r1 | r2 ...) & (r3 | r4 ...)
             # to
             # ((r1 & r3) | (r1 & r4) | (r2 & r3) | (r2 & r4) ...)
-            left = _Or(range1 & range2 for range1 in left.ranges for range2 in right.ranges)
+            # leaving out empty intersections. Ranges are joined after each
+            # step so the number of ranges does not grow multiplicatively.
+            intersections = (range1 & range2 for range1 in left.ranges for range2 in right.ranges)
+            left = _Or(_join_touching_or_overlapping(sorted(range_ for range_ in intersections if range_)))
         return left
     elif isinstance(ast, _Range):
         return _Or((ast,))
@@ -406,13 +533,17 @@ def _simplify(ast):
         
     Returns
     -------
-    _Or or _Range or _NotVersion
-        Root of simplified AST
+    _Or or _Range or _NotVersion or None
+        Root of the AST with the shortest ZI formatting, None if it includes
+        all versions. An _Or without ranges if it includes no version.
     '''
-    ranges = sorted(ast.ranges)
-    ranges = _join_touching_or_overlapping(ranges)
+    ranges = _join_touching_or_overlapping(sorted(ast.ranges))
     
-    # If ranges includes all but one version, return !version
+    # If ranges include all versions, there is no constraint
+    if len(ranges) == 1 and ranges[0].start == Version.MIN and ranges[0].end == Version.MAX:
+        return None
+    
+    # If ranges include all but one version, return !version
     if len(ranges) == 2:
         range1 = ranges[0]
         range2 = ranges[1]
@@ -421,8 +552,9 @@ def _simplify(ast):
             and range1.end.after_version() == range2.start
         ):
             return _NotVersion(range1.end)
-        
-    #
+    
+    # Else, the joined ranges. Note: ZI has no conjunction, so excluding
+    # multiple versions requires ranges, e.g. ..!v1 | v1+..!v2 | v2+..
     if len(ranges) == 1:
         return ranges[0]
     else:
@@ -440,24 +572,15 @@ def _join_touching_or_overlapping(ranges):
     Returns
     -------
     [_Range]
+        Sorted ranges, no two of them touch or overlap
     '''
     new_ranges = []
-    range1 = ranges[0]
-    for range2 in ranges[1:]:
-        # If range is v.., stop as it includes all subsequent ranges
-        if range1.end == Version.MAX:
-            break
-        
-        # If touching/overlapping,
-        is_touching_or_overlapping = range1.end >= range2.start
-        if is_touching_or_overlapping:
-            # Join ranges
-            end = max(range1.end, range2.end)
-            range1 = attr.assoc(end=end)
+    for range_ in ranges:
+        if new_ranges and new_ranges[-1].end >= range_.start:
+            # Touching/overlapping the previous range, join them
+            previous = new_ranges[-1]
+            if range_.end > previous.end:
+                new_ranges[-1] = attr.assoc(previous, end=range_.end)
         else:
-            # Save range1 and continue with range2
-            new_ranges.append(range1)
-            range1 = range2
-            break
-    new_ranges.append(range1)  # Save the last range
+            new_ranges.append(range_)
     return new_ranges
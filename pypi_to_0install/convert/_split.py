@@ -0,0 +1,144 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Splitting of large feeds into a main feed and sub-feeds
+
+Implementations are partitioned into release ranges by epoch and major
+release, e.g. 1.0 and 1.5 are in range ``0-1``. The newest ranges stay in the
+main feed, each older range moves to a sub-feed of its own which the main feed
+references with ``<feed src>``. A release range rarely changes once it is old,
+so an incremental run seldom has to rewrite more than the main feed.
+
+A sub-feed is named ``{zi_name}_{epoch}-{major}``, e.g. ``numpy_0-1``.
+Canonical names never contain an underscore, so sub-feed names cannot clash
+with the names of packages.
+'''
+
+from pypi_to_0install.various import zi, zi_nsmap
+from ._group import group_implementations, ungroup_implementation
+from collections import defaultdict, OrderedDict
+from lxml import etree
+import copy
+import attr
+
+_xpath_nsmap = {'zi': zi_nsmap[None]}
+_implementation_tag = zi.implementation().tag
+_group_tag = zi.group().tag
+
+@attr.s(frozen=True)
+class SplitSettings(object):
+    
+    '''
+    When and how to split feeds into sub-feeds
+    '''
+    
+    max_implementations = attr.ib(default=None)  # int or None, feeds with more implementations are split. None to never split
+    recent_ranges = attr.ib(default=2)  # int, number of newest release ranges to keep in the main feed
+
+def release_range(zi_version):
+    '''
+    Get release range of a version
+    
+    Parameters
+    ----------
+    zi_version : str
+        ZI version as formatted by `Version.format_zi`, e.g. ``0-1.5-4``
+    
+    Returns
+    -------
+    (epoch :: int, major :: int)
+    '''
+    epoch, release = zi_version.split('-')[:2]
+    return int(epoch), int(release.split('.')[0])
+
+def sub_feed_name(zi_name, release_range_):
+    return '{}_{}-{}'.format(zi_name, *release_range_)
+
+def sub_feed_names(context, feed):
+    '''
+    Get names of the sub-feeds a feed references
+    
+    Returns
+    -------
+    [str]
+    '''
+    names = (context.zi_name(src) for src in feed.getroot().xpath('zi:feed/@src', namespaces=_xpath_nsmap))
+    return [name for name in names if name]
+
+def split_feed(context, zi_name, feed, settings):
+    '''
+    Move implementations of old release ranges of a large feed to sub-feeds
+    
+    Only the implementations of a release range decide the contents of its
+    sub-feed, so the same implementations always yield the same sub-feed.
+    
+    Parameters
+    ----------
+    context : pypi_to_0install.main.Context
+    zi_name : str
+        Name of the feed
+    feed : lxml.etree.ElementTree
+        Feed as returned by `convert`
+    settings : SplitSettings
+    
+    Returns
+    -------
+    feed : lxml.etree.ElementTree
+        Main feed, `feed` itself if it is not split
+    sub_feeds : {zi_name :: str : lxml.etree.ElementTree}
+        Sub-feeds by name
+    '''
+    interface = feed.getroot()
+    implementations = interface.xpath('//zi:implementation', namespaces=_xpath_nsmap)
+    if settings.max_implementations is None or len(implementations) <= settings.max_implementations:
+        return feed, {}
+    ranges = defaultdict(list)  # release range -> [implementation]
+    for implementation in implementations:
+        ranges[release_range(implementation.get('version'))].append(ungroup_implementation(implementation))
+    ranges = sorted(ranges.items())
+    split = max(0, len(ranges) - settings.recent_ranges)
+    old_ranges, recent_ranges = ranges[:split], ranges[split:]
+    if not old_ranges:
+        return feed, {}
+    
+    # Create sub-feeds
+    sub_feeds = OrderedDict()
+    for release_range_, implementations_ in old_ranges:
+        name = sub_feed_name(zi_name, release_range_)
+        attributes = OrderedDict([('uri', context.feed_uri(name))])
+        if interface.get('min-injector-version'):
+            attributes['min-injector-version'] = interface.get('min-injector-version')
+        sub_interface = zi.interface(attributes)
+        sub_interface.append(copy.deepcopy(interface.find('zi:name', namespaces=_xpath_nsmap)))  # Note: not the summary, it changes with the latest release
+        sub_interface.append(zi('feed-for', interface=interface.get('uri')))
+        sub_interface.extend(implementations_)
+        group_implementations(sub_interface)
+        sub_feeds[name] = etree.ElementTree(sub_interface)
+    
+    # Create main feed, with general info, references to the sub-feeds and
+    # the recent implementations
+    main_interface = zi.interface(OrderedDict(interface.attrib))
+    for element in interface:
+        if element.tag not in (_implementation_tag, _group_tag):
+            main_interface.append(copy.deepcopy(element))
+    for name in sub_feeds:
+        main_interface.append(zi.feed(src=context.feed_uri(name)))
+    for _, implementations_ in recent_ranges:
+        main_interface.extend(implementations_)
+    group_implementations(main_interface)
+    return etree.ElementTree(main_interface), sub_feeds
@@ -18,6 +18,7 @@
 from zeroinstall.injector.versions import parse_version as zi_parse_version
 from packaging.version import parse as py_parse_version, VERSION_PATTERN
 from functools import total_ordering
+import numpy as np
 import attr
 import re
 
@@ -244,6 +245,98 @@ def parse_version(version, trim_zeros=True):
     
     return Version(epoch, release, modifiers, raw)
 
+def _sort_key(version):
+    '''
+    Get sort key of version as a list of non-negative ints
+    
+    Sorting by key gives the same order as sorting the ZI versions of
+    `Version.format_zi`. Keys of versions with release segments of different
+    length have different lengths; padding the release segment of a key with
+    0s (at ``key[1:len(release)+1]``) does not change the order.
+    
+    Returns
+    -------
+    (key :: [int], release_length :: int)
+    '''
+    # Note: ZI compares its version parts lexicographically and a shorter part
+    # sorts before a longer one with the same prefix. So each component is
+    # offset by 1 such that 0 means absent.
+    release = [int(component) + 1 for component in version.release.split('.')]
+    modifiers = list(version.modifiers)
+    max_modifiers = 3
+    if len(modifiers) < max_modifiers:
+        modifiers.append(Modifier('', None))
+    modifier_columns = []
+    for modifier in modifiers:
+        modifier_columns.append(Modifier._modifier_priorities[modifier.type_] + 1)
+        modifier_columns.append(0 if modifier.number is None else modifier.number + 1)
+    modifier_columns.extend([0] * (2 * max_modifiers - len(modifier_columns)))
+    return [version.epoch] + release + modifier_columns + [version._after], len(release)
+
+@attr.s(frozen=True)
+class SortedVersions(object):
+    
+    '''
+    Result of `sort_versions`
+    '''
+    
+    sorted = attr.ib()  # [str], valid versions in ascending order
+    invalid = attr.ib()  # {version :: str : reason :: str}, versions which could not be parsed
+    
+    @property
+    def max(self):
+        '''
+        Largest valid version, None if none
+        '''
+        return self.sorted[-1] if self.sorted else None
+    
+def sort_versions(versions):
+    '''
+    Sort Python version strings
+    
+    Equivalent to ``sorted(versions, key=parse_version)``, but much faster on
+    large lists and invalid versions are returned instead of raised. Each
+    version is parsed once and encoded as a row of ints; the rows are then
+    sorted in a single `numpy.lexsort`. Versions which are equal (e.g. 1 and
+    1.0) are ordered by their string.
+    
+    Parameters
+    ----------
+    versions : iterable(str)
+        Python versions
+        
+    Returns
+    -------
+    SortedVersions
+    '''
+    valid = []
+    keys = []
+    invalid = {}
+    for version in sorted(versions):
+        try:
+            keys.append(_sort_key(parse_version(version)))
+            valid.append(version)
+        except InvalidVersion as ex:
+            invalid[version] = ex.args[0]
+    if not valid:
+        return SortedVersions([], invalid)
+    
+    # Pad release segments to the same length
+    release_length = max(length for _, length in keys)
+    rows = []
+    for key, length in keys:
+        rows.append(key[:length+1] + [0] * (release_length - length) + key[length+1:])
+        
+    # Sort
+    try:
+        rows = np.array(rows, dtype=np.int64)
+    except OverflowError:
+        # Some components do not fit in 64 bits, fall back to sorting tuples
+        indices = sorted(range(len(rows)), key=lambda i: rows[i])
+    else:
+        indices = np.lexsort(rows.T[::-1])  # Note: lexsort sorts by the last key first
+    return SortedVersions([valid[i] for i in indices], invalid)
+
 @total_ordering
 class MaxVersion(object):
     def __lt__(self, other):
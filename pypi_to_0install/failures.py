@@ -0,0 +1,157 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Handling of failed package conversions
+
+Failures are classified as transient (e.g. a network hiccup, retrying soon may
+succeed) or permanent (e.g. an invalid version, retrying the same release will
+fail again). Transient failures are retried with exponential backoff within the
+run. Packages which keep failing permanently are quarantined: they are no
+longer retried until they change on PyPI.
+'''
+
+from pypi_to_0install.workspace import WorkspaceFull
+from xmlrpc.client import Fault, ProtocolError
+import urllib.error
+import http.client
+import logging
+import socket
+import time
+import attr
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+def _is_transient_status(status):
+    return status in (408, 429) or status >= 500
+
+def classify(exception):
+    '''
+    Classify failure
+    
+    Parameters
+    ----------
+    exception : Exception
+        The exception which caused the failure
+        
+    Returns
+    -------
+    str
+        `TRANSIENT` or `PERMANENT`
+    '''
+    if isinstance(exception, urllib.error.HTTPError):
+        return TRANSIENT if _is_transient_status(exception.code) else PERMANENT
+    elif isinstance(exception, ProtocolError):
+        return TRANSIENT if _is_transient_status(exception.errcode) else PERMANENT
+    elif isinstance(exception, Fault):
+        # PyPI reports throttling as a fault
+        return TRANSIENT if 'TooManyRequests' in exception.faultString else PERMANENT
+    elif isinstance(exception, (urllib.error.URLError, http.client.HTTPException, ConnectionError, socket.timeout, WorkspaceFull)):
+        return TRANSIENT
+    else:
+        return PERMANENT
+    
+def retry(function, attempts=3, delay=1.0, max_delay=60.0, sleep=time.sleep, on_retry=None):
+    '''
+    Call function, retry with exponential backoff on transient failure
+    
+    Parameters
+    ----------
+    function : () -> any
+    attempts : int
+        Maximum number of calls
+    delay : float
+        Seconds to wait before the first retry, each next retry waits twice as
+        long
+    max_delay : float
+        Maximum number of seconds to wait before a retry
+    sleep : (float) -> None
+    on_retry : ((Exception, float) -> None) or None
+        Called with the exception and the delay before each retry
+        
+    Returns
+    -------
+    any
+        Return of `function`
+        
+    Raises
+    ------
+    Exception
+        The exception of the last call, if it failed permanently or no attempts
+        were left
+    '''
+    for attempt in range(attempts):
+        try:
+            return function()
+        except Exception as ex:
+            if attempt == attempts - 1 or classify(ex) != TRANSIENT:
+                raise
+            delay_ = min(delay * 2 ** attempt, max_delay)
+            if on_retry:
+                on_retry(ex, delay_)
+            sleep(delay_)
+            
+def describe(exception):
+    '''
+    Describe exception in a single line
+    '''
+    description = str(exception).strip().replace('\n', ' ')
+    if description:
+        return '{}: {}'.format(type(exception).__name__, description)
+    else:
+        return type(exception).__name__
+            
+@attr.s
+class RunSummary(object):
+    
+    '''
+    Summary of what happened to packages during a run
+    '''
+    
+    converted = attr.ib(default=attr.Factory(list))  # [pypi_name :: str]
+    retries = attr.ib(default=0)  # int, number of retries of transient failures
+    failed = attr.ib(default=attr.Factory(dict))  # {pypi_name :: str : (classification :: str, description :: str)}
+    quarantined = attr.ib(default=attr.Factory(list))  # [pypi_name :: str], newly quarantined packages
+    in_quarantine = attr.ib(default=attr.Factory(dict))  # {pypi_name :: str : error :: str}, all quarantined packages, including the new ones
+    
+    def log(self, logger):
+        '''
+        Log summary
+        '''
+        logger.info('Converted {} packages, retried {} times'.format(len(self.converted), self.retries))
+        for classification in (TRANSIENT, PERMANENT):
+            failed = sorted(
+                (pypi_name, description)
+                for pypi_name, (classification_, description) in self.failed.items()
+                if classification_ == classification
+            )
+            if failed:
+                logger.warning('{} packages failed {}ly:'.format(len(failed), classification))
+                for pypi_name, description in failed:
+                    logger.warning('  {}: {}'.format(pypi_name, description))
+        if self.quarantined:
+            logger.warning(
+                'Quarantined {} packages until they change on PyPI: {}'
+                .format(len(self.quarantined), ', '.join(sorted(self.quarantined)))
+            )
+        if self.in_quarantine:
+            logger.warning('{} packages are quarantined:'.format(len(self.in_quarantine)))
+            for pypi_name, error in sorted(self.in_quarantine.items()):
+                logger.warning('  {}: {}'.format(pypi_name, error))
@@ -0,0 +1,207 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Log of conversion messages per feed
+
+All messages of all feeds are appended to a single log file as JSON lines,
+each tagged with the package and PyPI serial it belongs to. An SQLite index
+maps each package to the location of its messages in the log, so reading the
+messages of a package takes O(its messages).
+
+The log is flushed before the index entries of its messages are committed, so
+after a crash the index never points past the end of the log; at worst the
+last messages are not in the index.
+'''
+
+from logging.handlers import QueueHandler, QueueListener
+import logging
+import sqlite3
+import queue
+import json
+
+class FeedLoggerAdapter(logging.LoggerAdapter):
+    
+    '''
+    Feed logger of a single package
+    
+    Tags each message with the package and serial, so that messages of packages
+    converted in parallel do not get mixed up.
+    
+    Parameters
+    ----------
+    logger : logging.Logger
+        The feed logger
+    zi_name : str
+        Canonical name of the package
+    serial : int
+        PyPI serial of the package being converted
+    '''
+    
+    def __init__(self, logger, zi_name, serial):
+        super().__init__(logger, {'package': zi_name, 'serial': serial})
+        
+class FeedLog(object):
+    
+    '''
+    Append-only log of messages per feed
+    
+    Use as a context manager. While entered, messages logged to the feed logger
+    through a `FeedLoggerAdapter` are written to the log by a background
+    thread.
+    
+    Parameters
+    ----------
+    log_file : pathlib.Path
+        Log file, messages as JSON lines
+    feed_logger : logging.Logger
+    '''
+    
+    def __init__(self, log_file, feed_logger):
+        self._log_file = log_file
+        self._feed_logger = feed_logger
+        self._queue_handler = None
+        self._listener = None
+        self._writer = None
+        
+    def __enter__(self):
+        self._writer = _FeedLogWriter(self._log_file, _index_file(self._log_file))
+        self._writer.setLevel(logging.INFO)
+        queue_ = queue.Queue()
+        self._queue_handler = QueueHandler(queue_)
+        self._feed_logger.addHandler(self._queue_handler)
+        self._listener = QueueListener(queue_, self._writer, respect_handler_level=True)
+        self._listener.start()
+        return self
+    
+    def __exit__(self, exception_type, exception, traceback):
+        self._feed_logger.removeHandler(self._queue_handler)
+        self._listener.stop()  # Note: handles all queued messages before returning
+        self._writer.close()
+        
+def read_feed_log(log_file, zi_name):
+    '''
+    Read the messages of a package from a feed log
+    
+    Parameters
+    ----------
+    log_file : pathlib.Path
+    zi_name : str
+        Canonical name of the package
+        
+    Returns
+    -------
+    [dict]
+        Messages in the order they were logged. Each message has the keys:
+        package, serial, time (as Unix time), level, message. Messages which
+        are not (entirely) in the log, e.g. after a crash, are skipped.
+    '''
+    index_file = _index_file(log_file)
+    if not index_file.exists() or not log_file.exists():
+        return []
+    connection = sqlite3.connect(index_file.resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        locations = connection.execute(
+            'SELECT offset, length FROM message WHERE package = ? ORDER BY id', (zi_name,)
+        ).fetchall()
+    finally:
+        connection.close()
+    messages = []
+    with log_file.open('rb') as f:
+        for offset, length in locations:
+            f.seek(offset)
+            line = f.read(length)
+            if len(line) < length:
+                continue
+            try:
+                messages.append(json.loads(line.decode()))
+            except ValueError:
+                continue
+    return messages
+
+def _index_file(log_file):
+    return log_file.with_name(log_file.name + '.index.sqlite')
+
+class _FeedLogWriter(logging.Handler):
+    
+    '''
+    Appends messages to the feed log and its index
+    
+    Only to be used by a single thread at a time. Index entries are committed
+    in batches of `batch_size`, and on close.
+    '''
+    
+    def __init__(self, log_file, index_file, batch_size=100):
+        super().__init__()
+        self._log = log_file.open('ab')
+        self._offset = self._log.seek(0, 2)
+        self._index = sqlite3.connect(str(index_file), check_same_thread=False)  # Note: created here, used by the QueueListener thread
+        self._index.execute('''
+            CREATE TABLE IF NOT EXISTS message (
+                id INTEGER PRIMARY KEY,
+                package TEXT NOT NULL,
+                offset INTEGER NOT NULL,  -- of the message's line in the log
+                length INTEGER NOT NULL  -- of the line, in bytes
+            )
+        ''')
+        self._index.execute('CREATE INDEX IF NOT EXISTS message_package ON message (package, id)')
+        self._index.commit()
+        self._batch_size = batch_size
+        self._pending = []  # [(package, offset, length)], not yet in the index
+        
+    def emit(self, record):
+        if not hasattr(record, 'package'):
+            return  # not logged through a FeedLoggerAdapter
+        try:
+            message = {
+                'package': record.package,
+                'serial': record.serial,
+                'time': record.created,
+                'level': record.levelname,
+                'message': record.getMessage(),
+            }
+            # Note: depending on the Python version, QueueHandler either appends
+            # the traceback to the message or leaves it in exc_text
+            if record.exc_text:
+                message['message'] += '\n' + record.exc_text
+            line = (json.dumps(message, sort_keys=True) + '\n').encode()
+            self._log.write(line)
+            self._pending.append((record.package, self._offset, len(line)))
+            self._offset += len(line)
+            if len(self._pending) >= self._batch_size:
+                self._commit()
+        except Exception:
+            self.handleError(record)
+    
+    def _commit(self):
+        '''
+        Add pending messages to the index
+        '''
+        self._log.flush()  # before the index can point to them
+        with self._index:
+            self._index.executemany('INSERT INTO message (package, offset, length) VALUES (?, ?, ?)', self._pending)
+        self._pending = []
+    
+    def close(self):
+        try:
+            self._commit()
+        finally:
+            try:
+                self._log.close()
+                self._index.close()
+            finally:
+                super().close()
@@ -16,101 +16,492 @@
 # along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from pypi_to_0install.convert import convert
-from pypi_to_0install.various import zi, canonical_name 
+from pypi_to_0install.convert import convert, ExtractionLimits, SplitSettings, split_feed, sub_feed_names
+from pypi_to_0install.various import zi, zi_nsmap, canonical_name, write_file
+from pypi_to_0install.publish import FeedPublisher, commit_message, init_repository
+from pypi_to_0install.scheduling import Scheduler, Timings
+from pypi_to_0install.sharding import Shard, merge_shards
+from pypi_to_0install.state import State
+from pypi_to_0install.catalog import Catalog, merge_catalogs
+from pypi_to_0install.names import NameIndex
+from pypi_to_0install.workspace import Workspace
+from pypi_to_0install.pypi_json import JSONPyPI, HTTPCache
+from pypi_to_0install.throttle import ThrottledPyPI, ThrottleSettings
+from pypi_to_0install.failures import RunSummary, PERMANENT, classify, describe, retry
+from pypi_to_0install.feed_log import FeedLog, FeedLoggerAdapter, read_feed_log
 from xmlrpc.client import ServerProxy
 import attr
-from contextlib import contextmanager
-import contextlib
 from pathlib import Path
-import urllib.error
 from lxml import etree
+import argparse
+import datetime
+import hashlib
 
 logger = logging.getLogger(__name__)
 
-#TODO manually check that:
-# append to a log file per feed
-
 @attr.s(frozen=True)
 class Context(object):
     pypi = attr.ib()
     feeds_uri = attr.ib()  # the location where the feeds will be hosted
     pypi_mirror = attr.ib()  # uri of PyPI mirror to use for downloads, if any
     feed_logger = attr.ib()
+    state = attr.ib(default=None)  # State, if any. Distribution results are recorded in it
+    catalog = attr.ib(default=None)  # Catalog, if any. Entries of converted feeds are updated in it
+    workspace = attr.ib(default=None)  # Workspace to unpack distributions in, if None a temporary directory is used
+    extraction_limits = attr.ib(default=ExtractionLimits())  # limits to unpacking a distribution
+    names = attr.ib(default=attr.Factory(lambda: NameIndex([])))  # NameIndex of all packages
+    split = attr.ib(default=SplitSettings())  # when to split feeds into sub-feeds
     
     def feed_uri(self, zi_name):
         return '{}{}.xml'.format(self.feeds_uri, zi_name)
     
+    def zi_name(self, feed_uri):
+        '''
+        Inverse of feed_uri, None if feed_uri is not one of our feeds
+        '''
+        if feed_uri.startswith(self.feeds_uri) and feed_uri.endswith('.xml'):
+            return feed_uri[len(self.feeds_uri):-len('.xml')]
+        return None
+    
 def main():
+    args = parse_args()
+    directory = Path(args.directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    feeds_directory = directory / 'feeds'
+    feeds_directory.mkdir(exist_ok=True)
+    feeds_repository = directory / 'feeds.git'
+    feed_logger = logging.getLogger(__name__ + ':current_feed')
+    pypi = ServerProxy(args.pypi, use_datetime=True)  # See https://wiki.python.org/moin/PyPIXmlRpc
+    if args.pypi_json:
+        pypi = JSONPyPI(args.pypi_json, HTTPCache(directory / 'http_cache'), fallback=pypi)
+    pypi = ThrottledPyPI(pypi, ThrottleSettings(
+        rate=args.pypi_rate,
+        max_rate=max(args.pypi_rate, args.pypi_max_rate),
+        max_limit=args.pypi_max_concurrency,
+    ))
     context = Context(
-        pypi=ServerProxy('https://pypi.python.org/pypi', use_datetime=True),  # See https://wiki.python.org/moin/PyPIXmlRpc
+        pypi=pypi,
         feeds_uri='https://timdiels.github.io/pypi-to-0install/feeds/',
-        pypi_mirror='http://localhost/',
-        feed_logger=logging.getLogger(__name__ + ':current_feed')
+        pypi_mirror=args.pypi_mirror,
+        feed_logger=feed_logger,
+        extraction_limits=ExtractionLimits(
+            size=args.max_unpacked_size * 2**20,
+            members=args.max_members,
+            depth=args.max_depth,
+            duration=args.max_unpack_time,
+        ),
+        split=SplitSettings(
+            max_implementations=args.split_feeds,
+            recent_ranges=args.recent_ranges,
+        ),
     )
     
-    configure_logging(context)
+    configure_logging(context, directory / 'pypi_to_0install.log')
+    feed_log_file = directory / 'feeds.log'
+    
+    # Show log of a feed
+    if args.feed_log:
+        for message in read_feed_log(feed_log_file, canonical_name(args.feed_log)):
+            print('{} {} serial={}: {}'.format(message['level'][0], datetime.datetime.fromtimestamp(message['time']), message['serial'], message['message']))
+        return
+    
+    # Query the reverse dependency index
+    if args.dependents or args.dangling:
+        state = State.open(directory / 'state.sqlite')
+        try:
+            if args.dependents:
+                for pypi_name in state.dependents(canonical_name(args.dependents)):
+                    print(pypi_name)
+            else:
+                for zi_name, dependents in sorted(state.dangling_dependencies().items()):
+                    print('{}: required by {}'.format(zi_name, ', '.join(dependents)))
+        finally:
+            state.close()
+        return
+    
+    # Merge feeds of shards
+    if args.merge:
+        changed_files, removed_files = merge_shards((Path(shard_directory) / 'feeds' for shard_directory in args.merge), feeds_directory)
+        changed_catalogs, removed_catalogs = merge_catalogs((Path(shard_directory) / 'catalog' for shard_directory in args.merge), directory / 'catalog')
+        init_repository(feeds_repository)
+        with FeedPublisher(feeds_repository, 'Merge {} shards'.format(len(args.merge))) as publisher:
+            for feed_file in changed_files:
+                publisher.add(feed_file.name, feed_file.read_bytes())
+            for feed_file in removed_files:
+                publisher.remove(feed_file.name)
+            for catalog_file in changed_catalogs:
+                publisher.add('catalog/' + catalog_file.name, catalog_file.read_bytes())
+            for catalog_file in removed_catalogs:
+                publisher.remove('catalog/' + catalog_file.name)
+        return
 
-    # Get list of changed packages
-    #TODO uncomment, debug
-#     if not last_serial:
-#         changed_packages = pypi.list_packages()  # [package_name :: str] #TODO should be a set
-#     else:
-#         serial = pypi.changelog_last_serial()
-#         changed_packages = changed_packages_since(context, last_serial)
-        #TODO save changed_packages and also save serial as last_serial
-        #TODO add log messages to this part
+    # Update package list
+    state = State.open(directory / 'state.sqlite')
+    catalog = Catalog(state, directory / 'catalog', shard_count=args.catalog_shards)
+    workspace = Workspace(
+        Path(args.scratch_directory) if args.scratch_directory else None,
+        max_usage=args.scratch_max_usage and args.scratch_max_usage * 2**20
+    )
+    context = attr.assoc(context, state=state, catalog=catalog, workspace=workspace)
+    last_serial = state.last_serial
+    serial = context.pypi.changelog_last_serial()
+    if last_serial is None or args.bootstrap:
+        logger.info('Listing all packages')
+        state.replace_packages(context.pypi.list_packages_with_serial(), serial)  # {pypi_name :: str : serial :: int}
+    else:
+        logger.info('Getting changes since serial {}'.format(last_serial))
+        state.apply_changes(context.pypi.changelog_since_serial(last_serial), serial)
+        
+    # Index names
+    names = NameIndex(state.pypi_names())
+    context = attr.assoc(context, names=names)
+    for zi_name, pypi_names in sorted(names.collisions.items()):
+        logger.warning(
+            'PyPI names {} all map to feed {}, only {} is converted'
+            .format(', '.join(pypi_names), zi_name, pypi_names[0])
+        )
     
     # Update/create feeds of changed packages
-    changed_packages = {'chicken_turtle_util'}  #TODO rm, debug
-#     changed_packages = ['FireWorks']  #TODO rm, debug
-    for pypi_name in changed_packages.copy(): #TODO when a package raises (only on some errors, e.g. a release_url disappeared), skip it and try again next run
-        zi_name = canonical_name(pypi_name)
-        feed_file = Path(zi_name + '.xml')
-        with feed_log_handler(context, feed_file.with_suffix('.log')):
-            try:
-                context.feed_logger.info('Updating {}'.format(pypi_name))
-                
-                # Read ZI feed file corresponding to the PyPI package, if any 
-                if feed_file.exists():
-                    assert False  #TODO implement: parse it
-                    feed = stuff
-                else:
-                    feed = etree.ElementTree(zi.interface())
-                    
-                # Convert to ZI feed
-                feed = convert(context, pypi_name, zi_name, feed)
-                
-                # Write feed
-                context.feed_logger.info('Swapping old feed file with new one')  # TODO write to a temp feed file, then swap to avoid corrupt fail that would crash next run
-                context.feed_logger.info('Swapped')
-                #TODO also sign it
-                write(feed)
-                
-                # Mark package up to date
-                changed_packages.remove(pypi_name)
-                save_changed_packages(changed_packages)
-                context.feed_logger.info('Marked up to date')
-            except urllib.error.HTTPError:
-                context.feed_logger.exception('Error occurred, will retry updating package on next run')
-
-def load_changed_packages():
-    with open('changed_packages') as f:
-        return set(f.read().split())
+    changed_packages = state.pending_packages(quarantine_after=args.quarantine_after)
+    logger.info('{} feeds are stale'.format(len(changed_packages)))
     
-def save_changed_packages(changed_packages):
-    with open('changed_packages') as f:
-        f.write('\n'.join(changed_packages))
+    # Skip names which collide with the owner of their feed, see the warnings above
+    not_owners = sorted(
+        pypi_name for pypi_name in changed_packages
+        if names.owner(names.zi_name(pypi_name)) != pypi_name
+    )
+    for pypi_name in not_owners:
+        del changed_packages[pypi_name]
+    if not_owners:
+        logger.info('Skipping {} changed packages whose feed another package owns: {}'.format(len(not_owners), ', '.join(not_owners)))
+
+    # Only convert the packages of our shard
+    if args.shard:
+        changed_packages = {
+            pypi_name: serial_
+            for pypi_name, serial_ in changed_packages.items()
+            if names.zi_name(pypi_name) in args.shard
+        }
+        logger.info('Shard {} has {} changed packages'.format(args.shard, len(changed_packages)))
         
-def load_last_serial():
-    with open('last_serial') as f:
-        return int(f.read().trim())
+    init_repository(feeds_repository)
+    timings = Timings(state.durations())
+    time_limit = None if args.time_limit is None else args.time_limit * 60
+    scheduler = Scheduler(timings, time_limit=time_limit, margin=60)
+    dependent_counts = state.dependent_counts()  # packages many others depend on are converted first
+    summary = RunSummary()
+    try:
+        with FeedPublisher(feeds_repository, commit_message(last_serial, serial), feeds_per_commit=args.feeds_per_commit) as publisher, FeedLog(feed_log_file, feed_logger):
+            # Remove feeds of removed packages, unless another package took the name
+            for zi_name in state.retired_feeds():
+                if names.pypi_names(zi_name):
+                    state.clear_retired_feed(zi_name)
+                elif not args.shard or zi_name in args.shard:
+                    retire_feed(context, publisher, zi_name, feeds_directory)
+            
+            for pypi_name in scheduler.schedule(changed_packages, popularity=dependent_counts, since_serial=last_serial):
+                zi_name = names.zi_name(pypi_name)
+                package_serial = changed_packages[pypi_name]
+                context = attr.assoc(context, feed_logger=FeedLoggerAdapter(feed_logger, zi_name, package_serial))
+                with scheduler.timed(pypi_name):
+                    def on_retry(ex, delay):
+                        summary.retries += 1
+                        context.feed_logger.warning('Transient failure, retrying in {:.0f}s: {}'.format(delay, describe(ex)))
+                    try:
+                        retry(
+                            lambda: update_feed(context, publisher, pypi_name, zi_name, package_serial, feeds_directory),
+                            on_retry=on_retry
+                        )
+                        del changed_packages[pypi_name]
+                        summary.converted.append(pypi_name)
+                    except Exception as ex:
+                        classification = classify(ex)
+                        description = describe(ex)
+                        context.feed_logger.exception('Failed {}ly, will retry updating package on next run'.format(classification))
+                        summary.failed[pypi_name] = (classification, description)
+                        if classification == PERMANENT:
+                            failures = state.add_failure(pypi_name, package_serial, description)
+                            if failures >= args.quarantine_after:
+                                context.feed_logger.error('Failed {} times in a row, quarantining until the package changes'.format(failures))
+                                summary.quarantined.append(pypi_name)
+                state.set_duration(pypi_name, timings.estimate(pypi_name))
+            catalog.write(publisher)
+        summary.in_quarantine = state.quarantined_packages(args.quarantine_after)  # Note: pending_packages omits them, so they are reported here
+    finally:
+        workspace.close()
+        state.close()
+    summary.log(logger)
+    logger.info(
+        'Made {calls} calls to PyPI, {throttled} throttled, {slow} slow; '
+        'ended at {rate:.2f} calls/s, {limit:.0f} concurrent'
+        .format(**pypi.metrics())
+    )
+    if scheduler.skipped:
+        logger.info('Skipped {} packages which would not finish in time'.format(len(scheduler.skipped)))
+    logger.info('{} packages left for the next run'.format(len(changed_packages)))
     
-def write_last_serial(last_serial):
-    with open('last_serial') as f:
-        f.write(str(last_serial))
-        
-def configure_logging(context): #TODO manually test feed logger and main logger are set up correctly
+def update_feed(context, publisher, pypi_name, zi_name, serial, feeds_directory):
+    '''
+    Update/create feed of package and mark it up to date
+    '''
+    feed_file = feeds_directory / (zi_name + '.xml')
+    context.feed_logger.info('Updating {}'.format(pypi_name))
+    context.names.check_owner(pypi_name)  # do not overwrite the feed of another package
+    
+    # Read ZI feed file corresponding to the PyPI package, if any, with the
+    # implementations of its sub-feeds
+    old_sub_feeds = []
+    if feed_file.exists():
+        feed = read_feed(feed_file)
+        old_sub_feeds = sub_feed_names(context, feed)
+        for sub_name in old_sub_feeds:
+            sub_feed_file = feeds_directory / (sub_name + '.xml')
+            if sub_feed_file.exists():
+                sub_feed = read_feed(sub_feed_file)
+                feed.getroot().extend(sub_feed.xpath('zi:implementation | zi:group', namespaces={'zi': zi_nsmap[None]}))
+    else:
+        feed = etree.ElementTree(zi.interface())
+    
+    # Convert to ZI feed
+    feed = convert(context, pypi_name, zi_name, feed)
+    main_feed, sub_feeds = split_feed(context, zi_name, feed, context.split)
+    
+    # Write sub-feeds, only those which changed. Note: they are written before
+    # the main feed, so the main feed never references a missing sub-feed
+    #TODO also sign them
+    for sub_name, sub_feed in sub_feeds.items():
+        if write_feed(sub_feed, feeds_directory / (sub_name + '.xml'), publisher):
+            context.feed_logger.info('Wrote sub-feed {}'.format(sub_name))
+    
+    # Write feed
+    #TODO also sign it
+    if write_feed(main_feed, feed_file, publisher):
+        context.feed_logger.info('Wrote feed')
+    else:
+        context.feed_logger.info('Feed unchanged')
+    
+    # Remove sub-feeds which are no longer referenced
+    for sub_name in old_sub_feeds:
+        sub_feed_file = feeds_directory / (sub_name + '.xml')
+        if sub_name not in sub_feeds:
+            if sub_feed_file.exists():
+                sub_feed_file.unlink()
+            publisher.remove(sub_feed_file.name)
+            context.feed_logger.info('Removed sub-feed {}'.format(sub_name))
+    
+    # Update reverse dependency index and catalog
+    dependencies = (context.zi_name(uri) for uri in feed.xpath('//zi:requires/@interface', namespaces={'zi': zi_nsmap[None]}))
+    context.state.set_dependencies(pypi_name, {zi_name_ for zi_name_ in dependencies if zi_name_})
+    if context.catalog:
+        context.catalog.update(pypi_name, zi_name, feed)
+    
+    # Mark package up to date once the feed is in the repository. Note: else
+    # an interrupted run would leave it unpublished, yet no longer pending
+    fingerprint = hashlib.sha256(feed_file.read_bytes()).hexdigest()
+    def mark_converted():
+        context.state.mark_converted(pypi_name, serial, fingerprint)
+        context.feed_logger.info('Marked up to date')
+    publisher.when_committed(mark_converted)
+
+def retire_feed(context, publisher, zi_name, feeds_directory):
+    '''
+    Remove feed of a removed package, with its sub-feeds
+    '''
+    feed_file = feeds_directory / (zi_name + '.xml')
+    files = [feed_file]
+    if feed_file.exists():
+        files.extend(feeds_directory / (sub_name + '.xml') for sub_name in sub_feed_names(context, read_feed(feed_file)))
+    for file_ in files:
+        if file_.exists():
+            file_.unlink()
+        publisher.remove(file_.name)
+    logger.info('Removed feed {} of removed package'.format(zi_name))
+    publisher.when_committed(lambda: context.state.clear_retired_feed(zi_name))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Convert PyPI packages to Zero Install feeds')
+    parser.add_argument(
+        '--directory', default='.',
+        help='Directory to store feeds and the state of the conversion in. '
+        'Defaults to the current working directory.'
+    )
+    parser.add_argument(
+        '--pypi', default='https://pypi.python.org/pypi', metavar='URI',
+        help='URI of the PyPI XML-RPC interface'
+    )
+    parser.add_argument(
+        '--pypi-json', metavar='URI',
+        help='Get package metadata from the PyPI JSON API at this URI (e.g. '
+        'https://pypi.org/pypi) instead of from the XML-RPC interface. Responses '
+        'are cached, unchanged metadata is not downloaded again.'
+    )
+    parser.add_argument(
+        '--pypi-rate', type=float, default=5.0, metavar='CALLS',
+        help='Initial maximum number of calls per second to PyPI. The rate '
+        'adapts: it increases while calls succeed and is halved when PyPI '
+        'throttles. Default: %(default)s.'
+    )
+    parser.add_argument(
+        '--pypi-max-rate', type=float, default=50.0, metavar='CALLS',
+        help='Maximum number of calls per second to PyPI. Default: %(default)s.'
+    )
+    parser.add_argument(
+        '--pypi-max-concurrency', type=int, default=16, metavar='COUNT',
+        help='Maximum number of concurrent calls to PyPI. Default: %(default)s.'
+    )
+    parser.add_argument(
+        '--pypi-mirror', default='http://localhost/', metavar='URI',
+        help='URI of PyPI mirror to download distributions from'
+    )
+    parser.add_argument(
+        '--bootstrap', action='store_true',
+        help='Rebuild the package list from the full list of packages on PyPI '
+        'instead of from the changelog. This happens automatically on the first run.'
+    )
+    parser.add_argument(
+        '--time-limit', type=float, metavar='MINUTES',
+        help='Stop converting packages before this many minutes have passed. '
+        'Packages which are not converted in time, are converted on the next run.'
+    )
+    parser.add_argument(
+        '--quarantine-after', type=int, default=3, metavar='FAILURES',
+        help='Stop retrying a package after it failed permanently this many runs '
+        'in a row, until it changes on PyPI. Default: %(default)s.'
+    )
+    parser.add_argument(
+        '--shard', type=Shard.parse, metavar='INDEX/COUNT',
+        help='Only convert packages of the given shard, e.g. 0/4 for the first '
+        'of 4 shards. Each shard should be run in a different directory and '
+        'can run on a different machine. Use --merge to combine their feeds.'
+    )
+    parser.add_argument(
+        '--scratch-directory', metavar='DIRECTORY',
+        help='Directory to download and unpack distributions in, e.g. on a '
+        'tmpfs. Can be shared by multiple runs. Defaults to a directory in the '
+        "system's temporary directory."
+    )
+    parser.add_argument(
+        '--scratch-max-usage', type=int, metavar='MB',
+        help='Wait before unpacking a distribution while the files in the '
+        'scratch directory take up this many MB or more'
+    )
+    parser.add_argument(
+        '--feeds-per-commit', type=int, default=1000, metavar='COUNT',
+        help='Commit to the feeds repository each time COUNT feed files '
+        'changed. A package is only marked up to date once its feed is '
+        'committed. Default: %(default)s.'
+    )
+    parser.add_argument(
+        '--split-feeds', type=int, metavar='COUNT',
+        help='Split feeds with more than COUNT implementations: implementations '
+        'of older release ranges (epoch and major version, e.g. 1.x) move to a '
+        'sub-feed per range. By default, feeds are not split.'
+    )
+    parser.add_argument(
+        '--recent-ranges', type=int, default=2, metavar='COUNT',
+        help='Number of newest release ranges to keep in the main feed of a '
+        'split feed. Default: %(default)s.'
+    )
+    parser.add_argument(
+        '--max-unpacked-size', type=int, default=1024, metavar='MB',
+        help='Fail a distribution whose download or files take up more than '
+        'this many MB when unpacked. Default: %(default)s.'
+    )
+    parser.add_argument(
+        '--max-members', type=int, default=100000, metavar='COUNT',
+        help='Fail a distribution whose archive has more than this many files '
+        'and directories. Default: %(default)s.'
+    )
+    parser.add_argument(
+        '--max-depth', type=int, default=64, metavar='COUNT',
+        help='Fail a distribution whose archive has directories nested this '
+        'deep. Default: %(default)s.'
+    )
+    parser.add_argument(
+        '--max-unpack-time', type=float, default=300.0, metavar='SECONDS',
+        help='Fail a distribution which takes longer than this to download and '
+        'unpack. Default: %(default)s.'
+    )
+    parser.add_argument(
+        '--catalog-shards', type=int, default=16, metavar='COUNT',
+        help='Number of files to split the catalog of all feeds in. Only the '
+        'files with changed entries are rewritten each run. Default: %(default)s.'
+    )
+    parser.add_argument(
+        '--feed-log', metavar='PACKAGE',
+        help='Instead of converting, print the log messages of a package'
+    )
+    parser.add_argument(
+        '--dependents', metavar='PACKAGE',
+        help='Instead of converting, print the packages whose feed requires PACKAGE'
+    )
+    parser.add_argument(
+        '--dangling', action='store_true',
+        help='Instead of converting, print the required feeds which do not '
+        'correspond to a PyPI package, and which packages require them'
+    )
+    parser.add_argument(
+        '--merge', nargs='+', metavar='SHARD_DIRECTORY',
+        help='Instead of converting, merge the feeds and catalogs of shards (their '
+        '--directory) into those of --directory. Feeds in none of the shards are '
+        'removed.'
+    )
+    return parser.parse_args()
+    
+def read_feed(feed_file):
+    '''
+    Read feed file
+    
+    Returns
+    -------
+    lxml.etree.ElementTree
+    '''
+    # Note: blank text is removed so that reused elements are pretty printed
+    # the same way as newly converted ones
+    parser = etree.XMLParser(remove_blank_text=True)
+    return etree.parse(str(feed_file), parser)
+
+def serialize_feed(feed):
+    '''
+    Serialize feed canonically
+    
+    Serializing the same feed always yields the same bytes.
+    
+    Returns
+    -------
+    bytes
+    '''
+    return etree.tostring(feed, encoding='utf-8', xml_declaration=True, pretty_print=True)
+
+def write_feed(feed, feed_file, publisher=None):
+    '''
+    Write feed to file and publish it, unless its contents would not change
+    
+    The file is written if its contents differ from the feed and, separately,
+    published if its contents differ from the published file.
+    
+    Parameters
+    ----------
+    feed : lxml.etree.ElementTree
+    feed_file : pathlib.Path
+    publisher : FeedPublisher or None
+        Publisher to add the file to, if any
+    
+    Returns
+    -------
+    bool
+        True iff the file was written or published
+    '''
+    contents = serialize_feed(feed)
+    changed = False
+    if not feed_file.exists() or feed_file.read_bytes() != contents:
+        write_file(feed_file, contents)
+        changed = True
+    if publisher and publisher.add(feed_file.name, contents):
+        changed = True
+    return changed
+
+def configure_logging(context, log_file): #TODO manually test feed logger and main logger are set up correctly
     root_logger = logging.getLogger()
     
     # Reset logging (zeroinstall calls logging.basicConfig when imported, naughty naughty)
@@ -123,7 +514,7 @@ def configure_logging(context): #TODO manually test feed logger and main logger
     root_logger.addHandler(stderr_handler)
     
     # Log debug to file in full format
-    file_handler = logging.FileHandler('pypi_to_0install.log')
+    file_handler = logging.FileHandler(str(log_file))
     file_handler.setFormatter(logging.Formatter('{levelname[0]} {asctime}: {message}', style='{'))
     root_logger.addHandler(file_handler)
      
@@ -135,35 +526,9 @@ def configure_logging(context): #TODO manually test feed logger and main logger
     stderr_handler.setLevel(logging.DEBUG)
     file_handler.setLevel(logging.DEBUG)
     
-@contextmanager
-def feed_log_handler(context, log_file):
-    file_handler = logging.FileHandler(str(log_file))
-    with contextlib.closing(file_handler):
-        file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(logging.Formatter('{levelname[0]} {asctime}: {message}', style='{'))
-        context.feed_logger.addHandler(file_handler)
-        try:
-            yield
-        finally:
-            context.feed_logger.removeHandler(file_handler)
-        
-#TODO regularly persist changed_packages so that when killed, we don't miss or redo anything 
 #TODO protect against sigkill everywhere; failed downloads; ...
 #TODO when killed, surely all is lost as we don't clone?
 
-#TODO only implement this is if run from scratch takes >>30 min. May need to
-#have a time limit on the whole process at which we stop work, leaving the rest
-#for the next run (Travis time limit)
-    
-def changed_packages_since(context, serial):
-    changes = context.pypi.changelog_since_serial(serial)  # list of five-tuples (name, version, timestamp, action, serial) since given serial
-    return [change[0] for change in changes]
-
-#TODO
-# initial commit: "Initial commit: PyPI serial {}"
-# update: "Update: PyPI serial {old} -> {new}"
-# Probably don't want to make a separate commit each time; just force update it
-
 if __name__ == '__main__':
     main()
 
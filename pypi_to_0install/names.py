@@ -0,0 +1,135 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Mapping between PyPI names and ZI names
+
+Each feed is named after the `canonical_name` of a PyPI name. Legacy PyPI
+packages may differ only in case or separators (e.g. ``Foo_Bar`` and
+``foo-bar``), such colliding names map to the same feed. Only one of them, its
+owner, is converted to it.
+'''
+
+from pypi_to_0install.various import canonical_name
+from collections import defaultdict
+
+class NameCollision(Exception):
+    
+    '''
+    PyPI name maps to a feed owned by another PyPI name
+    '''
+    
+class NameIndex(object):
+    
+    '''
+    Index of PyPI names by ZI name and vice versa
+    
+    Built once from the list of all packages. Lookups take O(1).
+    
+    Parameters
+    ----------
+    pypi_names : iterable(str)
+    '''
+    
+    def __init__(self, pypi_names):
+        self._zi_names = {}  # pypi_name -> zi_name
+        pypi_names_ = defaultdict(list)  # zi_name -> [pypi_name]
+        for pypi_name in pypi_names:
+            zi_name = canonical_name(pypi_name)
+            self._zi_names[pypi_name] = zi_name
+            pypi_names_[zi_name].append(pypi_name)
+        self._pypi_names = {}  # zi_name -> [pypi_name], owner first
+        self._collisions = {}  # zi_name -> [pypi_name], owner first
+        for zi_name, names in pypi_names_.items():
+            names.sort(key=lambda pypi_name: (pypi_name != zi_name, pypi_name))
+            self._pypi_names[zi_name] = names
+            if len(names) > 1:
+                self._collisions[zi_name] = names
+                
+    def zi_name(self, pypi_name):
+        '''
+        Get ZI name of PyPI name
+        
+        The name need not be in the index, e.g. a dependency on a package
+        which does not exist.
+        
+        Returns
+        -------
+        str
+        '''
+        zi_name = self._zi_names.get(pypi_name)
+        if zi_name is None:
+            zi_name = canonical_name(pypi_name)
+        return zi_name
+    
+    def pypi_names(self, zi_name):
+        '''
+        Get PyPI names which map to ZI name
+        
+        Returns
+        -------
+        [str]
+            Owner first, empty if none
+        '''
+        return list(self._pypi_names.get(zi_name, ()))
+    
+    def owner(self, zi_name):
+        '''
+        Get PyPI name whose package is converted to the feed of ZI name
+        
+        Of colliding names, the one equal to the ZI name is the owner, else
+        the first in sorted order.
+        
+        Returns
+        -------
+        str or None
+            None if no PyPI name maps to the ZI name
+        '''
+        names = self._pypi_names.get(zi_name)
+        return names[0] if names else None
+    
+    def check_owner(self, pypi_name):
+        '''
+        Raise if PyPI name does not own its feed
+        
+        Raises
+        ------
+        NameCollision
+            If another PyPI name owns the feed
+        '''
+        zi_name = self.zi_name(pypi_name)
+        owner = self.owner(zi_name)
+        if owner is not None and owner != pypi_name:
+            raise NameCollision(
+                'PyPI names {} all map to feed {}, only {} is converted'
+                .format(', '.join(self._pypi_names[zi_name]), zi_name, owner)
+            )
+        
+    @property
+    def collisions(self):
+        '''
+        Colliding names
+        
+        Returns
+        -------
+        {zi_name :: str : [pypi_name :: str]}
+            PyPI names of each ZI name with more than one, owner first
+        '''
+        return {zi_name: list(names) for zi_name, names in self._collisions.items()}
+    
+    def __len__(self):
+        return len(self._zi_names)
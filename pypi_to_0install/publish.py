@@ -0,0 +1,278 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Publishing of feeds to a git repository
+'''
+
+import subprocess
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def commit_message(old_serial, new_serial):
+    '''
+    Get message of a commit which updates the feeds to a PyPI serial
+    
+    Parameters
+    ----------
+    old_serial : int or None
+        PyPI serial the feeds were at before the update, None if the
+        repository has no feeds yet
+    new_serial : int
+        PyPI serial the feeds are at after the update
+    '''
+    if old_serial is None:
+        return 'Initial commit: PyPI serial {}'.format(new_serial)
+    else:
+        return 'Update: PyPI serial {} -> {}'.format(old_serial, new_serial)
+
+def init_repository(repository):
+    '''
+    Create bare git repository unless it already exists
+    
+    Parameters
+    ----------
+    repository : pathlib.Path
+    '''
+    if not repository.exists():
+        logger.info('Creating feed repository: {}'.format(repository))
+        subprocess.check_call(['git', 'init', '--quiet', '--bare', str(repository)])
+        
+class FeedPublisher(object):
+    
+    '''
+    Commits feed files to a git repository in batches
+    
+    All git objects are written by a single ``git fast-import`` process, so no
+    process is spawned and no working tree or index is touched per feed. This
+    works on bare repositories.
+    
+    Use as context manager; on exit the remaining changes are committed and the
+    git process is stopped. If an exception was raised, the changes added so
+    far are still committed, with ``(interrupted)`` appended to the message,
+    if the git process is still running.
+    
+    A commit only returns once git has written it to the repository, so
+    callers can safely record what was published: see `when_committed`.
+    
+    Files whose contents are already in the branch are not added again, so
+    adding all files of a feed only changes those which differ from what was
+    published, even if a previous run was interrupted before it could commit.
+    
+    Parameters
+    ----------
+    repository : pathlib.Path
+        Git repository (may be bare)
+    message : str
+        Commit message
+    branch : str
+        Branch to commit to. It is created if it does not exist.
+    feeds_per_commit : int or None
+        Commit each time this many feed files have been changed. If None, all
+        changes are committed in a single commit on exit.
+    author : str
+        ``Name <email>`` of the committer
+    '''
+    
+    def __init__(self, repository, message, branch='master', feeds_per_commit=None, author='PyPI to 0install <pypi-to-0install@localhost>'):
+        self._repository = repository
+        self._message = message
+        self._ref = 'refs/heads/' + branch
+        self._feeds_per_commit = feeds_per_commit
+        self._author = author
+        self._process = None
+        self._changes = []  # [(path :: str, mark :: int or None)], None means delete
+        self._callbacks = []  # [() -> None], to call once the changes are committed
+        self._last_mark = 0
+        self._commits = 0
+        self._has_parent = None
+        self._blobs = {}  # path -> sha1 digest of the git blob of the file in the branch, including uncommitted changes
+    
+    def __enter__(self):
+        repository = str(self._repository)
+        self._has_parent = subprocess.call(
+            ['git', '-C', repository, 'rev-parse', '--verify', '--quiet', self._ref],
+            stdout=subprocess.DEVNULL
+        ) == 0
+        if self._has_parent:
+            tree = subprocess.check_output(['git', '-C', repository, 'ls-tree', '-r', '-z', '--full-tree', self._ref])
+            for entry in tree.split(b'\0'):
+                if entry:
+                    info, path = entry.split(b'\t', 1)
+                    self._blobs[path.decode('utf-8', 'surrogateescape')] = bytes.fromhex(info.split()[2].decode())
+        self._process = subprocess.Popen(
+            ['git', '-C', repository, 'fast-import', '--quiet', '--done'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        return self
+    
+    def __exit__(self, exception_type, exception, traceback):
+        try:
+            if exception_type is None:
+                self.commit()
+                self._write(b'done\n')
+            else:
+                # Commit what was added so far, so that it is not lost. Note:
+                # git may have been interrupted as well, e.g. by Ctrl+C
+                try:
+                    self.commit(interrupted=True)
+                    self._write(b'done\n')
+                except Exception:
+                    logger.exception('Failed to commit changed feed files after an error, they are not published')
+            self._process.stdin.close()
+        except BrokenPipeError:
+            if exception_type is None:
+                raise
+        finally:
+            return_code = self._process.wait()
+            self._process.stdout.close()
+        if return_code != 0 and exception_type is None:
+            raise subprocess.CalledProcessError(return_code, 'git fast-import')
+        
+    @property
+    def commits(self):
+        '''
+        Number of commits made so far
+        '''
+        return self._commits
+    
+    def add(self, path, contents):
+        '''
+        Add or update feed file, unless it already has these contents
+        
+        Parameters
+        ----------
+        path : str
+            Path relative to the repository root, using ``/`` as separator
+        contents : bytes
+        
+        Returns
+        -------
+        bool
+            True iff the file was changed
+        '''
+        blob = hashlib.sha1(b'blob ' + str(len(contents)).encode() + b'\0' + contents).digest()
+        if self._blobs.get(path) == blob:
+            return False
+        self._blobs[path] = blob
+        self._last_mark += 1
+        self._write('blob\nmark :{}\ndata {}\n'.format(self._last_mark, len(contents)).encode())
+        self._write(contents)
+        self._write(b'\n')
+        self._add_change(path, self._last_mark)
+        return True
+    
+    def remove(self, path):
+        '''
+        Remove feed file, if it exists
+        
+        Parameters
+        ----------
+        path : str
+            Path relative to the repository root, using ``/`` as separator
+        '''
+        if self._blobs.pop(path, None) is not None:
+            self._add_change(path, None)
+        
+    def when_committed(self, callback):
+        '''
+        Call callback once all changes added so far are committed
+        
+        If there are no uncommitted changes, it is called immediately. If the
+        changes are never committed, e.g. because git failed, it is never
+        called.
+        
+        Parameters
+        ----------
+        callback : () -> None
+        '''
+        if self._changes:
+            self._callbacks.append(callback)
+        else:
+            callback()
+    
+    def _add_change(self, path, mark):
+        self._changes.append((_quote_path(path), mark))
+        if self._feeds_per_commit and len(self._changes) >= self._feeds_per_commit:
+            self.commit()
+            
+    def commit(self, interrupted=False):
+        '''
+        Commit pending changes, if any
+        
+        Returns once the commit is in the repository, then calls the callbacks
+        of `when_committed`.
+        
+        Parameters
+        ----------
+        interrupted : bool
+            Whether the changes are incomplete because of an error
+        '''
+        if not self._changes:
+            return
+        message = self._message
+        if interrupted:
+            message += ' (interrupted)'
+        message = message.encode()
+        lines = [
+            'commit {}'.format(self._ref),
+            'committer {} {} +0000'.format(self._author, int(time.time())),
+            'data {}'.format(len(message)),
+        ]
+        self._write('\n'.join(lines).encode() + b'\n' + message + b'\n')
+        
+        # The first commit continues from the existing branch, later commits of
+        # this process automatically continue from the previous one
+        if self._commits == 0 and self._has_parent:
+            self._write('from {}^0\n'.format(self._ref).encode())
+            
+        lines = []
+        for path, mark in self._changes:
+            if mark is None:
+                lines.append('D {}'.format(path))
+            else:
+                lines.append('M 100644 :{} {}'.format(mark, path))
+        self._write('\n'.join(lines).encode() + b'\n\n')
+        
+        # Update the ref and flush the pack, so committed work survives a
+        # crash. git prints the progress message once it has done so
+        progress = 'progress commit {}'.format(self._commits + 1).encode()
+        self._write(b'checkpoint\n\n' + progress + b'\n')
+        self._process.stdin.flush()
+        if self._process.stdout.readline().rstrip(b'\n') != progress:
+            raise subprocess.CalledProcessError(self._process.wait(), 'git fast-import')
+        
+        logger.info('Committed {} changed feed files'.format(len(self._changes)))
+        self._changes = []
+        self._commits += 1
+        callbacks = self._callbacks
+        self._callbacks = []
+        for callback in callbacks:
+            callback()
+        
+    def _write(self, data):
+        self._process.stdin.write(data)
+        
+def _quote_path(path):
+    if '\n' in path:
+        raise ValueError('Path must not contain newlines: {!r}'.format(path))
+    if path.startswith('"'):
+        return '"{}"'.format(path.replace('\\', '\\\\').replace('"', '\\"'))
+    return path
@@ -0,0 +1,191 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Access to PyPI metadata through PyPI's JSON API
+'''
+
+from pypi_to_0install.various import write_file
+from urllib.request import Request, urlopen
+from urllib.parse import quote
+import urllib.error
+import datetime
+import hashlib
+import logging
+import json
+
+logger = logging.getLogger(__name__)
+
+class HTTPCache(object):
+    
+    '''
+    Cache of HTTP responses, refreshed with conditional requests
+    
+    Each response is stored along with its ``ETag`` and ``Last-Modified``
+    headers. When getting a cached URL, these are sent as ``If-None-Match``
+    and ``If-Modified-Since``; if the server replies 304 Not Modified, the
+    cached response is returned.
+    
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Directory to store responses in
+    timeout : float
+        Seconds to wait for the server
+    '''
+    
+    def __init__(self, directory, timeout=60):
+        self._directory = directory
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._timeout = timeout
+        self.hits = 0  #: number of responses reused after a 304
+        self.misses = 0  #: number of full responses downloaded
+        
+    def get(self, url):
+        '''
+        Get response body
+        
+        Parameters
+        ----------
+        url : str
+        
+        Returns
+        -------
+        bytes
+        
+        Raises
+        ------
+        urllib.error.HTTPError
+            If the server responds with an error
+        '''
+        key = hashlib.sha256(url.encode()).hexdigest()
+        body_file = self._directory / key
+        headers_file = self._directory / (key + '.headers')
+        
+        # Conditional request if cached
+        request = Request(url)
+        if body_file.exists() and headers_file.exists():
+            headers = json.loads(headers_file.read_text())
+            if headers.get('etag'):
+                request.add_header('If-None-Match', headers['etag'])
+            if headers.get('last-modified'):
+                request.add_header('If-Modified-Since', headers['last-modified'])
+                
+        # Get
+        try:
+            with urlopen(request, timeout=self._timeout) as response:
+                body = response.read()
+                headers = {
+                    'etag': response.headers.get('ETag'),
+                    'last-modified': response.headers.get('Last-Modified'),
+                }
+        except urllib.error.HTTPError as ex:
+            if ex.code == 304:
+                self.hits += 1
+                return body_file.read_bytes()
+            raise
+        
+        # Cache
+        self.misses += 1
+        if headers['etag'] or headers['last-modified']:
+            write_file(body_file, body)
+            write_file(headers_file, json.dumps(headers).encode())
+        return body
+    
+class JSONPyPI(object):
+    
+    '''
+    PyPI interface which gets package metadata from PyPI's JSON API
+    
+    Provides the metadata methods of the XML-RPC interface: `package_releases`,
+    `release_data` and `release_urls`, returning the same data as their
+    XML-RPC counterparts; so it can be used as `Context.pypi`. Any other
+    method is delegated to `fallback`.
+    
+    Responses are cached with `HTTPCache`, so metadata of unchanged packages
+    is not downloaded again.
+    
+    Parameters
+    ----------
+    uri : str
+        URI of the JSON API, e.g. ``https://pypi.org/pypi``
+    cache : HTTPCache
+    fallback : xmlrpc.client.ServerProxy or None
+        PyPI XML-RPC interface for the other methods
+    '''
+    
+    def __init__(self, uri, cache, fallback=None):
+        self._uri = uri.rstrip('/')
+        self._cache = cache
+        self._fallback = fallback
+        self._package = None  # (pypi_name, document) of last requested package
+        
+    def __getattr__(self, name):
+        if self._fallback is None:
+            raise AttributeError(name)
+        return getattr(self._fallback, name)
+    
+    def _get(self, *path):
+        url = '{}/{}/json'.format(self._uri, '/'.join(quote(part) for part in path))
+        return json.loads(self._cache.get(url).decode())
+        
+    def _get_package(self, pypi_name):
+        # Note: convert() requests the same package many times in a row
+        if not self._package or self._package[0] != pypi_name:
+            self._package = (pypi_name, self._get(pypi_name))
+        return self._package[1]
+    
+    def package_releases(self, pypi_name, show_hidden=False):
+        '''
+        Get versions of package
+        
+        Returns
+        -------
+        [str]
+        '''
+        # Note: the JSON API does not hide releases, so show_hidden is ignored
+        return list(self._get_package(pypi_name)['releases'])
+    
+    def release_data(self, pypi_name, version):
+        '''
+        Get metadata of release
+        
+        Returns
+        -------
+        dict
+        '''
+        package = self._get_package(pypi_name)
+        if package['info']['version'] == version:
+            return package['info']
+        else:
+            return self._get(pypi_name, version)['info']
+        
+    def release_urls(self, pypi_name, version):
+        '''
+        Get distributions of release
+        
+        Returns
+        -------
+        [dict]
+        '''
+        release_urls = []
+        for release_url in self._get_package(pypi_name)['releases'].get(version, []):
+            release_url = dict(release_url)
+            release_url['path'] = release_url['url'].split('/packages/', 1)[-1]
+            release_url['upload_time'] = datetime.datetime.strptime(release_url['upload_time'], '%Y-%m-%dT%H:%M:%S')
+            release_urls.append(release_url)
+        return release_urls
@@ -0,0 +1,189 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Scheduling of package conversions within a time limit
+'''
+
+from contextlib import contextmanager
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class Timings(object):
+    
+    '''
+    Historical conversion durations of packages
+    
+    Parameters
+    ----------
+    durations : {pypi_name :: str : float} or None
+        Estimated duration in seconds of converting each package
+    default : float
+        Estimated duration of a package without history, used while there
+        is no history at all
+    smoothing : float
+        Weight of a new measurement in the estimate, in ]0, 1]. The estimate is an
+        exponential moving average of measured durations.
+    '''
+    
+    def __init__(self, durations=None, default=10.0, smoothing=0.5):
+        self._durations = dict(durations or {})
+        self._default = default
+        self._smoothing = smoothing
+        self._mean = None
+        
+    def estimate(self, pypi_name):
+        '''
+        Estimate duration of converting package
+        
+        Returns
+        -------
+        float
+            Estimated duration in seconds. For a package without history, this
+            is the mean of all known durations.
+        '''
+        duration = self._durations.get(pypi_name)
+        if duration is not None:
+            return duration
+        if self._mean is None:
+            if self._durations:
+                self._mean = sum(self._durations.values()) / len(self._durations)
+            else:
+                self._mean = self._default
+        return self._mean
+    
+    def record(self, pypi_name, duration):
+        '''
+        Record measured duration of converting package
+        '''
+        old_duration = self._durations.get(pypi_name)
+        if old_duration is None:
+            self._durations[pypi_name] = duration
+        else:
+            self._durations[pypi_name] = self._smoothing * duration + (1 - self._smoothing) * old_duration
+        self._mean = None
+        
+class Scheduler(object):
+    
+    '''
+    Decides which pending packages to convert and in which order
+    
+    Packages are converted in order of priority. A package is only started
+    when its estimated duration fits in the remaining time; packages left
+    unconverted simply remain pending for the next run.
+    
+    Parameters
+    ----------
+    timings : Timings
+    time_limit : float or None
+        Wall-clock time in seconds the run may take, starting now. If None,
+        there is no time limit.
+    margin : float
+        Seconds to keep in reserve at the end of the run (e.g. for publishing)
+    clock : () -> float
+        Monotonic clock in seconds
+    '''
+    
+    def __init__(self, timings, time_limit=None, margin=0.0, clock=time.monotonic):
+        self._timings = timings
+        self._clock = clock
+        if time_limit is None:
+            self._deadline = None
+        else:
+            self._deadline = clock() + time_limit - margin
+        self.skipped = []  #: [pypi_name :: str] packages skipped as they would not finish in time
+        
+    @property
+    def remaining(self):
+        '''
+        Remaining time in seconds, or None if there is no time limit
+        '''
+        if self._deadline is None:
+            return None
+        return max(self._deadline - self._clock(), 0.0)
+    
+    def prioritize(self, pending, popularity=None, since_serial=None):
+        '''
+        Order pending packages by priority
+        
+        Packages which changed since `since_serial` come first, then the most
+        popular, then the most recently changed, then by name.
+        
+        Parameters
+        ----------
+        pending : {pypi_name :: str : serial :: int}
+            Pending packages with the PyPI serial of their last change
+        popularity : {pypi_name :: str : int} or None
+            Popularity of packages, e.g. download count or number of dependents.
+            Missing packages have 0 popularity.
+        since_serial : int or None
+            Serial after which a change counts as recent, e.g. the serial of
+            the previous run. If None, all changes are recent.
+            
+        Returns
+        -------
+        [pypi_name :: str]
+        '''
+        popularity = popularity or {}
+        def key(pypi_name):
+            serial = pending[pypi_name]
+            recent = since_serial is None or serial > since_serial
+            return (not recent, -popularity.get(pypi_name, 0), -serial, pypi_name)
+        return sorted(pending, key=key)
+    
+    def schedule(self, pending, popularity=None, since_serial=None):
+        '''
+        Yield packages to convert, by priority, until time runs out
+        
+        Parameters
+        ----------
+        pending : {pypi_name :: str : serial :: int}
+        popularity : {pypi_name :: str : int} or None
+        since_serial : int or None
+            See `prioritize`
+            
+        Yields
+        ------
+        pypi_name : str
+        '''
+        for pypi_name in self.prioritize(pending, popularity, since_serial):
+            remaining = self.remaining
+            if remaining is not None:
+                if remaining <= 0:
+                    logger.info('Time limit reached, leaving remaining packages for the next run')
+                    return
+                if self._timings.estimate(pypi_name) > remaining:
+                    logger.debug('Not enough time left to convert {}, skipping'.format(pypi_name))
+                    self.skipped.append(pypi_name)
+                    continue
+            yield pypi_name
+            
+    @contextmanager
+    def timed(self, pypi_name):
+        '''
+        Measure and record the duration of converting a package
+        
+        The duration is recorded even if the conversion raises, it took time
+        all the same.
+        '''
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self._timings.record(pypi_name, self._clock() - start)
@@ -0,0 +1,139 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Partitioning of packages into shards which can be converted independently
+'''
+
+from pypi_to_0install.various import write_file
+import hashlib
+import logging
+import attr
+
+logger = logging.getLogger(__name__)
+
+def shard_of(zi_name, shard_count):
+    '''
+    Get the shard a package belongs to
+    
+    The shard is derived from a hash of the canonical name, so it is the same
+    on every node and in every run, and PyPI names which map to the same feed
+    always end up in the same shard.
+    
+    Parameters
+    ----------
+    zi_name : str
+        Canonical name of the package
+    shard_count : int
+        
+    Returns
+    -------
+    int
+        Shard index in ``[0, shard_count)``
+    '''
+    digest = hashlib.sha1(zi_name.encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+@attr.s(frozen=True)
+class Shard(object):
+    
+    '''
+    One of a number of shards
+    '''
+    
+    def _validate_index(self, attribute, index):
+        if not 0 <= index < self.count:
+            raise ValueError('Shard index must be in [0, {}), got: {}'.format(self.count, index))
+            
+    count = attr.ib()  # int, number of shards
+    index = attr.ib(validator=_validate_index)  # int
+    
+    @classmethod
+    def parse(cls, shard):
+        '''
+        Parse shard of the form ``index/count``, e.g. ``0/4``
+        '''
+        try:
+            index, count = map(int, shard.split('/'))
+        except ValueError:
+            raise ValueError('Shard should be formatted as index/count, e.g. 0/4. Got: {!r}'.format(shard))
+        return cls(count, index)
+    
+    def __contains__(self, zi_name):
+        return shard_of(zi_name, self.count) == self.index
+    
+    def __str__(self):
+        return '{}/{}'.format(self.index, self.count)
+    
+class ShardConflict(Exception):
+    pass
+
+def merge_shards(shard_directories, directory):
+    '''
+    Merge feed directories of shards into a single feed directory
+    
+    Only files whose contents changed are copied. Feeds which are in none of
+    the shards, e.g. feeds of removed packages, are removed.
+    
+    Parameters
+    ----------
+    shard_directories : iterable(pathlib.Path)
+        Feed directories of shards
+    directory : pathlib.Path
+        Feed directory to merge into
+        
+    Returns
+    -------
+    changed_files : [pathlib.Path]
+        Files in `directory` which were added or changed
+    removed_files : [pathlib.Path]
+        Files which were removed from `directory`
+    
+    Raises
+    ------
+    ShardConflict
+        If more than one shard has the same file
+    '''
+    shard_directories = list(shard_directories)
+    directory.mkdir(parents=True, exist_ok=True)
+    sources = {}  # file name => shard directory
+    changed_files = []
+    for shard_directory in shard_directories:
+        for shard_file in sorted(shard_directory.iterdir()):
+            if not shard_file.is_file() or shard_file.suffix != '.xml':
+                continue
+            if shard_file.name in sources:
+                raise ShardConflict(
+                    '{} is in multiple shards: {} and {}'
+                    .format(shard_file.name, sources[shard_file.name], shard_directory)
+                )
+            sources[shard_file.name] = shard_directory
+            
+            contents = shard_file.read_bytes()
+            file_ = directory / shard_file.name
+            if file_.exists() and file_.read_bytes() == contents:
+                continue
+            write_file(file_, contents)
+            changed_files.append(file_)
+    removed_files = [file_ for file_ in sorted(directory.glob('*.xml')) if file_.name not in sources]
+    for file_ in removed_files:
+        file_.unlink()
+    logger.info(
+        'Merged {} shards, {} feeds changed, {} removed'
+        .format(len(shard_directories), len(changed_files), len(removed_files))
+    )
+    return changed_files, removed_files
@@ -0,0 +1,585 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+State of the conversion, persisted between runs
+'''
+
+from pypi_to_0install.various import canonical_name
+import sqlite3
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class State(object):
+    
+    '''
+    State of the conversion, stored in an SQLite database
+    
+    For each PyPI package, the state stores the serial of its last change, the
+    serial its feed was last converted at, a fingerprint of its feed, the
+    duration of its last conversion and its failures. A feed is stale (its
+    package is pending) when the package changed after it was converted. A
+    package is quarantined when it failed too many times in a row at its
+    current serial. The feeds of removed packages are retired: they are kept
+    track of until they are removed.
+    Further, the result of converting each distribution is stored, as well as
+    the reverse dependency index: the ZI names required by the feed of each
+    package, updated each time a package is converted. Similarly, the catalog
+    entry of each feed is stored along with which catalog shards are out of
+    date.
+    
+    Writes are batched: they are committed at most once every `commit_interval`
+    seconds, on `commit` and on `close`. The database is in WAL mode, so
+    committing is cheap and readers do not block the writer.
+    
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+    commit_interval : float
+        Maximum number of seconds between commits of writes
+    clock : () -> float
+        Monotonic clock in seconds
+    '''
+    
+    def __init__(self, connection, commit_interval=1.0, clock=time.monotonic):
+        self._connection = connection
+        self._commit_interval = commit_interval
+        self._clock = clock
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')  # Note: in WAL mode this is still safe against corruption
+        with self._connection:
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS package (
+                    pypi_name TEXT PRIMARY KEY,
+                    zi_name TEXT NOT NULL,  -- canonical_name(pypi_name)
+                    serial INTEGER NOT NULL,  -- serial of last change of the package
+                    converted_serial INTEGER,  -- serial the feed was converted at, NULL if never converted
+                    fingerprint TEXT,  -- of the feed file contents
+                    duration REAL,  -- estimated duration of converting it in seconds
+                    failures INTEGER NOT NULL DEFAULT 0,  -- number of consecutive permanently failed conversions
+                    failed_serial INTEGER,  -- serial of the package at its last failed conversion
+                    error TEXT  -- description of the last failure
+                );
+                CREATE TABLE IF NOT EXISTS distribution (
+                    path TEXT PRIMARY KEY,  -- release_url['path']
+                    pypi_name TEXT NOT NULL,
+                    result TEXT NOT NULL  -- e.g. converted, reused, skipped
+                );
+                CREATE INDEX IF NOT EXISTS distribution_pypi_name ON distribution (pypi_name);
+                CREATE INDEX IF NOT EXISTS package_zi_name ON package (zi_name);
+                CREATE TABLE IF NOT EXISTS dependency (
+                    pypi_name TEXT NOT NULL,  -- package whose feed requires zi_name
+                    zi_name TEXT NOT NULL,
+                    PRIMARY KEY (pypi_name, zi_name)
+                );
+                CREATE INDEX IF NOT EXISTS dependency_zi_name ON dependency (zi_name);
+                CREATE TABLE IF NOT EXISTS catalog (
+                    pypi_name TEXT PRIMARY KEY,
+                    zi_name TEXT NOT NULL,
+                    shard INTEGER NOT NULL,  -- catalog shard the entry is in
+                    uri TEXT NOT NULL,  -- columns of a CatalogEntry, from here on
+                    name TEXT NOT NULL,
+                    summary TEXT,
+                    homepage TEXT,
+                    version TEXT
+                );
+                CREATE INDEX IF NOT EXISTS catalog_shard ON catalog (shard, zi_name);
+                CREATE TABLE IF NOT EXISTS dirty_catalog_shard (
+                    shard INTEGER PRIMARY KEY  -- catalog shard whose file is out of date
+                );
+                CREATE TABLE IF NOT EXISTS retired_feed (
+                    zi_name TEXT PRIMARY KEY  -- feed of a removed package, which is yet to be removed
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value
+                );
+            ''')
+        self._last_commit = clock()
+            
+    @classmethod
+    def open(cls, path, **kwargs):
+        '''
+        Open state, create it if it does not exist
+        
+        Parameters
+        ----------
+        path : pathlib.Path
+        kwargs : dict
+            Passed to State
+        '''
+        return cls(sqlite3.connect(str(path)), **kwargs)
+    
+    def close(self):
+        '''
+        Commit and close
+        '''
+        self.commit()
+        self._connection.close()
+        
+    def commit(self):
+        '''
+        Commit pending writes
+        '''
+        self._connection.commit()
+        self._last_commit = self._clock()
+        
+    def _written(self):
+        if self._clock() - self._last_commit >= self._commit_interval:
+            self.commit()
+            
+    @property
+    def last_serial(self):
+        '''
+        PyPI serial the package list is up to date with, or None if there are no
+        packages yet
+        '''
+        row = self._connection.execute("SELECT value FROM meta WHERE key = 'last_serial'").fetchone()
+        return row and row[0]
+    
+    def _set_last_serial(self, serial):
+        self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_serial', ?)", (serial,))
+        
+    def __len__(self):
+        return self._connection.execute('SELECT count(*) FROM package').fetchone()[0]
+    
+    def pypi_names(self):
+        '''
+        Get names of all packages
+        
+        Returns
+        -------
+        [str]
+        '''
+        return [row[0] for row in self._connection.execute('SELECT pypi_name FROM package')]
+    
+    def replace_packages(self, packages, serial):
+        '''
+        Replace the list of packages, keeping the state of remaining packages
+        
+        Packages missing from `packages` are removed, along with their
+        dependencies and catalog entries, and their feeds are retired.
+        
+        Parameters
+        ----------
+        packages : {pypi_name :: str : serial :: int}
+            All PyPI packages with the serial of their last change, as
+            returned by ``list_packages_with_serial``
+        serial : int
+            PyPI serial which `packages` is up to date with
+        '''
+        self.commit()
+        self._connection.execute('DROP TABLE IF EXISTS temp.listing')
+        self._connection.execute('CREATE TEMP TABLE listing (pypi_name TEXT PRIMARY KEY, zi_name TEXT NOT NULL, serial INTEGER NOT NULL)')
+        with self._connection:
+            self._connection.executemany(
+                'INSERT INTO temp.listing (pypi_name, zi_name, serial) VALUES (?, ?, ?)',
+                ((pypi_name, canonical_name(pypi_name), serial_) for pypi_name, serial_ in packages.items())
+            )
+            self._connection.execute('''
+                INSERT OR IGNORE INTO retired_feed (zi_name)
+                SELECT zi_name FROM package WHERE pypi_name NOT IN (SELECT pypi_name FROM temp.listing)
+            ''')
+            self._connection.execute('DELETE FROM package WHERE pypi_name NOT IN (SELECT pypi_name FROM temp.listing)')
+            self._connection.execute('DELETE FROM dependency WHERE pypi_name NOT IN (SELECT pypi_name FROM temp.listing)')
+            self._connection.execute('''
+                INSERT OR IGNORE INTO dirty_catalog_shard (shard)
+                SELECT shard FROM catalog WHERE pypi_name NOT IN (SELECT pypi_name FROM temp.listing)
+            ''')
+            self._connection.execute('DELETE FROM catalog WHERE pypi_name NOT IN (SELECT pypi_name FROM temp.listing)')
+            self._connection.execute('INSERT OR IGNORE INTO package (pypi_name, zi_name, serial) SELECT pypi_name, zi_name, serial FROM temp.listing')
+            self._connection.execute('''
+                UPDATE package
+                SET serial = (SELECT serial FROM temp.listing WHERE temp.listing.pypi_name = package.pypi_name)
+            ''')
+            self._set_last_serial(serial)
+        self._connection.execute('DROP TABLE temp.listing')
+        logger.info('Listed {} packages at serial {}'.format(len(packages), serial))
+        
+    def apply_changes(self, changes, serial):
+        '''
+        Update the package list with changes from PyPI's changelog
+        
+        Changes are applied in order. A ``remove`` without version means the
+        package was removed: it is removed along with its dependencies and
+        catalog entry and its feed is retired. Any other change marks the
+        package changed, adding it if it is new.
+        
+        Parameters
+        ----------
+        changes : iterable((pypi_name :: str, version :: str, timestamp :: int, action :: str, serial :: int))
+            Changes as returned by ``changelog_since_serial``
+        serial : int
+            PyPI serial which the package list is up to date with after
+            applying `changes`
+        '''
+        changes = list(changes)
+        removed = 0
+        with self._connection:
+            for pypi_name, version, _, action, change_serial in changes:
+                if version is None and action in ('remove', 'remove project'):
+                    self._remove_package(pypi_name)
+                    removed += 1
+                else:
+                    self._connection.execute(
+                        'INSERT OR IGNORE INTO package (pypi_name, zi_name, serial) VALUES (?, ?, ?)',
+                        (pypi_name, canonical_name(pypi_name), change_serial)
+                    )
+                    self._connection.execute('UPDATE package SET serial = max(serial, ?2) WHERE pypi_name = ?1', (pypi_name, change_serial))
+            self._set_last_serial(serial)
+        self._last_commit = self._clock()
+        logger.info('Applied {} changes ({} removed packages), packages at serial {}'.format(len(changes), removed, serial))
+    
+    def _remove_package(self, pypi_name):
+        self._connection.execute('INSERT OR IGNORE INTO retired_feed (zi_name) SELECT zi_name FROM package WHERE pypi_name = ?', (pypi_name,))
+        self._connection.execute('INSERT OR IGNORE INTO dirty_catalog_shard (shard) SELECT shard FROM catalog WHERE pypi_name = ?', (pypi_name,))
+        self._connection.execute('DELETE FROM catalog WHERE pypi_name = ?', (pypi_name,))
+        self._connection.execute('DELETE FROM dependency WHERE pypi_name = ?', (pypi_name,))
+        self._connection.execute('DELETE FROM package WHERE pypi_name = ?', (pypi_name,))
+    
+    def retired_feeds(self):
+        '''
+        Get feeds of removed packages which are yet to be removed
+        
+        Returns
+        -------
+        [zi_name :: str]
+            Sorted. Note: the ZI name may since have been taken by a new
+            package
+        '''
+        return [row[0] for row in self._connection.execute('SELECT zi_name FROM retired_feed ORDER BY zi_name')]
+    
+    def clear_retired_feed(self, zi_name):
+        '''
+        Forget retired feed, once it has been removed
+        '''
+        self._connection.execute('DELETE FROM retired_feed WHERE zi_name = ?', (zi_name,))
+        self._written()
+        
+    def pending_packages(self, quarantine_after=None):
+        '''
+        Get packages whose feed is missing or out of date
+        
+        Parameters
+        ----------
+        quarantine_after : int or None
+            If not None, exclude packages which failed at least this many times
+            in a row at their current serial
+            
+        Returns
+        -------
+        {pypi_name :: str : serial :: int}
+            Pending packages with the serial of their last change
+        '''
+        return dict(self._connection.execute('''
+            SELECT pypi_name, serial FROM package
+            WHERE (converted_serial IS NULL OR converted_serial < serial)
+            AND NOT (?1 IS NOT NULL AND failures >= ?1 AND failed_serial = serial)
+        ''', (quarantine_after,)))
+    
+    def quarantined_packages(self, quarantine_after):
+        '''
+        Get packages which failed at least `quarantine_after` times in a row at
+        their current serial
+        
+        Returns
+        -------
+        {pypi_name :: str : error :: str}
+            Quarantined packages with the description of their last failure
+        '''
+        return dict(self._connection.execute('''
+            SELECT pypi_name, error FROM package
+            WHERE failures >= ? AND failed_serial = serial
+        ''', (quarantine_after,)))
+    
+    def mark_converted(self, pypi_name, serial, fingerprint):
+        '''
+        Mark feed of package as converted at serial
+        
+        Also resets its failure count.
+        
+        Parameters
+        ----------
+        pypi_name : str
+        serial : int
+        fingerprint : str
+            Fingerprint of the feed file contents
+        '''
+        self._connection.execute(
+            'UPDATE package SET converted_serial = ?, fingerprint = ?, failures = 0, failed_serial = NULL, error = NULL WHERE pypi_name = ?',
+            (serial, fingerprint, pypi_name)
+        )
+        self._written()
+        
+    def fingerprint(self, pypi_name):
+        '''
+        Get fingerprint of the feed of the package, None if it has no feed
+        '''
+        row = self._connection.execute('SELECT fingerprint FROM package WHERE pypi_name = ?', (pypi_name,)).fetchone()
+        return row and row[0]
+    
+    def durations(self):
+        '''
+        Get estimated conversion durations of packages
+        
+        Returns
+        -------
+        {pypi_name :: str : float}
+            Estimated duration in seconds of each package that has been
+            converted before
+        '''
+        return dict(self._connection.execute('SELECT pypi_name, duration FROM package WHERE duration IS NOT NULL'))
+    
+    def set_duration(self, pypi_name, duration):
+        '''
+        Set estimated duration of converting package
+        '''
+        self._connection.execute('UPDATE package SET duration = ? WHERE pypi_name = ?', (duration, pypi_name))
+        self._written()
+        
+    def failures(self, pypi_name):
+        '''
+        Get number of consecutive failed conversions of package
+        '''
+        row = self._connection.execute('SELECT failures FROM package WHERE pypi_name = ?', (pypi_name,)).fetchone()
+        return row[0] if row else 0
+    
+    def add_failure(self, pypi_name, serial, error):
+        '''
+        Record permanently failed conversion of package
+        
+        Parameters
+        ----------
+        pypi_name : str
+        serial : int
+            Serial of the package which failed to convert
+        error : str
+            Description of the failure
+            
+        Returns
+        -------
+        int
+            The number of consecutive failures at `serial`
+        '''
+        # Note: failures at an older serial do not count, the package changed since
+        self._connection.execute(
+            '''
+            UPDATE package
+            SET failures = CASE WHEN failed_serial = ?1 THEN failures + 1 ELSE 1 END, failed_serial = ?1, error = ?2
+            WHERE pypi_name = ?3
+            ''',
+            (serial, error, pypi_name)
+        )
+        self._written()
+        return self.failures(pypi_name)
+    
+    def set_distribution_result(self, pypi_name, path, result):
+        '''
+        Set result of converting distribution
+        
+        Parameters
+        ----------
+        pypi_name : str
+        path : str
+            release_url['path'] of the distribution
+        result : str
+            E.g. converted, reused or skipped
+        '''
+        self._connection.execute(
+            'INSERT OR REPLACE INTO distribution (path, pypi_name, result) VALUES (?, ?, ?)',
+            (path, pypi_name, result)
+        )
+        self._written()
+        
+    def distribution_results(self, pypi_name):
+        '''
+        Get result of converting each distribution of a package
+        
+        Returns
+        -------
+        {path :: str : result :: str}
+        '''
+        return dict(self._connection.execute('SELECT path, result FROM distribution WHERE pypi_name = ?', (pypi_name,)))
+    
+    def set_dependencies(self, pypi_name, zi_names):
+        '''
+        Set the ZI names which the feed of a package requires
+        
+        Replaces the previous dependencies of the package. Called each time a
+        package is converted, which keeps the reverse dependency index up to
+        date incrementally.
+        
+        Parameters
+        ----------
+        pypi_name : str
+        zi_names : iterable(str)
+            ZI names of the interfaces required by any implementation in the feed
+        '''
+        self._connection.execute('DELETE FROM dependency WHERE pypi_name = ?', (pypi_name,))
+        self._connection.executemany(
+            'INSERT OR IGNORE INTO dependency (pypi_name, zi_name) VALUES (?, ?)',
+            ((pypi_name, zi_name) for zi_name in zi_names)
+        )
+        self._written()
+        
+    def dependencies(self, pypi_name):
+        '''
+        Get ZI names which the feed of a package requires
+        
+        Returns
+        -------
+        [zi_name :: str]
+            Sorted
+        '''
+        return [row[0] for row in self._connection.execute(
+            'SELECT zi_name FROM dependency WHERE pypi_name = ? ORDER BY zi_name', (pypi_name,)
+        )]
+    
+    def dependents(self, zi_name):
+        '''
+        Get packages whose feed requires a ZI name
+        
+        Returns
+        -------
+        [pypi_name :: str]
+            Sorted
+        '''
+        return [row[0] for row in self._connection.execute(
+            'SELECT pypi_name FROM dependency WHERE zi_name = ? ORDER BY pypi_name', (zi_name,)
+        )]
+    
+    def dependent_counts(self):
+        '''
+        Get number of dependents of each package which has any
+        
+        Returns
+        -------
+        {pypi_name :: str : int}
+        '''
+        return dict(self._connection.execute('''
+            SELECT package.pypi_name, count(*) FROM dependency
+            JOIN package ON package.zi_name = dependency.zi_name
+            GROUP BY package.pypi_name
+        '''))
+    
+    def dangling_dependencies(self):
+        '''
+        Get required ZI names which do not correspond to any PyPI package
+        
+        Feeds requiring these have a requirement which can never be satisfied,
+        e.g. because the package was removed from PyPI.
+        
+        Returns
+        -------
+        {zi_name :: str : [pypi_name :: str]}
+            Dangling ZI names with the sorted packages requiring them
+        '''
+        dangling = {}
+        rows = self._connection.execute('''
+            SELECT zi_name, pypi_name FROM dependency
+            WHERE zi_name NOT IN (SELECT zi_name FROM package)
+            ORDER BY zi_name, pypi_name
+        ''')
+        for zi_name, pypi_name in rows:
+            dangling.setdefault(zi_name, []).append(pypi_name)
+        return dangling
+    
+    @property
+    def catalog_shard_count(self):
+        '''
+        Number of catalog shards the catalog entries are partitioned in, None if
+        never partitioned
+        '''
+        row = self._connection.execute("SELECT value FROM meta WHERE key = 'catalog_shard_count'").fetchone()
+        return row and row[0]
+    
+    def reshard_catalog(self, shard_count, shard_of):
+        '''
+        Repartition catalog entries and mark all shards out of date
+        
+        Parameters
+        ----------
+        shard_count : int
+        shard_of : (zi_name :: str) -> int
+            Get the shard of a ZI name
+        '''
+        with self._connection:
+            entries = self._connection.execute('SELECT pypi_name, zi_name FROM catalog').fetchall()
+            self._connection.executemany(
+                'UPDATE catalog SET shard = ? WHERE pypi_name = ?',
+                ((shard_of(zi_name), pypi_name) for pypi_name, zi_name in entries)
+            )
+            self._connection.execute('DELETE FROM dirty_catalog_shard')
+            self._connection.executemany('INSERT INTO dirty_catalog_shard (shard) VALUES (?)', ((shard,) for shard in range(shard_count)))
+            self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('catalog_shard_count', ?)", (shard_count,))
+        self._last_commit = self._clock()
+        
+    def set_catalog_entry(self, pypi_name, zi_name, shard, entry):
+        '''
+        Set catalog entry of a feed, marking its shard out of date if it changed
+        
+        Parameters
+        ----------
+        pypi_name : str
+        zi_name : str
+        shard : int
+        entry : (uri :: str, name :: str, summary :: str or None, homepage :: str or None, version :: str or None)
+        '''
+        row = self._connection.execute(
+            'SELECT shard, uri, name, summary, homepage, version FROM catalog WHERE pypi_name = ?', (pypi_name,)
+        ).fetchone()
+        if row == (shard,) + tuple(entry):
+            return
+        self._connection.execute(
+            'INSERT OR REPLACE INTO catalog (pypi_name, zi_name, shard, uri, name, summary, homepage, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (pypi_name, zi_name, shard) + tuple(entry)
+        )
+        self._connection.execute('INSERT OR IGNORE INTO dirty_catalog_shard (shard) VALUES (?)', (shard,))
+        self._written()
+        
+    def catalog_entries(self, shard):
+        '''
+        Get catalog entries of a shard
+        
+        Returns
+        -------
+        [(uri, name, summary, homepage, version)]
+            Ordered by ZI name
+        '''
+        return self._connection.execute(
+            'SELECT uri, name, summary, homepage, version FROM catalog WHERE shard = ? ORDER BY zi_name, pypi_name', (shard,)
+        ).fetchall()
+    
+    def dirty_catalog_shards(self):
+        '''
+        Get catalog shards whose file is out of date
+        
+        Returns
+        -------
+        [int]
+            Sorted
+        '''
+        return [row[0] for row in self._connection.execute('SELECT shard FROM dirty_catalog_shard ORDER BY shard')]
+    
+    def clean_catalog_shard(self, shard):
+        '''
+        Mark catalog shard file up to date
+        '''
+        self._connection.execute('DELETE FROM dirty_catalog_shard WHERE shard = ?', (shard,))
+        self._written()
@@ -0,0 +1,150 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.catalog
+'''
+
+import pytest
+from pathlib import Path
+from lxml import etree
+from pypi_to_0install.catalog import Catalog, CatalogEntry, catalog_nsmap, merge_catalogs
+from pypi_to_0install.sharding import shard_of, ShardConflict
+from pypi_to_0install.state import State
+from pypi_to_0install.various import zi
+
+@pytest.fixture
+def state(tmpdir):
+    state = State.open(Path(str(tmpdir)) / 'state.sqlite')
+    state.replace_packages({'a': 1, 'b': 1, 'c': 1}, 1)
+    yield state
+    state.close()
+    
+@pytest.fixture
+def directory(tmpdir):
+    return Path(str(tmpdir)) / 'catalog'
+
+def feed(zi_name, summary='summary', versions=('1.0',)):
+    interface = zi.interface(uri='https://example.com/{}.xml'.format(zi_name))
+    interface.append(zi.name(zi_name))
+    interface.append(zi.summary(summary))
+    for version in versions:
+        interface.append(zi.implementation(id=version, version=version))
+    return etree.ElementTree(interface)
+
+def entries(directory):
+    entries = {}
+    for path in directory.glob('*.xml'):
+        catalog = etree.parse(str(path)).getroot()
+        assert catalog.tag == '{{{}}}catalog'.format(catalog_nsmap[None])
+        for interface in catalog:
+            entries[interface.findtext(zi.name().tag)] = path.name
+    return entries
+
+def test_entry_from_feed():
+    '''
+    The latest version is the maximum by ZI version order
+    '''
+    entry = CatalogEntry.from_feed(feed('a', versions=('0-1-4', '0-10-4', '0-9-4')))
+    assert entry == CatalogEntry('https://example.com/a.xml', 'a', 'summary', None, '0-10-4')
+    assert CatalogEntry.from_feed(feed('a', versions=())).version is None
+    
+def test_write(state, directory):
+    '''
+    Each entry is written to the file of its shard
+    '''
+    catalog = Catalog(state, directory, shard_count=2)
+    for zi_name in 'abc':
+        catalog.update(zi_name, zi_name, feed(zi_name))
+    catalog.write()
+    assert entries(directory) == {zi_name: '{}.xml'.format(shard_of(zi_name, 2)) for zi_name in 'abc'}
+    
+def test_write_changed_only(state, directory):
+    '''
+    Only shards with changed entries are rewritten
+    '''
+    catalog = Catalog(state, directory, shard_count=8)
+    for zi_name in 'abc':
+        catalog.update(zi_name, zi_name, feed(zi_name))
+    catalog.write()
+    assert state.dirty_catalog_shards() == []
+    catalog.update('a', 'a', feed('a'))
+    assert state.dirty_catalog_shards() == []
+    catalog.update('a', 'a', feed('a', summary='changed'))
+    assert state.dirty_catalog_shards() == [shard_of('a', 8)]
+    
+def test_removed_package(state, directory):
+    '''
+    Entries of packages removed from PyPI are removed
+    '''
+    catalog = Catalog(state, directory, shard_count=2)
+    for zi_name in 'abc':
+        catalog.update(zi_name, zi_name, feed(zi_name))
+    catalog.write()
+    state.replace_packages({'a': 1, 'c': 1}, 2)
+    catalog.write()
+    assert set(entries(directory)) == {'a', 'c'}
+    state.apply_changes([('c', None, 0, 'remove', 3)], 3)
+    catalog.write()
+    assert set(entries(directory)) == {'a'}
+    
+def test_reshard(state, directory):
+    '''
+    When the shard count changes, all shards are rewritten and obsolete ones
+    removed
+    '''
+    catalog = Catalog(state, directory, shard_count=8)
+    for zi_name in 'abc':
+        catalog.update(zi_name, zi_name, feed(zi_name))
+    catalog.write()
+    catalog = Catalog(state, directory, shard_count=1)
+    catalog.write()
+    assert entries(directory) == {'a': '0.xml', 'b': '0.xml', 'c': '0.xml'}
+    
+def test_merge(tmpdir):
+    '''
+    Catalogs of shards are combined per file; files in none of the shards are
+    removed
+    '''
+    directory = Path(str(tmpdir))
+    shards = []
+    for i, zi_names in enumerate(('ac', 'b')):
+        state = State.open(directory / 'state{}.sqlite'.format(i))
+        state.replace_packages({zi_name: 1 for zi_name in zi_names}, 1)
+        catalog = Catalog(state, directory / 'shard{}'.format(i), shard_count=2)
+        for zi_name in zi_names:
+            catalog.update(zi_name, zi_name, feed(zi_name))
+        catalog.write()
+        state.close()
+        shards.append(directory / 'shard{}'.format(i))
+    output = directory / 'merged'
+    changed, removed = merge_catalogs(shards, output)
+    assert entries(output) == {zi_name: '{}.xml'.format(shard_of(zi_name, 2)) for zi_name in 'abc'}
+    assert sorted(changed) == sorted(output.iterdir())
+    assert removed == []
+    
+    # Entries round trip
+    catalog = etree.parse(str(output / '{}.xml'.format(shard_of('a', 2)))).getroot()
+    assert CatalogEntry.from_element(catalog.find(zi.interface().tag)) == CatalogEntry.from_feed(feed('a'))
+    
+    # Merging again changes nothing, a file no shard has is removed
+    (output / '5.xml').write_bytes(b'')
+    assert merge_catalogs(shards, output) == ([], [output / '5.xml'])
+    
+    # An entry in multiple shards conflicts
+    with pytest.raises(ShardConflict):
+        merge_catalogs(shards + shards[:1], output)
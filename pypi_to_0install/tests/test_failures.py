@@ -0,0 +1,122 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.failures
+'''
+
+import pytest
+from xmlrpc.client import Fault, ProtocolError
+import urllib.error
+import socket
+import logging
+from pypi_to_0install.failures import TRANSIENT, PERMANENT, RunSummary, classify, retry, describe
+from pypi_to_0install.workspace import WorkspaceFull
+from pypi_to_0install.convert import ExtractionLimitExceeded
+from pypi_to_0install.names import NameCollision
+
+def http_error(code):
+    return urllib.error.HTTPError('https://example.com', code, 'message', {}, None)
+
+@pytest.mark.parametrize('exception, expected', (
+    (http_error(503), TRANSIENT),
+    (http_error(429), TRANSIENT),
+    (http_error(404), PERMANENT),
+    (ProtocolError('https://example.com', 502, 'Bad gateway', {}), TRANSIENT),
+    (ProtocolError('https://example.com', 403, 'Forbidden', {}), PERMANENT),
+    (Fault(-32500, 'HTTPTooManyRequests: rate limit exceeded'), TRANSIENT),
+    (Fault(-32500, 'ValueError'), PERMANENT),
+    (urllib.error.URLError('connection refused'), TRANSIENT),
+    (ConnectionResetError(), TRANSIENT),
+    (socket.timeout(), TRANSIENT),
+    (WorkspaceFull(), TRANSIENT),
+    (ExtractionLimitExceeded(), PERMANENT),
+    (NameCollision(), PERMANENT),
+    (ValueError(), PERMANENT),
+    (StopIteration(), PERMANENT),
+))
+def test_classify(exception, expected):
+    assert classify(exception) == expected
+    
+class TestRetry(object):
+    
+    def test_transient(self):
+        '''
+        Retry transient failures with exponential backoff
+        '''
+        sleeps = []
+        retries = []
+        calls = []
+        def function():
+            calls.append(None)
+            if len(calls) < 3:
+                raise ConnectionResetError()
+            return 'result'
+        actual = retry(function, attempts=3, delay=2.0, sleep=sleeps.append, on_retry=lambda ex, delay: retries.append(delay))
+        assert actual == 'result'
+        assert sleeps == [2.0, 4.0]
+        assert retries == [2.0, 4.0]
+        
+    def test_max_delay(self):
+        sleeps = []
+        def function():
+            raise ConnectionResetError()
+        with pytest.raises(ConnectionResetError):
+            retry(function, attempts=4, delay=2.0, max_delay=5.0, sleep=sleeps.append)
+        assert sleeps == [2.0, 4.0, 5.0]
+        
+    def test_permanent(self):
+        '''
+        Do not retry permanent failures
+        '''
+        calls = []
+        def function():
+            calls.append(None)
+            raise ValueError()
+        with pytest.raises(ValueError):
+            retry(function, sleep=lambda delay: None)
+        assert len(calls) == 1
+        
+def test_describe():
+    assert describe(ValueError('multi\nline')) == 'ValueError: multi line'
+    assert describe(ValueError()) == 'ValueError'
+    
+def test_run_summary(caplog):
+    '''
+    Summary lists failures by classification and quarantined packages
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    summary = RunSummary()
+    summary.converted.append('a')
+    summary.failed['b'] = (TRANSIENT, 'ConnectionResetError')
+    summary.failed['c'] = (PERMANENT, 'ValueError')
+    summary.quarantined.append('c')
+    summary.in_quarantine = {'c': 'ValueError', 'd': 'KeyError'}
+    summary.log(logger)
+    messages = [record.getMessage() for record in caplog.records()]
+    assert messages == [
+        'Converted 1 packages, retried 0 times',
+        '1 packages failed transiently:',
+        '  b: ConnectionResetError',
+        '1 packages failed permanently:',
+        '  c: ValueError',
+        'Quarantined 1 packages until they change on PyPI: c',
+        '2 packages are quarantined:',
+        '  c: ValueError',
+        '  d: KeyError',
+    ]
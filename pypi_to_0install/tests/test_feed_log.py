@@ -0,0 +1,116 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.feed_log
+'''
+
+import pytest
+from pathlib import Path
+from threading import Thread
+from pypi_to_0install.feed_log import FeedLog, FeedLoggerAdapter, read_feed_log
+import logging
+
+@pytest.fixture
+def feed_logger():
+    feed_logger = logging.getLogger(__name__ + ':feed_logger')
+    feed_logger.setLevel(logging.DEBUG)
+    return feed_logger
+
+@pytest.fixture
+def log_file(tmpdir):
+    return Path(str(tmpdir)) / 'feeds.log'
+
+def test_happy_days(feed_logger, log_file):
+    '''
+    Messages are stored per package, with serial and level
+    '''
+    with FeedLog(log_file, feed_logger):
+        FeedLoggerAdapter(feed_logger, 'a', 1).info('message a1')
+        FeedLoggerAdapter(feed_logger, 'b', 2).warning('message b')
+        FeedLoggerAdapter(feed_logger, 'a', 3).info('message a2')
+        FeedLoggerAdapter(feed_logger, 'a', 3).debug('debug messages are not stored')
+        feed_logger.info('messages without package are not stored')
+    messages = read_feed_log(log_file, 'a')
+    assert [(message['serial'], message['level'], message['message']) for message in messages] == [
+        (1, 'INFO', 'message a1'),
+        (3, 'INFO', 'message a2'),
+    ]
+    assert [message['message'] for message in read_feed_log(log_file, 'b')] == ['message b']
+    assert read_feed_log(log_file, 'c') == []
+    
+def test_append(feed_logger, log_file):
+    '''
+    Logs of later runs are appended
+    '''
+    for serial in (1, 2):
+        with FeedLog(log_file, feed_logger):
+            FeedLoggerAdapter(feed_logger, 'a', serial).info('message')
+    assert [message['serial'] for message in read_feed_log(log_file, 'a')] == [1, 2]
+    
+def test_exception(feed_logger, log_file):
+    '''
+    Tracebacks are included in the message
+    '''
+    with FeedLog(log_file, feed_logger):
+        try:
+            raise ValueError('oops')
+        except ValueError:
+            FeedLoggerAdapter(feed_logger, 'a', 1).exception('failed')
+    message, = read_feed_log(log_file, 'a')
+    assert message['message'].startswith('failed\n')
+    assert 'ValueError: oops' in message['message']
+    
+def test_parallel(feed_logger, log_file):
+    '''
+    Messages of packages logged in parallel are kept separate
+    '''
+    def log(zi_name):
+        logger = FeedLoggerAdapter(feed_logger, zi_name, 1)
+        for i in range(100):
+            logger.info('{} {}'.format(zi_name, i))
+    with FeedLog(log_file, feed_logger):
+        threads = [Thread(target=log, args=(zi_name,)) for zi_name in 'abcd']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    for zi_name in 'abcd':
+        messages = [message['message'] for message in read_feed_log(log_file, zi_name)]
+        assert messages == ['{} {}'.format(zi_name, i) for i in range(100)]
+        
+def test_truncated(feed_logger, log_file):
+    '''
+    Messages which the log lost, e.g. in a crash, are skipped
+    '''
+    with FeedLog(log_file, feed_logger):
+        for i in range(3):
+            FeedLoggerAdapter(feed_logger, 'a', 1).info('message {}'.format(i))
+    contents = log_file.read_bytes()
+    log_file.write_bytes(contents[:-10])
+    assert [message['message'] for message in read_feed_log(log_file, 'a')] == ['message 0', 'message 1']
+    log_file.write_bytes(b'')
+    assert read_feed_log(log_file, 'a') == []
+    
+def test_batches(feed_logger, log_file):
+    '''
+    Messages are indexed in batches and all are indexed on exit
+    '''
+    with FeedLog(log_file, feed_logger):
+        for i in range(250):
+            FeedLoggerAdapter(feed_logger, 'a' if i % 2 else 'b', 1).info(str(i))
+    assert [message['message'] for message in read_feed_log(log_file, 'a')] == [str(i) for i in range(1, 250, 2)]
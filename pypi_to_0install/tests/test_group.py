@@ -0,0 +1,123 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.convert._group
+'''
+
+from collections import OrderedDict
+from lxml import etree
+from pypi_to_0install.convert._group import group_implementations, ungroup_implementation
+from pypi_to_0install.main import serialize_feed
+from pypi_to_0install.various import zi
+
+_nsmap = {'zi': 'http://zero-install.sourceforge.net/2004/injector/interface'}
+
+def implementation(version, requires=('b',), stability='stable', license='License :: OSI Approved :: MIT License'):
+    attributes = OrderedDict((
+        ('id', 'a/a-{}.tar.gz'.format(version)),
+        ('version', version),
+        ('released', '2017-01-01'),
+        ('stability', stability),
+        ('langs', 'en'),
+    ))
+    if license:
+        attributes['license'] = license
+    implementation = zi.implementation(attributes)
+    implementation.append(zi('manifest-digest', sha256new='digest' + version))
+    implementation.append(zi.archive(OrderedDict((('href', 'https://example.com/a-{}.tar.gz'.format(version)), ('size', '100')))))
+    for interface in requires:
+        implementation.append(zi.requires(OrderedDict((
+            ('interface', 'https://example.com/{}.xml'.format(interface)),
+            ('importance', 'essential'),
+            ('version', '0-1..!0-2'),
+        ))))
+    return implementation
+
+def interface(*implementations):
+    return etree.ElementTree(zi.interface(zi.name('a'), *implementations))
+
+def ungrouped(feed):
+    return [
+        etree.tostring(ungroup_implementation(implementation))
+        for implementation in feed.xpath('//zi:implementation', namespaces=_nsmap)
+    ]
+
+def test_semantically_identical():
+    '''
+    Ungrouping each implementation of the grouped feed yields the originals
+    '''
+    implementations = [
+        implementation('1'),
+        implementation('2', stability='testing'),
+        implementation('3', license=None),
+        implementation('4', requires=('b', 'c')),
+        implementation('5', requires=('b', 'c')),
+        implementation('6'),
+    ]
+    expected = [etree.tostring(implementation_) for implementation_ in implementations]
+    feed = interface(*implementations)
+    original_size = len(serialize_feed(feed))
+    group_implementations(feed.getroot())
+    assert ungrouped(feed) == expected
+    assert len(serialize_feed(feed)) < original_size
+    
+def test_groups():
+    '''
+    Runs with the same requires are grouped with the attributes they share
+    '''
+    feed = interface(
+        implementation('1'),
+        implementation('2', stability='testing'),
+        implementation('3', requires=()),
+    )
+    group_implementations(feed.getroot())
+    root = feed.getroot()
+    groups = root.findall('zi:group', namespaces=_nsmap)
+    assert len(groups) == 1
+    group = groups[0]
+    assert dict(group.attrib) == {'langs': 'en', 'license': 'License :: OSI Approved :: MIT License'}
+    assert [element.get('interface') for element in group.findall('zi:requires', namespaces=_nsmap)] == ['https://example.com/b.xml']
+    assert [element.get('stability') for element in group.findall('zi:implementation', namespaces=_nsmap)] == ['stable', 'testing']
+    assert not group.xpath('zi:implementation/zi:requires', namespaces=_nsmap)
+    assert root.find('zi:implementation', namespaces=_nsmap).get('version') == '3'
+    
+def test_not_larger():
+    '''
+    A run is left alone if grouping it would not make it smaller
+    '''
+    feed = interface(
+        implementation('1', requires=(), stability='stable', license=None),
+        implementation('2', requires=(), stability='testing', license=None),
+    )
+    expected = serialize_feed(feed)
+    group_implementations(feed.getroot())
+    assert serialize_feed(feed) == expected
+    
+def test_deterministic():
+    '''
+    Regrouping the ungrouped implementations yields the same feed
+    '''
+    feed = interface(*(implementation(str(version)) for version in range(5)))
+    group_implementations(feed.getroot())
+    expected = serialize_feed(feed)
+    regrouped = interface(*(
+        ungroup_implementation(implementation_)
+        for implementation_ in feed.xpath('//zi:implementation', namespaces=_nsmap)
+    ))
+    group_implementations(regrouped.getroot())
+    assert serialize_feed(regrouped) == expected
@@ -0,0 +1,200 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.main
+'''
+
+import pytest
+from pathlib import Path
+from collections import OrderedDict
+from datetime import datetime
+from lxml import etree
+from pypi_to_0install.main import Context, write_feed, read_feed, serialize_feed
+from pypi_to_0install.publish import FeedPublisher, init_repository
+from pypi_to_0install.convert import convert
+import subprocess
+import tarfile
+import logging
+import random
+import io
+from pypi_to_0install.various import zi, zi_nsmap
+
+def create_feed():
+    implementation = zi.implementation(OrderedDict((('id', 'a/a-1.tar.gz'), ('version', '0-1-4'))))
+    implementation.append(zi.requires(OrderedDict((('interface', 'https://example.com/b.xml'), ('importance', 'essential')))))
+    return etree.ElementTree(zi.interface(zi.name('a'), implementation))
+
+class TestWriteFeed(object):
+    
+    def test_unchanged(self, tmpdir):
+        '''
+        When feed file already has the same contents, do not write it
+        '''
+        feed_file = Path(str(tmpdir)) / 'a.xml'
+        assert write_feed(create_feed(), feed_file)
+        assert not write_feed(create_feed(), feed_file)
+        assert not (Path(str(tmpdir)) / 'a.xml.tmp').exists()
+        
+    def test_changed(self, tmpdir):
+        '''
+        When feed changed, overwrite the feed file
+        '''
+        feed_file = Path(str(tmpdir)) / 'a.xml'
+        write_feed(create_feed(), feed_file)
+        feed = create_feed()
+        feed.getroot().append(zi.summary('summary'))
+        assert write_feed(feed, feed_file)
+        assert feed_file.read_bytes() == serialize_feed(feed)
+    
+    def test_unpublished(self, tmpdir):
+        '''
+        A feed file which is up to date, but not published, is published
+        '''
+        directory = Path(str(tmpdir))
+        repository = directory / 'feeds.git'
+        init_repository(repository)
+        feed_file = directory / 'a.xml'
+        write_feed(create_feed(), feed_file)
+        with FeedPublisher(repository, 'message') as publisher:
+            assert write_feed(create_feed(), feed_file, publisher)
+            assert not write_feed(create_feed(), feed_file, publisher)
+        with FeedPublisher(repository, 'message') as publisher:
+            assert not write_feed(create_feed(), feed_file, publisher)
+        assert subprocess.check_output(['git', '-C', str(repository), 'show', 'master:a.xml']) == serialize_feed(create_feed())
+
+    def test_round_trip(self, tmpdir):
+        '''
+        A feed read from file serializes to the same bytes
+        '''
+        feed_file = Path(str(tmpdir)) / 'a.xml'
+        write_feed(create_feed(), feed_file)
+        assert serialize_feed(read_feed(feed_file)) == feed_file.read_bytes()
+        
+class ShuffledPyPI(object):
+    
+    '''
+    PyPI of package pkg with sdists on disk, listed in a random order
+    '''
+    
+    def __init__(self, releases, seed):
+        self._releases = releases  # {version :: str : [release_url :: dict]}
+        self._random = random.Random(seed)
+        
+    def _shuffled(self, items):
+        items = list(items)
+        self._random.shuffle(items)
+        return items
+    
+    def package_releases(self, pypi_name, show_hidden):
+        return self._shuffled(self._releases)
+    
+    def release_data(self, pypi_name, version):
+        return {'version': version, 'summary': 'summary', 'home_page': None, 'description': '', 'classifiers': []}
+    
+    def release_urls(self, pypi_name, version):
+        return self._shuffled(self._releases[version])
+    
+def create_sdist(directory, file_name, version, seed):
+    '''
+    Create sdist whose PKG-INFO and requires.txt list their items in a random
+    order
+    
+    Returns
+    -------
+    release_url : dict
+    '''
+    random_ = random.Random(seed)
+    classifiers = [
+        'Natural Language :: German', 'Natural Language :: English', 'Natural Language :: French',
+        'License :: OSI Approved :: MIT License', 'License :: OSI Approved :: BSD License',
+    ]
+    random_.shuffle(classifiers)
+    pkg_info = 'Metadata-Version: 1.1\nName: pkg\nVersion: {}\n'.format(version)
+    pkg_info += ''.join('Classifier: {}\n'.format(classifier) for classifier in classifiers)
+    requirements = ['c>=1', 'b', 'a<2', 'd!=3']
+    random_.shuffle(requirements)
+    sections = ['\n'.join(requirements), '[test]\ne\nb>=0.5', '[doc]\nf']
+    sections[1:] = random_.sample(sections[1:], 2)
+    files = {
+        'PKG-INFO': pkg_info,
+        'requires.txt': '\n'.join(sections) + '\n',
+    }
+    archive = directory / file_name
+    with tarfile.open(str(archive), 'w:gz') as tar:
+        for name, contents in files.items():
+            info = tarfile.TarInfo('pkg-{}/pkg.egg-info/{}'.format(version, name))
+            contents = contents.encode()
+            info.size = len(contents)
+            info.mtime = 1000000000
+            tar.addfile(info, io.BytesIO(contents))
+    return {
+        'path': 'p/pkg/' + file_name,
+        'url': archive.as_uri(),
+        'filename': file_name,
+        'packagetype': 'sdist',
+        'upload_time': datetime(2017, 1, 1),
+    }
+    
+class TestCanonicalOrder(object):
+    
+    '''
+    Converting the same package yields the same bytes regardless of the order
+    in which PyPI lists things
+    '''
+    
+    @pytest.fixture
+    def releases(self, tmpdir):
+        directory = Path(str(tmpdir))
+        releases = {}
+        for i, version in enumerate(('1.0', '1.1', '2.0', '0.9')):
+            releases[version] = [
+                create_sdist(directory, 'pkg-{}.tar.gz'.format(version), version, seed=i),
+                create_sdist(directory, 'pkg-{}.post.tar.gz'.format(version), version, seed=i + 10),
+                {'path': 'p/pkg/pkg-{}.whl'.format(version), 'filename': 'pkg-{}.whl'.format(version), 'packagetype': 'bdist_wheel'},
+            ]
+        return releases
+    
+    def convert(self, releases, seed, old_feed=None):
+        feed_logger = logging.getLogger(__name__ + ':feed_logger')
+        context = Context(ShuffledPyPI(releases, seed), 'https://example.com/feeds/', None, feed_logger)
+        if old_feed is None:
+            old_feed = etree.ElementTree(zi.interface())
+        return convert(context, 'pkg', 'pkg', old_feed)
+    
+    def test_shuffled(self, releases):
+        feed = self.convert(releases, seed=0)
+        expected = serialize_feed(feed)
+        for seed in range(1, 4):
+            assert serialize_feed(self.convert(releases, seed)) == expected
+            
+        # Also when reusing implementations of the old feed
+        assert serialize_feed(self.convert(releases, seed=4, old_feed=feed)) == expected
+        
+        # Canonical order: implementations by version and id, requires by
+        # interface and langs sorted
+        nsmap = {'zi': zi_nsmap[None]}
+        ids = feed.xpath('//zi:implementation/@id', namespaces=nsmap)
+        assert ids == [
+            'p/pkg/pkg-{}{}.tar.gz'.format(version, suffix)
+            for version in ('0.9', '1.0', '1.1', '2.0')
+            for suffix in ('.post', '')
+        ]
+        assert feed.xpath('//zi:requires/@interface', namespaces=nsmap) == [
+            'https://example.com/feeds/{}.xml'.format(name) for name in 'abcdef'
+        ]
+        assert set(feed.xpath('//@langs', namespaces=nsmap)) == {'de en fr'}
@@ -0,0 +1,321 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.convert._manifest and pypi_to_0install.convert._archive
+'''
+
+import pytest
+import hashlib
+import tarfile
+import zipfile
+import lzma
+import io
+import os
+from pathlib import Path
+from pypi_to_0install.convert._manifest import Manifest
+from pypi_to_0install.convert._archive import (
+    HashingReader, UnsupportedArchive, ExtractionLimits, ExtractionLimitExceeded, read_archive, detect_format,
+    extract_with_patool
+)
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def test_format():
+    '''
+    Files come before subdirectories, each sorted by name
+    '''
+    manifest = Manifest()
+    manifest.add_file('pkg/sub/b', sha256(b'b'), 2, 1)
+    manifest.add_file('pkg/setup.py', sha256(b'setup'), 1.5, 5, executable=True)
+    manifest.add_symlink('pkg/link', 'setup.py')
+    manifest.add_directory('pkg/empty')
+    assert manifest.top_directory == 'pkg'
+    assert manifest.format('pkg') == (
+        'S {} 8 link\n'
+        'X {} 1 5 setup.py\n'
+        'D /empty\n'
+        'D /sub\n'
+        'F {} 2 1 b\n'
+    ).format(sha256(b'setup.py'), sha256(b'setup'), sha256(b'b'))
+    assert manifest.format().startswith('D /pkg\n')
+    
+def test_digest():
+    manifest = Manifest()
+    manifest.add_file('a', sha256(b'a'), 0, 1)
+    digest = hashlib.sha256('F {} 0 1 a\n'.format(sha256(b'a')).encode()).digest()
+    import base64
+    assert manifest.digest() == 'sha256new_' + base64.b32encode(digest).decode().rstrip('=')
+    
+def test_top_directory():
+    manifest = Manifest()
+    manifest.add_file('a', sha256(b'a'), 0, 1)
+    assert manifest.top_directory is None
+    manifest = Manifest()
+    manifest.add_file('a/b', sha256(b'a'), 0, 1)
+    manifest.add_file('c/d', sha256(b'a'), 0, 1)
+    assert manifest.top_directory is None
+    
+@pytest.fixture
+def tree(tmpdir):
+    '''
+    Directory tree of a typical sdist
+    '''
+    root = Path(str(tmpdir)) / 'tree'
+    package = root / 'pkg-1.0'
+    (package / 'pkg.egg-info').mkdir(parents=True)
+    (package / 'pkg.egg-info' / 'PKG-INFO').write_text('Name: pkg\n')
+    (package / 'setup.py').write_text('setup()\n')
+    (package / 'setup.py').chmod(0o755)
+    (package / 'empty').mkdir()
+    os.symlink('setup.py', str(package / 'link'))
+    for path in root.glob('**/*'):
+        if not path.is_symlink():
+            os.utime(str(path), (1000000000, 1000000000))
+    return root
+
+@pytest.mark.parametrize('mode,extension', (('w:gz', '.tar.gz'), ('w:bz2', '.tar.bz2'), ('w:xz', '.tar.xz'), ('w', '.tar')))
+def test_read_tar(tree, tmpdir, mode, extension):
+    '''
+    Reading a tar yields the manifest of the tree and extracts only the
+    requested files
+    '''
+    archive = Path(str(tmpdir)) / ('pkg-1.0' + extension)
+    with tarfile.open(str(archive), mode) as tar:
+        tar.add(str(tree / 'pkg-1.0'), 'pkg-1.0')
+    directory = Path(str(tmpdir)) / 'unpacked'
+    md5 = hashlib.md5()
+    with archive.open('rb') as file:
+        reader = HashingReader(file, [md5])
+        manifest, _ = read_archive(reader, archive.name, directory, extract=lambda path: path.endswith('PKG-INFO'))
+        reader.drain()
+    assert manifest.digest('pkg-1.0') == Manifest.from_directory(tree / 'pkg-1.0').digest()
+    assert [str(path.relative_to(directory)) for path in directory.glob('**/*') if path.is_file()] == ['pkg-1.0/pkg.egg-info/PKG-INFO']
+    assert md5.hexdigest() == hashlib.md5(archive.read_bytes()).hexdigest()
+    assert reader.size == archive.stat().st_size
+    
+def test_read_zip(tree, tmpdir):
+    archive = Path(str(tmpdir)) / 'pkg-1.0.zip'
+    with zipfile.ZipFile(str(archive), 'w') as zip_file:
+        for path in sorted((tree / 'pkg-1.0').glob('**/*')):
+            if not path.is_symlink():
+                zip_file.write(str(path), str(path.relative_to(tree)))
+    with archive.open('rb') as file:
+        manifest, _ = read_archive(file, archive.name, Path(str(tmpdir)) / 'unpacked', extract=lambda path: False)
+    expected = Manifest.from_directory(tree / 'pkg-1.0')
+    expected_lines = [line for line in expected.format().splitlines() if not line.startswith('S ')]
+    lines = manifest.format('pkg-1.0').splitlines()
+    # Note: zip stores mtimes in local time, only compare the rest
+    strip_mtime = lambda line: line.split(' ')[:2] + line.split(' ')[3:] if line[0] in 'FX' else line
+    assert list(map(strip_mtime, lines)) == list(map(strip_mtime, expected_lines))
+    
+@pytest.mark.parametrize('extension', ('.tar.gz', '.zip'))
+def test_capture(tree, tmpdir, extension):
+    '''
+    Captured members are returned in memory, without writing them
+    '''
+    archive = Path(str(tmpdir)) / ('pkg-1.0' + extension)
+    if extension == '.zip':
+        with zipfile.ZipFile(str(archive), 'w') as zip_file:
+            zip_file.write(str(tree / 'pkg-1.0' / 'pkg.egg-info' / 'PKG-INFO'), 'pkg-1.0/pkg.egg-info/PKG-INFO')
+            zip_file.write(str(tree / 'pkg-1.0' / 'setup.py'), 'pkg-1.0/setup.py')
+    else:
+        with tarfile.open(str(archive), 'w:gz') as tar:
+            tar.add(str(tree / 'pkg-1.0'), 'pkg-1.0')
+    directory = Path(str(tmpdir)) / 'unpacked'
+    with archive.open('rb') as file:
+        _, captured = read_archive(
+            file, archive.name, directory,
+            extract=lambda path: False, capture=lambda path: path.endswith('PKG-INFO')
+        )
+    assert captured == {'pkg-1.0/pkg.egg-info/PKG-INFO': b'Name: pkg\n'}
+    assert not directory.exists() or not list(directory.iterdir())
+    
+def test_unsupported(tmpdir):
+    '''
+    When the format is unsupported, nothing is consumed
+    '''
+    file = HashingReader(io.BytesIO(b'Rar!\x1a\x07\x00rest'), [])
+    with pytest.raises(UnsupportedArchive):
+        read_archive(file, 'pkg-1.0.rar', Path(str(tmpdir)))
+    assert file.read() == b'Rar!\x1a\x07\x00rest'
+
+def test_detect_format(tree, tmpdir):
+    '''
+    The format is detected by content, not by file name
+    '''
+    archive = Path(str(tmpdir)) / 'pkg-1.0.zip'
+    with tarfile.open(str(archive), 'w:gz') as tar:
+        tar.add(str(tree / 'pkg-1.0'), 'pkg-1.0')
+    with archive.open('rb') as file:
+        manifest, _ = read_archive(file, archive.name, Path(str(tmpdir)) / 'unpacked', extract=lambda path: False)
+    assert manifest.top_directory == 'pkg-1.0'
+    assert detect_format(b'PK\x03\x04') == 'zip'
+    assert detect_format(b'') is None
+
+def test_hashing_reader_peek():
+    '''
+    Peeked data is returned again by read and hashed once
+    '''
+    md5 = hashlib.md5()
+    reader = HashingReader(io.BytesIO(b'0123456789'), [md5])
+    assert reader.peek(4) == b'0123'
+    assert reader.peek(2) == b'01'
+    assert reader.read(2) == b'01'
+    assert reader.peek(20) == b'23456789'
+    assert reader.read(3) == b'234'
+    assert reader.read() == b'56789'
+    assert md5.hexdigest() == hashlib.md5(b'0123456789').hexdigest()
+    assert reader.size == 10
+
+def test_path_outside_archive(tmpdir):
+    '''
+    Members outside the archive are ignored
+    '''
+    archive = Path(str(tmpdir)) / 'evil.tar'
+    with tarfile.open(str(archive), 'w') as tar:
+        info = tarfile.TarInfo('../evil')
+        tar.addfile(info)
+        info = tarfile.TarInfo('/abs/ok')
+        tar.addfile(info)
+    with archive.open('rb') as file:
+        manifest, _ = read_archive(file, archive.name, Path(str(tmpdir)) / 'unpacked')
+    assert manifest.format() == 'D /abs\nF {} 0 0 ok\n'.format(sha256(b''))
+    assert not (Path(str(tmpdir)) / 'evil').exists()
+
+def tar_gz(members):
+    '''
+    Get tar.gz with members, [(name :: str, contents :: bytes)]
+    '''
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+        for name, contents in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(contents)
+            tar.addfile(info, io.BytesIO(contents))
+    archive.seek(0)
+    return archive
+
+class TestExtractionLimits(object):
+    
+    def test_size_tar(self, tmpdir):
+        '''
+        Reading stops as soon as the uncompressed size exceeds the limit,
+        without reading the rest of a bomb
+        '''
+        archive = tar_gz([('bomb', bytes(2**25))])
+        reader = HashingReader(archive, [])
+        with pytest.raises(ExtractionLimitExceeded):
+            read_archive(reader, 'bomb.tar.gz', Path(str(tmpdir)), limits=ExtractionLimits(size=2**20))
+        assert reader.size < len(archive.getvalue()) / 2
+        assert not (Path(str(tmpdir)) / 'bomb').exists() or (Path(str(tmpdir)) / 'bomb').stat().st_size <= 2**20 + 2**16
+        
+    def test_size_zip(self, tmpdir):
+        '''
+        The declared size of a zip is checked before decompressing it
+        '''
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr('bomb', bytes(2**22))
+        archive.seek(0)
+        with pytest.raises(ExtractionLimitExceeded):
+            read_archive(HashingReader(archive, []), 'bomb.zip', Path(str(tmpdir)), limits=ExtractionLimits(size=2**20))
+        assert not (Path(str(tmpdir)) / 'bomb').exists()
+        
+    def test_compressed_size_zip(self, tmpdir):
+        '''
+        A zip is not spooled beyond the size limit
+        '''
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zip_file:
+            zip_file.writestr('big', os.urandom(2**21))
+        archive.seek(0)
+        reader = HashingReader(archive, [])
+        with pytest.raises(ExtractionLimitExceeded):
+            read_archive(reader, 'big.zip', Path(str(tmpdir)), limits=ExtractionLimits(size=2**20), spool_size=0, spool_directory=Path(str(tmpdir)))
+        assert reader.size <= 2**20 + 2**16
+        
+    def test_members(self, tmpdir):
+        archive = tar_gz([('pkg/{}'.format(i), b'') for i in range(11)])
+        with pytest.raises(ExtractionLimitExceeded):
+            read_archive(HashingReader(archive, []), 'pkg.tar.gz', Path(str(tmpdir)), limits=ExtractionLimits(members=10))
+        archive.seek(0)
+        read_archive(HashingReader(archive, []), 'pkg.tar.gz', Path(str(tmpdir)), limits=ExtractionLimits(members=11))
+        
+    def test_depth(self, tmpdir):
+        archive = tar_gz([('a/' * 5 + 'file', b'')])
+        with pytest.raises(ExtractionLimitExceeded):
+            read_archive(HashingReader(archive, []), 'pkg.tar.gz', Path(str(tmpdir)), limits=ExtractionLimits(depth=5))
+        archive.seek(0)
+        read_archive(HashingReader(archive, []), 'pkg.tar.gz', Path(str(tmpdir)), limits=ExtractionLimits(depth=6))
+        
+    def test_duration(self, tmpdir):
+        times = iter(range(100))
+        archive = tar_gz([('pkg/{}'.format(i), b'') for i in range(10)])
+        with pytest.raises(ExtractionLimitExceeded):
+            read_archive(
+                HashingReader(archive, []), 'pkg.tar.gz', Path(str(tmpdir)),
+                limits=ExtractionLimits(duration=5), clock=lambda: next(times)
+            )
+        
+    def test_no_limits(self, tmpdir):
+        archive = tar_gz([('a/' * 5 + 'file', b'x' * 10)])
+        limits = ExtractionLimits(size=None, members=None, depth=None, duration=None)
+        manifest, _ = read_archive(HashingReader(archive, []), 'pkg.tar.gz', Path(str(tmpdir)), limits=limits)
+        assert manifest.top_directory == 'a'
+        
+class TestExtractWithPatool(object):
+    
+    '''
+    Formats read_archive does not support, here a legacy .lzma file
+    '''
+        
+    @pytest.fixture
+    def directory(self, tmpdir):
+        directory = Path(str(tmpdir)) / 'unpacked'
+        directory.mkdir()
+        return directory
+        
+    def archive(self, contents):
+        return io.BytesIO(lzma.compress(contents, format=lzma.FORMAT_ALONE))
+        
+    def test_extract(self, tmpdir, directory):
+        manifest = extract_with_patool(self.archive(b'x' * 10), 'pkg-1.0.lzma', directory, Path(str(tmpdir)))
+        assert (directory / 'pkg-1.0').read_bytes() == b'x' * 10
+        assert manifest.format().split(' ')[-2:] == ['10', 'pkg-1.0\n']
+        
+    def test_size(self, tmpdir, directory):
+        '''
+        The size of the extracted tree is checked
+        '''
+        with pytest.raises(ExtractionLimitExceeded):
+            extract_with_patool(self.archive(bytes(2**21)), 'pkg-1.0.lzma', directory, Path(str(tmpdir)), limits=ExtractionLimits(size=2**20))
+        
+    def test_duration(self, tmpdir, directory):
+        '''
+        patool is killed when it exceeds the duration
+        '''
+        with pytest.raises(ExtractionLimitExceeded):
+            extract_with_patool(
+                self.archive(b'x'), 'pkg-1.0.lzma', directory, Path(str(tmpdir)),
+                limits=ExtractionLimits(duration=0), clock=lambda: 0.0
+            )
+        
+    def test_invalid(self, tmpdir, directory):
+        with pytest.raises(UnsupportedArchive):
+            extract_with_patool(io.BytesIO(b'garbage'), 'pkg-1.0.lzma', directory, Path(str(tmpdir)))
@@ -0,0 +1,84 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+from pypi_to_0install.convert._metadata import parse_metadata, decode
+from pypi_to_0install.convert import parse_requirements, _egg_info
+
+pkg_info = b'''\
+Metadata-Version: 1.1
+Name: pkg
+Version: 1.0
+Summary: A package
+Description: Line one
+        
+        Line two
+Classifier: License :: OSI Approved :: MIT License
+classifier: Natural Language :: Dutch
+Author: Andr\xe9
+
+Classifier: Body :: Not a header
+'''
+
+def test_parse_metadata():
+    metadata = parse_metadata(pkg_info)
+    assert metadata['name'] == ['pkg']
+    assert metadata['description'] == ['Line one\n\nLine two']  # whitespace-only lines do not end the headers
+    assert metadata['classifier'] == ['License :: OSI Approved :: MIT License', 'Natural Language :: Dutch']
+    assert metadata['author'] == ['Andr\xe9']  # Latin-1 fallback
+    
+def test_parse_metadata_fields():
+    '''
+    Only requested fields are returned, names are case-insensitive
+    '''
+    metadata = parse_metadata(pkg_info, ['CLASSIFIER'])
+    assert metadata == {'classifier': ['License :: OSI Approved :: MIT License', 'Natural Language :: Dutch']}
+    
+def test_parse_metadata_malformed():
+    '''
+    Malformed lines are ignored, CRLF line endings and a BOM are tolerated
+    '''
+    data = '\ufeffName: pkg\r\nnot a header\r\nSummary: \u2603\r\n'.encode('utf-8')
+    assert parse_metadata(data) == {'name': ['pkg'], 'summary': ['\u2603']}
+    assert parse_metadata(b'') == {}
+    
+def test_decode():
+    assert decode('\u2603'.encode('utf-8')) == '\u2603'
+    assert decode(b'\xe9') == '\xe9'
+    
+def test_parse_requirements():
+    egg_info = {
+        'requires.txt': b'a>=1\n\n[extra]\nb\n',
+        'depends.txt': b'c\n',
+    }
+    requirements = parse_requirements(egg_info)
+    assert [requirement.name for requirement in requirements[None]] == ['a', 'c']
+    assert [requirement.name for requirement in requirements['extra']] == ['b']
+    assert parse_requirements({}) == {}
+    
+def test_egg_info():
+    '''
+    Egg-info files are taken from the first egg-info directory in the top
+    directory
+    '''
+    files = {
+        'pkg-1.0/b.egg-info/PKG-INFO': b'b',
+        'pkg-1.0/a.egg-info/PKG-INFO': b'a',
+        'pkg-1.0/a.egg-info/requires.txt': b'r',
+        'other/c.egg-info/PKG-INFO': b'c',
+    }
+    assert _egg_info(files, 'pkg-1.0') == {'PKG-INFO': b'a', 'requires.txt': b'r'}
+    assert _egg_info(files, None) is None
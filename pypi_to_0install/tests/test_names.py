@@ -0,0 +1,51 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+from pypi_to_0install.names import NameIndex, NameCollision
+import pytest
+
+@pytest.fixture
+def names():
+    return NameIndex(['Foo_Bar', 'foo.bar', 'foo-bar', 'Baz', 'Qux.Quux', 'qux_quux'])
+
+def test_lookup(names):
+    assert len(names) == 6
+    assert names.zi_name('Foo_Bar') == 'foo-bar'
+    assert names.zi_name('Baz') == 'baz'
+    assert names.zi_name('Not_Indexed') == 'not-indexed'
+    assert names.pypi_names('baz') == ['Baz']
+    assert names.pypi_names('missing') == []
+    assert names.owner('missing') is None
+    
+def test_collisions(names):
+    '''
+    The owner of colliding names is the one equal to the ZI name, else the
+    first in sorted order
+    '''
+    assert names.collisions == {
+        'foo-bar': ['foo-bar', 'Foo_Bar', 'foo.bar'],
+        'qux-quux': ['Qux.Quux', 'qux_quux'],
+    }
+    assert names.owner('foo-bar') == 'foo-bar'
+    assert names.owner('qux-quux') == 'Qux.Quux'
+    
+def test_check_owner(names):
+    names.check_owner('foo-bar')
+    names.check_owner('Baz')
+    names.check_owner('Not_Indexed')
+    with pytest.raises(NameCollision):
+        names.check_owner('Foo_Bar')
@@ -0,0 +1,150 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.publish
+'''
+
+import pytest
+import subprocess
+import signal
+from pathlib import Path
+from pypi_to_0install.publish import FeedPublisher, commit_message
+
+@pytest.fixture
+def repository(tmpdir):
+    repository = Path(str(tmpdir)) / 'feeds.git'
+    subprocess.check_call(['git', 'init', '--quiet', '--bare', str(repository)])
+    return repository
+
+def git(repository, *args):
+    return subprocess.check_output(('git', '-C', str(repository)) + args).decode()
+
+def test_commit_message():
+    assert commit_message(None, 10) == 'Initial commit: PyPI serial 10'
+    assert commit_message(10, 20) == 'Update: PyPI serial 10 -> 20'
+    
+def test_single_commit(repository):
+    '''
+    All changes are committed in a single commit on exit
+    '''
+    with FeedPublisher(repository, 'message1') as publisher:
+        publisher.add('a.xml', b'a')
+        publisher.add('b.xml', b'b')
+    assert git(repository, 'log', '--format=%s') == 'message1\n'
+    assert git(repository, 'show', 'master:a.xml') == 'a'
+    assert git(repository, 'show', 'master:b.xml') == 'b'
+    
+def test_continue_branch(repository):
+    '''
+    A later run commits on top of the existing branch
+    '''
+    with FeedPublisher(repository, 'message1') as publisher:
+        publisher.add('a.xml', b'a')
+        publisher.add('b.xml', b'b')
+    with FeedPublisher(repository, 'message2') as publisher:
+        publisher.add('a.xml', b'a2')
+        publisher.remove('b.xml')
+    assert git(repository, 'log', '--format=%s') == 'message2\nmessage1\n'
+    assert git(repository, 'ls-tree', '--name-only', 'master') == 'a.xml\n'
+    assert git(repository, 'show', 'master:a.xml') == 'a2'
+    
+def test_feeds_per_commit(repository):
+    '''
+    When feeds_per_commit, commit each time that many feeds changed
+    '''
+    with FeedPublisher(repository, 'message', feeds_per_commit=2) as publisher:
+        for name in 'abcde':
+            publisher.add(name + '.xml', name.encode())
+        assert publisher.commits == 2
+    assert publisher.commits == 3
+    assert git(repository, 'ls-tree', '--name-only', 'master').split() == [name + '.xml' for name in 'abcde']
+    
+def test_unchanged(repository):
+    '''
+    Files are only changed if their contents differ from the branch
+    '''
+    with FeedPublisher(repository, 'message1') as publisher:
+        assert publisher.add('a.xml', b'a')
+        assert not publisher.add('a.xml', b'a')
+    with FeedPublisher(repository, 'message2') as publisher:
+        assert not publisher.add('a.xml', b'a')
+        publisher.remove('b.xml')
+    assert publisher.commits == 0
+    with FeedPublisher(repository, 'message3') as publisher:
+        assert publisher.add('a.xml', b'a2')
+    assert git(repository, 'log', '--format=%s') == 'message3\nmessage1\n'
+
+def test_no_changes(repository):
+    '''
+    When nothing changed, do not commit
+    '''
+    with FeedPublisher(repository, 'message') as publisher:
+        pass
+    assert publisher.commits == 0
+    
+def test_exception(repository):
+    '''
+    When an exception is raised, the changes so far are committed as interrupted
+    '''
+    with FeedPublisher(repository, 'message1') as publisher:
+        publisher.add('a.xml', b'a')
+    committed = []
+    with pytest.raises(ZeroDivisionError):
+        with FeedPublisher(repository, 'message2') as publisher:
+            publisher.add('b.xml', b'b')
+            publisher.when_committed(lambda: committed.append('b'))
+            1/0
+    assert git(repository, 'log', '--format=%s') == 'message2 (interrupted)\nmessage1\n'
+    assert git(repository, 'show', 'master:b.xml') == 'b'
+    assert committed == ['b']
+
+def test_exception_git_killed(repository):
+    '''
+    When git died as well, the changes are lost and their callbacks not called
+    '''
+    committed = []
+    sigpipe_handler = signal.signal(signal.SIGPIPE, signal.SIG_IGN)  # Note: conftest restores the default, which kills the process on writing to dead git
+    try:
+        with pytest.raises(ZeroDivisionError):
+            with FeedPublisher(repository, 'message') as publisher:
+                publisher.add('a.xml', b'a')
+                publisher.when_committed(lambda: committed.append('a'))
+                publisher._process.kill()
+                publisher._process.wait()
+                1/0
+    finally:
+        signal.signal(signal.SIGPIPE, sigpipe_handler)
+    assert committed == []
+
+def test_when_committed(repository):
+    '''
+    Callbacks are called once the changes added before them are committed
+    '''
+    committed = []
+    with FeedPublisher(repository, 'message', feeds_per_commit=2) as publisher:
+        publisher.when_committed(lambda: committed.append('nothing'))
+        assert committed == ['nothing']
+        publisher.add('a.xml', b'a')
+        publisher.when_committed(lambda: committed.append('a'))
+        assert committed == ['nothing']
+        publisher.add('b.xml', b'b')
+        assert committed == ['nothing', 'a']
+        assert git(repository, 'show', 'master:a.xml') == 'a'
+        publisher.add('c.xml', b'c')
+        publisher.when_committed(lambda: committed.append('c'))
+    assert committed == ['nothing', 'a', 'c']
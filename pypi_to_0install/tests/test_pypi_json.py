@@ -0,0 +1,144 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.pypi_json
+'''
+
+import pytest
+import json
+import datetime
+from pathlib import Path
+from threading import Thread
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from pypi_to_0install.pypi_json import HTTPCache, JSONPyPI
+import urllib.error
+
+_package = {
+    'info': {'name': 'Foo', 'version': '2.0', 'summary': 'Summary 2.0'},
+    'releases': {
+        '1.0': [],
+        '2.0': [{
+            'filename': 'Foo-2.0.tar.gz',
+            'url': 'https://files.example.com/packages/source/F/Foo/Foo-2.0.tar.gz',
+            'packagetype': 'sdist',
+            'md5_digest': '0' * 32,
+            'upload_time': '2017-02-03T04:05:06',
+        }],
+    },
+}
+
+_release = {'info': {'name': 'Foo', 'version': '1.0', 'summary': 'Summary 1.0'}}
+
+class StubPyPI(BaseHTTPRequestHandler):
+    
+    documents = {
+        '/pypi/Foo/json': _package,
+        '/pypi/Foo/1.0/json': _release,
+    }
+    requests = []  # [(path, status)]
+    
+    def do_GET(self):
+        document = self.documents.get(self.path)
+        if document is None:
+            status = 404
+        elif self.headers.get('If-None-Match') == '"etag"':
+            status = 304
+        else:
+            status = 200
+        self.requests.append((self.path, status))
+        self.send_response(status)
+        if status == 200:
+            body = json.dumps(document).encode()
+            self.send_header('ETag', '"etag"')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            
+    def log_message(self, *args):
+        pass
+    
+@pytest.fixture
+def server():
+    StubPyPI.requests = []
+    server = HTTPServer(('127.0.0.1', 0), StubPyPI)
+    thread = Thread(target=server.serve_forever)
+    thread.start()
+    yield 'http://127.0.0.1:{}/pypi'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+    thread.join()
+    
+@pytest.fixture
+def cache(tmpdir):
+    return HTTPCache(Path(str(tmpdir)))
+
+def test_http_cache(server, cache):
+    '''
+    Cached responses are revalidated with a conditional request
+    '''
+    url = server + '/Foo/json'
+    assert json.loads(cache.get(url).decode()) == _package
+    assert json.loads(cache.get(url).decode()) == _package
+    assert StubPyPI.requests == [('/pypi/Foo/json', 200), ('/pypi/Foo/json', 304)]
+    assert (cache.hits, cache.misses) == (1, 1)
+    
+def test_http_cache_error(server, cache):
+    with pytest.raises(urllib.error.HTTPError) as ex:
+        cache.get(server + '/Bar/json')
+    assert ex.value.code == 404
+    
+class TestJSONPyPI(object):
+    
+    def test_package_releases(self, server, cache):
+        pypi = JSONPyPI(server, cache)
+        assert sorted(pypi.package_releases('Foo', True)) == ['1.0', '2.0']
+        
+    def test_release_data(self, server, cache):
+        '''
+        release_data of the latest version comes from the package document,
+        other versions are requested separately
+        '''
+        pypi = JSONPyPI(server, cache)
+        assert pypi.release_data('Foo', '2.0')['summary'] == 'Summary 2.0'
+        assert pypi.release_data('Foo', '1.0')['summary'] == 'Summary 1.0'
+        assert [path for path, _ in StubPyPI.requests] == ['/pypi/Foo/json', '/pypi/Foo/1.0/json']
+        
+    def test_release_urls(self, server, cache):
+        '''
+        release_urls are converted to match the XML-RPC interface
+        '''
+        pypi = JSONPyPI(server, cache)
+        assert pypi.release_urls('Foo', '1.0') == []
+        release_url, = pypi.release_urls('Foo', '2.0')
+        assert release_url['path'] == 'source/F/Foo/Foo-2.0.tar.gz'
+        assert release_url['upload_time'] == datetime.datetime(2017, 2, 3, 4, 5, 6)
+        assert release_url['packagetype'] == 'sdist'
+        
+    def test_fallback(self, server, cache):
+        '''
+        Other methods are delegated to fallback
+        '''
+        class Fallback(object):
+            def changelog_last_serial(self):
+                return 5
+        assert JSONPyPI(server, cache, Fallback()).changelog_last_serial() == 5
+        with pytest.raises(AttributeError):
+            JSONPyPI(server, cache).changelog_last_serial()
@@ -0,0 +1,107 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.scheduling
+'''
+
+import pytest
+from pypi_to_0install.scheduling import Scheduler, Timings
+
+class Clock(object):
+    
+    def __init__(self):
+        self.time = 0.0
+        
+    def __call__(self):
+        return self.time
+    
+class TestTimings(object):
+    
+    def test_estimate(self):
+        '''
+        Estimate known packages by history, unknown ones by the mean
+        '''
+        timings = Timings({'a': 1.0, 'b': 3.0})
+        assert timings.estimate('a') == 1.0
+        assert timings.estimate('c') == 2.0
+        timings.record('a', 3.0)
+        assert timings.estimate('a') == 2.0  # moving average
+        assert timings.estimate('c') == 2.5
+        
+    def test_default(self):
+        '''
+        Without history, estimate the default
+        '''
+        assert Timings(default=5.0).estimate('a') == 5.0
+        
+class TestScheduler(object):
+    
+    def test_prioritize(self):
+        '''
+        Order by most popular, then most recently changed, then name
+        '''
+        scheduler = Scheduler(Timings())
+        pending = {'a': 1, 'b': 2, 'c': 1, 'd': 1}
+        assert scheduler.prioritize(pending, popularity={'d': 5}) == ['d', 'b', 'a', 'c']
+        
+    def test_prioritize_since_serial(self):
+        '''
+        Packages changed since since_serial come first
+        '''
+        scheduler = Scheduler(Timings())
+        pending = {'a': 1, 'b': 3, 'c': 2, 'd': 1}
+        assert scheduler.prioritize(pending, popularity={'d': 5, 'c': 1}, since_serial=1) == ['c', 'b', 'd', 'a']
+        
+    def test_no_time_limit(self):
+        scheduler = Scheduler(Timings())
+        assert scheduler.remaining is None
+        assert list(scheduler.schedule({'a': 1, 'b': 2})) == ['b', 'a']
+        
+    def test_time_limit(self):
+        '''
+        Skip packages that would not finish in time, stop when time is up
+        '''
+        clock = Clock()
+        timings = Timings({'a': 5.0, 'b': 20.0, 'c': 5.0, 'd': 1.0})
+        scheduler = Scheduler(timings, time_limit=12.0, margin=2.0, clock=clock)
+        converted = []
+        for pypi_name in scheduler.schedule({'a': 4, 'b': 3, 'c': 2, 'd': 1}):
+            with scheduler.timed(pypi_name):
+                clock.time += timings.estimate(pypi_name)
+            converted.append(pypi_name)
+        assert converted == ['a', 'c']
+        assert scheduler.skipped == ['b']
+        assert scheduler.remaining == 0.0
+        
+    def test_timed(self):
+        '''
+        Measured durations are recorded
+        '''
+        clock = Clock()
+        timings = Timings()
+        scheduler = Scheduler(timings, clock=clock)
+        with scheduler.timed('a'):
+            clock.time += 3.0
+        assert timings.estimate('a') == 3.0
+        
+        # Also when the conversion raises
+        with pytest.raises(ValueError):
+            with scheduler.timed('b'):
+                clock.time += 2.0
+                raise ValueError()
+        assert timings.estimate('b') == 2.0
@@ -0,0 +1,109 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.sharding
+'''
+
+import pytest
+from pathlib import Path
+from pypi_to_0install.sharding import Shard, ShardConflict, shard_of, merge_shards
+
+def test_shard_of_stable():
+    '''
+    shard_of does not depend on the process (unlike hash())
+    '''
+    assert [shard_of(name, 4) for name in ('numpy', 'scipy', 'chicken-turtle-util')] == [0, 2, 2]
+    
+def test_partition():
+    '''
+    Every package is in exactly one shard
+    '''
+    names = ['package{}'.format(i) for i in range(1000)]
+    shards = [Shard(4, index) for index in range(4)]
+    for name in names:
+        assert sum(name in shard for shard in shards) == 1
+    for shard in shards:
+        assert 150 < sum(name in shard for name in names) < 350  # roughly balanced
+        
+class TestShard(object):
+    
+    def test_parse(self):
+        shard = Shard.parse('1/4')
+        assert shard == Shard(4, 1)
+        assert str(shard) == '1/4'
+        
+    @pytest.mark.parametrize('shard', ('1', '1/a', '4/4', '-1/4'))
+    def test_parse_invalid(self, shard):
+        with pytest.raises(ValueError):
+            Shard.parse(shard)
+            
+class TestMergeShards(object):
+    
+    @pytest.fixture
+    def directory(self, tmpdir):
+        return Path(str(tmpdir))
+    
+    def test_happy_days(self, directory):
+        '''
+        Merge feeds and return the changed ones
+        '''
+        shard1 = directory / 'shard1'
+        shard2 = directory / 'shard2'
+        output = directory / 'output'
+        shard1.mkdir()
+        shard2.mkdir()
+        (shard1 / 'a.xml').write_bytes(b'a')
+        (shard1 / 'a.log').write_bytes(b'log')
+        (shard2 / 'b.xml').write_bytes(b'b')
+        assert merge_shards([shard1, shard2], output) == ([output / 'a.xml', output / 'b.xml'], [])
+        assert sorted(path.name for path in output.iterdir()) == ['a.xml', 'b.xml']
+        
+        # Merging again only returns what changed
+        (shard2 / 'b.xml').write_bytes(b'b2')
+        assert merge_shards([shard1, shard2], output) == ([output / 'b.xml'], [])
+        assert (output / 'b.xml').read_bytes() == b'b2'
+    
+    def test_removed(self, directory):
+        '''
+        Feeds which a shard dropped since the last merge are removed
+        '''
+        shard1 = directory / 'shard1'
+        shard2 = directory / 'shard2'
+        output = directory / 'output'
+        shard1.mkdir()
+        shard2.mkdir()
+        (shard1 / 'a.xml').write_bytes(b'a')
+        (shard2 / 'b.xml').write_bytes(b'b')
+        (shard2 / 'b_0-1.xml').write_bytes(b'b sub-feed')
+        merge_shards([shard1, shard2], output)
+        (shard2 / 'b_0-1.xml').unlink()
+        assert merge_shards([shard1, shard2], output) == ([], [output / 'b_0-1.xml'])
+        assert sorted(path.name for path in output.iterdir()) == ['a.xml', 'b.xml']
+        
+    def test_conflict(self, directory):
+        '''
+        When a feed is in multiple shards, raise
+        '''
+        shard1 = directory / 'shard1'
+        shard2 = directory / 'shard2'
+        shard1.mkdir()
+        shard2.mkdir()
+        (shard1 / 'a.xml').write_bytes(b'a')
+        (shard2 / 'a.xml').write_bytes(b'a')
+        with pytest.raises(ShardConflict):
+            merge_shards([shard1, shard2], directory / 'output')
@@ -23,7 +23,7 @@ import pytest
 from packaging.specifiers import SpecifierSet
 from pkg_resources import Requirement
 from zeroinstall.injector.versions import parse_version_expression, parse_version as zi_parse_version 
-from pypi_to_0install.convert._specifiers import convert_specifiers
+from pypi_to_0install.convert._specifiers import convert_specifiers, _convert_simple, _convert_general
 from pypi_to_0install.convert._version import parse_version
 from pypi_to_0install.main import Context
 from .common import convert_version
@@ -121,7 +121,12 @@ def SpecifierSet_(specifiers, prereleases):
     # combinations
     '==1.*,!=1.1.dev1,<1.2',
     '==1,===1',
-    '~=1.1,==1.*,!=1.2.b1,>1,>=1.b1,<3,<=2.1'
+    '~=1.1,==1.*,!=1.2.b1,>1,>=1.b1,<3,<=2.1',
+    '!=1,!=1.1,!=2',
+    '!=1.*,!=2.*',
+    '>1,!=1.1,!=1.2,<2',
+    '>=1,<=2,!=3',
+    '>=2,<1',  # matches nothing
 ))
 def test_happy_days(context, versions, specifiers):
     '''
@@ -150,6 +155,95 @@ def test_happy_days(context, versions, specifiers):
             )
         )
     
+class TestCanonical(object):
+    
+    '''
+    convert_specifiers returns the shortest equivalent expression
+    '''
+    
+    @pytest.mark.parametrize('specifiers, expected', (
+        ('>=0.dev0', None),  # all versions
+        ('>=1,>=0.dev0', '0-1-4..'),
+        ('!=1', '!0-1-4'),
+        ('!=1.*,!=2.*', '..!0-1-0.0-4 | 0-3-0.0-4..'),  # touching ranges are joined
+        ('!=1,!=1.1,!=2', '..!0-1-4 | 0-1-4-1..!0-1.1-4 | 0-1.1-4-1..!0-2-4 | 0-2-4-1..'),
+        ('>=1,<=2,!=3', '0-1-4..!0-2-4-1'),  # exclusion outside of the range is dropped
+    ))
+    def test_canonical(self, context, specifiers, expected):
+        assert convert_specifiers_(context, specifiers) == expected
+        
+    def test_empty(self, context, caplog):
+        '''
+        When nothing matches, warn and return an expression matching nothing
+        '''
+        expression = convert_specifiers_(context, '>=2,<1')
+        assert not parse_version_expression(expression)(zi_parse_version('0-1-4'))
+        assert any('match no version' in record.getMessage() for record in caplog.records())
+    
+    @pytest.mark.parametrize('specifiers', ('<0', '<0.dev0', '<0.dev0,>=1'))
+    def test_empty_single(self, context, specifiers):
+        '''
+        Clauses which match nothing on their own convert to the same expression
+        '''
+        assert convert_specifiers_(context, specifiers) == convert_specifiers_(context, '>=2,<1')
+    
+    @pytest.mark.parametrize('specifiers, expected', (
+        ('!=0.dev0', '0-0-0.0-4-1..'),  # all but Version.MIN
+        ('!=0.*', '0-1-0.0-4..'),
+    ))
+    def test_touching_min(self, context, specifiers, expected):
+        assert convert_specifiers_(context, specifiers) == expected
+        
+class TestFastPath(object):
+    
+    '''
+    The fast path for simple specifiers gives the same result as the general one
+    '''
+    
+    @pytest.mark.parametrize('operator', ('>=', '>', '<=', '<', '==', '===', '!='))
+    def test_single(self, context, versions, operator):
+        for version in sorted(versions):
+            specifiers = [(operator, version)]
+            actual = _convert_simple(specifiers)
+            if parse_version(version).release == '0' and parse_version(version).epoch == 0:
+                assert actual is None  # may touch Version.MIN, left to the general path
+                continue
+            assert actual is not None, specifiers
+            assert actual == _convert_general(context, specifiers), specifiers
+            
+    def test_range(self, context, versions):
+        '''
+        >=v1,<v2 in any order
+        '''
+        versions = sorted(versions)
+        bounds = versions[::len(versions) // 4]
+        pairs = [(start, end) for start in versions for end in bounds]
+        pairs += [(start, end) for start in bounds for end in versions]
+        fast = 0
+        for start, end in pairs:
+            for specifiers in ([('>=', start), ('<', end)], [('<', end), ('>=', start)]):
+                actual = _convert_simple(specifiers)
+                if actual is not None:
+                    fast += 1
+                    assert actual == _convert_general(context, specifiers), specifiers
+        assert fast > len(pairs) / 2
+        
+    @pytest.mark.parametrize('specifiers', (
+        [('==', '1.*')],
+        [('~=', '1.1')],
+        [('>=', 'foobar')],
+        [('>=', '0')],
+        [('<', '0.dev0')],
+        [('>=', '2'), ('<', '1')],
+        [('>=', '1'), ('<=', '2')],
+        [('>=', '1'), ('<', '2'), ('!=', '1.5')],
+    ))
+    def test_not_simple(self, specifiers):
+        '''
+        Other specifiers are left to the general path
+        '''
+        assert _convert_simple(specifiers) is None
+        
 class TestInvalidInput(object):
     
     def assert_warns_on(self, specifier, warning, context, caplog):
@@ -0,0 +1,104 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.convert._split
+'''
+
+from collections import OrderedDict
+from lxml import etree
+from pypi_to_0install.convert._group import group_implementations, ungroup_implementation
+from pypi_to_0install.convert._split import SplitSettings, split_feed, sub_feed_names, release_range
+from pypi_to_0install.main import Context, serialize_feed
+from pypi_to_0install.various import zi
+
+_nsmap = {'zi': 'http://zero-install.sourceforge.net/2004/injector/interface'}
+
+context = Context(pypi=None, feeds_uri='https://example.com/', pypi_mirror=None, feed_logger=None)
+
+def feed(*zi_versions):
+    interface = zi.interface(OrderedDict((('uri', context.feed_uri('a')), ('min-injector-version', '0.48'))))
+    interface.append(zi.name('a'))
+    interface.append(zi.summary('summary'))
+    for zi_version in zi_versions:
+        implementation = zi.implementation(OrderedDict((
+            ('id', 'a/a-{}.tar.gz'.format(zi_version)),
+            ('version', zi_version),
+            ('released', '2017-01-01'),
+            ('stability', 'stable'),
+            ('langs', 'en'),
+        )))
+        implementation.append(zi.requires(OrderedDict((('interface', context.feed_uri('b')), ('importance', 'essential')))))
+        interface.append(implementation)
+    group_implementations(interface)
+    return etree.ElementTree(interface)
+
+def versions(feed):
+    return feed.xpath('//zi:implementation/@version', namespaces=_nsmap)
+
+def ungrouped(*feeds):
+    return sorted(
+        etree.tostring(ungroup_implementation(implementation))
+        for feed in feeds
+        for implementation in feed.xpath('//zi:implementation', namespaces=_nsmap)
+    )
+
+_versions = ('0-0.9-4', '0-1-4', '0-1.1-4', '0-2-4', '0-3-4', '0-3.1-4', '1-1-4')
+
+def test_release_range():
+    assert release_range('0-1.5-4') == (0, 1)
+    assert release_range('2-10-0-4') == (2, 10)
+    
+def test_not_split():
+    '''
+    Feeds with few implementations or few release ranges are not split
+    '''
+    feed_ = feed(*_versions)
+    assert split_feed(context, 'a', feed_, SplitSettings()) == (feed_, {})
+    assert split_feed(context, 'a', feed_, SplitSettings(max_implementations=len(_versions))) == (feed_, {})
+    assert split_feed(context, 'a', feed_, SplitSettings(max_implementations=1, recent_ranges=5)) == (feed_, {})
+    
+def test_split():
+    '''
+    Older release ranges move to sub-feeds, referenced from the main feed
+    '''
+    feed_ = feed(*_versions)
+    main_feed, sub_feeds = split_feed(context, 'a', feed_, SplitSettings(max_implementations=3, recent_ranges=2))
+    assert versions(main_feed) == ['0-3-4', '0-3.1-4', '1-1-4']
+    assert list(sub_feeds) == ['a_0-0', 'a_0-1', 'a_0-2']
+    assert sub_feed_names(context, main_feed) == list(sub_feeds)
+    assert main_feed.getroot().get('uri') == context.feed_uri('a')
+    assert main_feed.findtext('zi:summary', namespaces=_nsmap) == 'summary'
+    assert versions(sub_feeds['a_0-1']) == ['0-1-4', '0-1.1-4']
+    for name, sub_feed in sub_feeds.items():
+        root = sub_feed.getroot()
+        assert root.get('uri') == context.feed_uri(name)
+        assert root.findtext('zi:name', namespaces=_nsmap) == 'a'
+        assert root.find('zi:feed-for', namespaces=_nsmap).get('interface') == context.feed_uri('a')
+        
+    # All implementations are kept, with the same requires and attributes
+    assert ungrouped(main_feed, *sub_feeds.values()) == ungrouped(feed_)
+    
+def test_incremental():
+    '''
+    Adding a release to a recent range changes the main feed only
+    '''
+    settings = SplitSettings(max_implementations=3, recent_ranges=2)
+    main_feed, sub_feeds = split_feed(context, 'a', feed(*_versions), settings)
+    new_main_feed, new_sub_feeds = split_feed(context, 'a', feed(*(_versions + ('1-1.1-4',))), settings)
+    assert serialize_feed(new_main_feed) != serialize_feed(main_feed)
+    assert {name: serialize_feed(sub_feed) for name, sub_feed in new_sub_feeds.items()} == {name: serialize_feed(sub_feed) for name, sub_feed in sub_feeds.items()}
@@ -0,0 +1,237 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.state
+'''
+
+import pytest
+import sqlite3
+from pathlib import Path
+from pypi_to_0install.state import State
+
+class Clock(object):
+    
+    def __init__(self):
+        self.time = 0.0
+        
+    def __call__(self):
+        return self.time
+    
+@pytest.fixture
+def state_file(tmpdir):
+    return Path(str(tmpdir)) / 'state.sqlite'
+
+@pytest.fixture
+def state(state_file):
+    state = State.open(state_file)
+    yield state
+    state.close()
+    
+def test_empty(state):
+    assert state.last_serial is None
+    assert len(state) == 0
+    assert state.pending_packages() == {}
+    
+def test_replace_packages(state):
+    '''
+    Replacing the package list keeps the state of remaining packages
+    '''
+    state.replace_packages({'a': 1, 'b': 2, 'c': 3}, 5)
+    assert state.last_serial == 5
+    assert state.pending_packages() == {'a': 1, 'b': 2, 'c': 3}
+    state.mark_converted('a', 1, 'fingerprint_a')
+    state.mark_converted('b', 2, 'fingerprint_b')
+    state.replace_packages({'a': 1, 'b': 6, 'd': 7}, 7)
+    assert state.last_serial == 7
+    assert len(state) == 3
+    assert sorted(state.pypi_names()) == ['a', 'b', 'd']
+    assert state.pending_packages() == {'b': 6, 'd': 7}
+    assert state.fingerprint('a') == 'fingerprint_a'
+    
+def test_apply_changes(state):
+    '''
+    Changes update the serial of changed packages and add new packages
+    '''
+    state.replace_packages({'a': 1, 'b': 2}, 2)
+    state.mark_converted('a', 1, 'fingerprint')
+    state.mark_converted('b', 2, 'fingerprint')
+    state.apply_changes([
+        ('a', '1.0', 0, 'new release', 4),
+        ('c', '1.0', 0, 'create', 3),
+        ('a', '1.0', 0, 'add source file', 5),
+    ], 5)
+    assert state.last_serial == 5
+    assert state.pending_packages() == {'a': 5, 'c': 3}
+    
+def test_apply_changes_remove(state):
+    '''
+    A remove without version removes the package and retires its feed
+    '''
+    state.replace_packages({'a': 1, 'b': 1}, 1)
+    state.mark_converted('a', 1, 'fingerprint')
+    state.set_dependencies('a', ['b'])
+    state.apply_changes([
+        ('a', '1.0', 0, 'remove', 2),  # a release
+        ('a', None, 0, 'remove', 3),
+        ('c', None, 0, 'create', 4),
+        ('c', None, 0, 'remove', 5),
+        ('c', '1.0', 0, 'new release', 6),
+    ], 6)
+    assert sorted(state.pypi_names()) == ['b', 'c']
+    assert state.pending_packages() == {'b': 1, 'c': 6}
+    assert state.dependencies('a') == []
+    assert state.retired_feeds() == ['a', 'c']
+    state.clear_retired_feed('a')
+    assert state.retired_feeds() == ['c']
+
+def test_replace_packages_retires(state):
+    '''
+    Feeds of packages missing from the new package list are retired
+    '''
+    state.replace_packages({'a': 1, 'b': 1}, 1)
+    state.replace_packages({'b': 1}, 2)
+    assert state.retired_feeds() == ['a']
+
+def test_failures(state):
+    '''
+    Failures are counted until the package is converted
+    '''
+    state.replace_packages({'a': 1}, 1)
+    assert state.failures('a') == 0
+    assert state.add_failure('a', 1, 'error1') == 1
+    assert state.add_failure('a', 1, 'error2') == 2
+    state.mark_converted('a', 1, 'fingerprint')
+    assert state.failures('a') == 0
+    
+def test_quarantine(state):
+    '''
+    Packages which failed too often at their current serial are quarantined
+    '''
+    state.replace_packages({'a': 1, 'b': 1}, 1)
+    state.add_failure('a', 1, 'error1')
+    assert state.pending_packages(quarantine_after=2) == {'a': 1, 'b': 1}
+    state.add_failure('a', 1, 'error2')
+    assert state.pending_packages(quarantine_after=2) == {'b': 1}
+    assert state.pending_packages() == {'a': 1, 'b': 1}
+    assert state.quarantined_packages(2) == {'a': 'error2'}
+    
+    # When it changes, it is no longer quarantined
+    state.apply_changes([('a', '2.0', 0, 'new release', 2)], 2)
+    assert state.pending_packages(quarantine_after=2) == {'a': 2, 'b': 1}
+    assert state.quarantined_packages(2) == {}
+    
+    # and failures are counted anew
+    assert state.add_failure('a', 2, 'error3') == 1
+    assert state.pending_packages(quarantine_after=2) == {'a': 2, 'b': 1}
+    assert state.add_failure('a', 2, 'error4') == 2
+    assert state.pending_packages(quarantine_after=2) == {'b': 1}
+
+def test_durations(state):
+    state.replace_packages({'a': 1, 'b': 1}, 1)
+    state.set_duration('a', 2.0)
+    assert state.durations() == {'a': 2.0}
+    
+def test_distribution_results(state):
+    state.set_distribution_result('a', 'a/a-1.tar.gz', 'converted')
+    state.set_distribution_result('a', 'a/a-1.whl', 'skipped')
+    state.set_distribution_result('b', 'b/b-1.tar.gz', 'converted')
+    state.set_distribution_result('a', 'a/a-1.tar.gz', 'reused')
+    assert state.distribution_results('a') == {'a/a-1.tar.gz': 'reused', 'a/a-1.whl': 'skipped'}
+    
+def test_batched_commits(state_file):
+    '''
+    Writes are committed once commit_interval has passed
+    '''
+    clock = Clock()
+    state = State.open(state_file, commit_interval=10.0, clock=clock)
+    state.replace_packages({'a': 1, 'b': 1}, 1)
+    
+    def converted_serials():
+        with sqlite3.connect(str(state_file)) as connection:
+            return dict(connection.execute('SELECT pypi_name, converted_serial FROM package'))
+        
+    state.mark_converted('a', 1, 'fingerprint')
+    assert converted_serials() == {'a': None, 'b': None}
+    clock.time = 10.0
+    state.mark_converted('b', 1, 'fingerprint')
+    assert converted_serials() == {'a': 1, 'b': 1}
+    state.close()
+    
+def test_persistent(state_file):
+    state = State.open(state_file)
+    state.replace_packages({'a': 1}, 1)
+    state.mark_converted('a', 1, 'fingerprint')
+    state.close()
+    state = State.open(state_file)
+    assert state.last_serial == 1
+    assert len(state) == 1
+    assert state.pending_packages() == {}
+    state.close()
+    
+class TestDependencies(object):
+    
+    def test_set_dependencies(self, state):
+        '''
+        Setting dependencies replaces the previous ones
+        '''
+        state.replace_packages({'a': 1, 'b': 2}, 2)
+        state.set_dependencies('a', ['b', 'c'])
+        state.set_dependencies('a', ['b', 'd'])
+        assert state.dependencies('a') == ['b', 'd']
+        assert state.dependencies('b') == []
+        
+    def test_dependents(self, state):
+        state.replace_packages({'a': 1, 'b': 2, 'Some_Name': 3}, 3)
+        state.set_dependencies('a', ['some-name'])
+        state.set_dependencies('b', ['some-name', 'a'])
+        assert state.dependents('some-name') == ['a', 'b']
+        assert state.dependents('a') == ['b']
+        assert state.dependents('b') == []
+        assert state.dependent_counts() == {'Some_Name': 2, 'a': 1}
+        
+    def test_dangling_dependencies(self, state):
+        '''
+        Dependencies without a package are dangling
+        '''
+        state.replace_packages({'a': 1, 'b': 2}, 2)
+        state.set_dependencies('a', ['b', 'gone'])
+        state.set_dependencies('b', ['gone', 'missing'])
+        assert state.dangling_dependencies() == {'gone': ['a', 'b'], 'missing': ['b']}
+        
+    def test_removed_package(self, state):
+        '''
+        When a package is removed, so are its dependencies and it becomes a
+        dangling dependency of its dependents
+        '''
+        state.replace_packages({'a': 1, 'b': 2}, 2)
+        state.set_dependencies('a', ['b'])
+        state.set_dependencies('b', ['a'])
+        state.replace_packages({'a': 1}, 3)
+        assert state.dependencies('b') == []
+        assert state.dangling_dependencies() == {'b': ['a']}
+        
+    def test_apply_changes(self, state):
+        '''
+        Packages added by the changelog can be depended upon
+        '''
+        state.replace_packages({'a': 1}, 1)
+        state.set_dependencies('a', ['new-package'])
+        assert state.dangling_dependencies() == {'new-package': ['a']}
+        state.apply_changes([('New.Package', '1.0', 0, 'new release', 2)], 2)
+        assert state.dangling_dependencies() == {}
+        assert state.dependent_counts() == {'New.Package': 1}
@@ -0,0 +1,182 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+from pypi_to_0install.throttle import TokenBucket, ThrottledPyPI, ThrottleSettings, is_throttled
+from xmlrpc.server import SimpleXMLRPCServer
+from xmlrpc.client import ServerProxy, Fault
+import threading
+import pytest
+
+class FakeTime(object):
+    
+    def __init__(self):
+        self.now = 0.0
+        
+    def clock(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.now += seconds
+        
+@pytest.fixture
+def fake_time():
+    return FakeTime()
+
+@pytest.fixture
+def server():
+    '''
+    Stub XML-RPC server which throttles calls while `throttling`
+    '''
+    server = SimpleXMLRPCServer(('127.0.0.1', 0), logRequests=False, allow_none=True)
+    server.throttling = 0  # number of next calls to throttle
+    server.calls = 0
+    def package_releases(pypi_name, show_hidden=False):
+        server.calls += 1
+        if server.throttling:
+            server.throttling -= 1
+            raise Fault(-32500, 'HTTPTooManyRequests: Too many requests')
+        return ['1.0']
+    def release_data(pypi_name, version):
+        raise Fault(1, 'Other fault')
+    server.register_function(package_releases)
+    server.register_function(release_data)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+    
+@pytest.fixture
+def pypi(server):
+    return ServerProxy('http://127.0.0.1:{}'.format(server.server_address[1]))
+
+def test_token_bucket(fake_time):
+    '''
+    After the burst, tokens are given out at the rate
+    '''
+    bucket = TokenBucket(2.0, burst=2, clock=fake_time.clock, sleep=fake_time.sleep)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert fake_time.now == pytest.approx(0.5)
+    bucket.rate = 1.0
+    assert bucket.acquire() == pytest.approx(1.0)
+    bucket.drain()
+    fake_time.now += 0.25
+    assert bucket.acquire() == pytest.approx(0.75)
+    
+def test_is_throttled():
+    assert is_throttled(Fault(-32500, 'HTTPTooManyRequests: Too many requests'))
+    assert not is_throttled(Fault(1, 'Other fault'))
+    assert not is_throttled(ValueError())
+    
+class TestThrottledPyPI(object):
+    
+    def create(self, pypi, fake_time, **settings):
+        settings = ThrottleSettings(**dict(dict(rate=4.0, limit=2.0, max_limit=8.0), **settings))
+        return ThrottledPyPI(pypi, settings, clock=fake_time.clock, sleep=fake_time.sleep)
+    
+    def test_increase(self, pypi, fake_time):
+        '''
+        Rate and limit increase while calls succeed, up to their max
+        '''
+        throttled = self.create(pypi, fake_time, max_rate=5.0)
+        for _ in range(20):
+            assert throttled.package_releases('pkg') == ['1.0']
+        metrics = throttled.metrics()
+        assert metrics['rate'] == 5.0
+        assert 2.0 < metrics['limit'] <= 8.0
+        assert metrics['calls'] == 20
+        assert metrics['throttled'] == 0
+        assert metrics['in_flight'] == 0
+        assert fake_time.now > 0  # paced after the burst
+        
+    def test_throttled(self, pypi, server, fake_time):
+        '''
+        When throttled, rate and limit are halved and the call is retried
+        '''
+        throttled = self.create(pypi, fake_time)
+        server.throttling = 2
+        assert throttled.package_releases('pkg') == ['1.0']
+        assert server.calls == 3
+        metrics = throttled.metrics()
+        assert metrics['throttled'] == 2
+        assert metrics['rate'] == pytest.approx(4.0 / 4 + 0.5)  # halved twice, then increased by the success
+        assert metrics['limit'] == 2.0  # halved to the min of 1, then increased
+        assert metrics['waited'] > 0  # the retries waited for the decreased rate
+        
+    def test_throttled_too_often(self, pypi, server, fake_time):
+        '''
+        When throttled on each attempt, the fault is raised
+        '''
+        throttled = self.create(pypi, fake_time, attempts=2)
+        server.throttling = 2
+        with pytest.raises(Fault):
+            throttled.package_releases('pkg')
+        assert server.calls == 2
+        assert throttled.rate == 1.0
+        
+    def test_other_fault(self, pypi, fake_time):
+        '''
+        Other faults are raised without retrying or decreasing
+        '''
+        throttled = self.create(pypi, fake_time)
+        with pytest.raises(Fault):
+            throttled.release_data('pkg', '1.0')
+        assert throttled.rate == 4.0
+        assert throttled.metrics()['in_flight'] == 0
+        
+    def test_slow(self, fake_time):
+        '''
+        Slow calls decrease rate and limit
+        '''
+        class SlowPyPI(object):
+            def package_releases(self, pypi_name):
+                fake_time.now += 10
+                return []
+        throttled = self.create(SlowPyPI(), fake_time, max_latency=5.0)
+        throttled.package_releases('pkg')
+        assert throttled.rate == 2.0
+        assert throttled.limit == 1.0
+        assert throttled.slow == 1
+        
+    def test_throttled_concurrently(self, fake_time):
+        '''
+        Calls which started before the last decrease do not decrease again
+        '''
+        class NestedPyPI(object):
+            def package_releases(self, pypi_name):
+                if pypi_name == 'outer':
+                    fake_time.now += 1
+                    with pytest.raises(Fault):
+                        throttled.package_releases('inner')  # starts after outer, is throttled before it
+                raise Fault(-32500, 'HTTPTooManyRequests: Too many requests')
+        throttled = self.create(NestedPyPI(), fake_time, attempts=1)
+        with pytest.raises(Fault):
+            throttled.package_releases('outer')
+        assert throttled.throttled == 2
+        assert throttled.rate == 2.0  # halved once
+        assert throttled.limit == 1.0
+        
+    def test_initial_limit_clamped(self, pypi, fake_time):
+        '''
+        Initial rate and limit do not exceed their max
+        '''
+        throttled = self.create(pypi, fake_time, rate=10.0, max_rate=5.0, limit=2.0, max_limit=1.0)
+        assert throttled.rate == 5.0
+        assert throttled.limit == 1.0
@@ -23,7 +23,7 @@ import pytest
 import numpy as np
 from packaging.version import parse as py_parse_version
 from zeroinstall.injector.versions import parse_version as zi_parse_version
-from pypi_to_0install.convert._version import InvalidVersion, parse_version
+from pypi_to_0install.convert._version import InvalidVersion, parse_version, sort_versions
 from chicken_turtle_util import iterable
 from .common import convert_version
 
@@ -103,5 +103,54 @@ def test_local_version():
         parse_version('1+local')
     assert ex.value.args[0] == "Got local version: '1+local'. Should be public version"
     
+class TestSortVersions(object):
+    
+    def test_order(self, versions):
+        '''
+        sort_versions sorts the same as sorting by parse_version
+        '''
+        versions = sorted(versions)
+        expected = sorted(versions, key=parse_version)
+        actual = sort_versions(versions)
+        assert actual.sorted == expected
+        assert actual.max == max(versions, key=parse_version)
+        assert actual.invalid == {}
+        
+    def test_release_lengths(self):
+        '''
+        Releases of different length are ordered like parse_version
+        '''
+        versions = ['1.1.1', '1', '1.0.1', '1.1', '0.9.9.9', '2']
+        assert sort_versions(versions).sorted == sorted(versions, key=parse_version)
+        
+    def test_equal_versions(self):
+        '''
+        Equal versions are ordered by their string
+        '''
+        assert sort_versions(['1.0', '1', '1.0.0']).sorted == ['1', '1.0', '1.0.0']
+        
+    def test_invalid(self):
+        '''
+        Invalid versions are returned, not raised
+        '''
+        actual = sort_versions(['2', 'foobar', '1', '1+local'])
+        assert actual.sorted == ['1', '2']
+        assert actual.invalid == {
+            'foobar': "Got: 'foobar'. Should be valid (public) PEP440 version",
+            '1+local': "Got local version: '1+local'. Should be public version",
+        }
+        
+    def test_empty(self):
+        actual = sort_versions(['foobar'])
+        assert actual.sorted == []
+        assert actual.max is None
+        
+    def test_large_numbers(self):
+        '''
+        Release components which do not fit in 64 bits are sorted correctly
+        '''
+        versions = ['1.{}'.format(2**70), '1.{}'.format(2**64), '1.1']
+        assert sort_versions(versions).sorted == ['1.1', '1.{}'.format(2**64), '1.{}'.format(2**70)]
+        
 #TODO check whether above tests are fairly complete
 #TODO test response to various invalid versions
\ No newline at end of file
@@ -0,0 +1,121 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Test pypi_to_0install.workspace
+'''
+
+import pytest
+from pathlib import Path
+from pypi_to_0install.workspace import Workspace, WorkspaceFull
+
+@pytest.fixture
+def root(tmpdir):
+    return Path(str(tmpdir)) / 'scratch'
+
+def test_reuse(root):
+    '''
+    Directories are wiped and reused
+    '''
+    workspace = Workspace(root)
+    with workspace.directory() as directory:
+        (directory / 'sub').mkdir()
+        (directory / 'sub' / 'file').write_bytes(b'data')
+        (directory / 'file').write_bytes(b'data')
+    assert list(directory.iterdir()) == []
+    with workspace.directory() as directory2:
+        assert directory2 == directory
+        with workspace.directory() as directory3:
+            assert directory3 != directory
+            
+def test_wipe_on_exception(root):
+    workspace = Workspace(root)
+    with pytest.raises(ValueError):
+        with workspace.directory() as directory:
+            (directory / 'file').write_bytes(b'data')
+            raise ValueError()
+    assert list(directory.iterdir()) == []
+    
+def test_close(root):
+    workspace = Workspace(root)
+    with workspace.directory():
+        pass
+    workspace.close()
+    assert list(root.iterdir()) == []
+    
+def test_remove_stale(root):
+    '''
+    Directories of processes which no longer run are removed
+    '''
+    root.mkdir()
+    stale = root / 'worker-999999999-1'
+    stale.mkdir()
+    (stale / 'file').write_bytes(b'data')
+    Workspace(root)
+    assert not stale.exists()
+    
+class Clock(object):
+    
+    def __init__(self):
+        self.time = 0.0
+        
+    def __call__(self):
+        return self.time
+    
+    def sleep(self, duration):
+        self.time += duration
+        
+def test_max_usage(root):
+    '''
+    Wait while usage is at or above the cap, give up after the timeout
+    '''
+    clock = Clock()
+    workspace = Workspace(root, max_usage=4, timeout=10, clock=clock, sleep=clock.sleep)
+    (root / 'other').write_bytes(b'data')
+    with pytest.raises(WorkspaceFull):
+        with workspace.directory():
+            pass
+    assert clock.time == 10
+    
+    # Usage drops while waiting
+    def sleep(duration):
+        (root / 'other').unlink()
+    workspace = Workspace(root, max_usage=4, clock=clock, sleep=sleep)
+    (root / 'other').write_bytes(b'data')
+    with workspace.directory() as directory:
+        assert directory.exists()
+    assert workspace.usage() == 0
+
+def test_usage_measured_per_poll_interval(root):
+    '''
+    Borrows within a poll interval reuse the last usage measurement
+    '''
+    clock = Clock()
+    def sleep(duration):
+        (root / 'other').unlink()
+        clock.sleep(duration)
+    workspace = Workspace(root, max_usage=4, poll_interval=1, clock=clock, sleep=sleep)
+    with workspace.directory():
+        pass
+    (root / 'other').write_bytes(b'data')
+    with workspace.directory():
+        pass
+    assert clock.time == 0  # did not measure, so did not wait
+    clock.time += 1
+    with workspace.directory():
+        pass
+    assert clock.time == 2  # measured and waited for the usage to drop
@@ -0,0 +1,289 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Adaptive throttling of calls to PyPI
+
+PyPI rejects bursts of calls. Calls are paced by a token bucket and the
+number of concurrent calls is limited. Both the rate and the concurrency limit
+adapt AIMD-style (additive increase, multiplicative decrease): they grow slowly
+while calls succeed quickly and are cut back when PyPI throttles or slows down.
+'''
+
+from xmlrpc.client import Fault, ProtocolError
+import urllib.error
+import threading
+import logging
+import time
+import attr
+
+logger = logging.getLogger(__name__)
+
+def is_throttled(exception):
+    '''
+    Whether exception means the server rejected the call due to load
+    '''
+    if isinstance(exception, Fault):
+        return 'TooManyRequests' in exception.faultString
+    elif isinstance(exception, ProtocolError):
+        return exception.errcode in (429, 503)
+    elif isinstance(exception, urllib.error.HTTPError):
+        return exception.code in (429, 503)
+    return False
+
+class TokenBucket(object):
+    
+    '''
+    Token bucket, paces calls to a rate
+    
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second
+    burst : float
+        Maximum number of tokens in the bucket
+    clock : () -> float
+        Monotonic clock in seconds
+    sleep : (float) -> None
+    '''
+    
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self._rate = rate
+        self._burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._time = clock()  # when tokens was last updated
+    
+    @property
+    def rate(self):
+        return self._rate
+    
+    @rate.setter
+    def rate(self, rate):
+        with self._lock:
+            self._refill()
+            self._rate = rate
+    
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self._burst, self._tokens + (now - self._time) * self._rate)
+        self._time = now
+    
+    def drain(self):
+        '''
+        Remove all tokens
+        '''
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+    
+    def acquire(self):
+        '''
+        Take a token, wait for one if the bucket is empty
+        
+        The token is reserved before waiting, so concurrent callers wait in
+        turn.
+        
+        Returns
+        -------
+        float
+            Seconds waited
+        '''
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            delay = max(0.0, -self._tokens / self._rate)
+        if delay:
+            self._sleep(delay)
+        return delay
+
+@attr.s(frozen=True)
+class ThrottleSettings(object):
+    
+    '''
+    Settings of ThrottledPyPI
+    '''
+    
+    rate = attr.ib(default=5.0)  # float, initial calls per second
+    min_rate = attr.ib(default=0.2)  # float
+    max_rate = attr.ib(default=50.0)  # float
+    rate_increase = attr.ib(default=0.5)  # float, calls per second added per rate's worth of successful calls
+    limit = attr.ib(default=2.0)  # float, initial max concurrent calls
+    max_limit = attr.ib(default=16.0)  # float
+    decrease = attr.ib(default=0.5)  # float, factor to multiply rate and limit with when throttled
+    max_latency = attr.ib(default=5.0)  # float, calls taking longer than this many seconds count as a slow down
+    attempts = attr.ib(default=4)  # int, max calls per call, throttled calls are retried after the decrease
+
+class ThrottledPyPI(object):
+    
+    '''
+    PyPI interface which throttles calls to another PyPI interface
+    
+    Can be used as `Context.pypi`. Calls of any method of `pypi` wait for a
+    token of the token bucket and for the number of calls in progress to drop
+    below the concurrency limit.
+    
+    When a call is throttled (see `is_throttled`) the rate and limit are
+    multiplied by `ThrottleSettings.decrease` and the call is retried, up to
+    `ThrottleSettings.attempts` calls. Slow calls also decrease them, but
+    are not retried. They decrease at most once per congestion event: calls
+    which started before the last decrease were made at the old rate, so
+    their throttling or slowness does not decrease again. Other calls
+    increase the rate by about `ThrottleSettings.rate_increase` per second's
+    worth of calls and the limit by about 1 per limit's worth of calls.
+    
+    Parameters
+    ----------
+    pypi : xmlrpc.client.ServerProxy or JSONPyPI
+    settings : ThrottleSettings
+    clock : () -> float
+        Monotonic clock in seconds
+    sleep : (float) -> None
+    '''
+    
+    def __init__(self, pypi, settings=ThrottleSettings(), clock=time.monotonic, sleep=time.sleep):
+        self._pypi = pypi
+        self._settings = settings
+        self._clock = clock
+        self._limit = min(settings.limit, settings.max_limit)
+        rate = min(settings.rate, settings.max_rate)
+        self._bucket = TokenBucket(rate, burst=max(1.0, self._limit), clock=clock, sleep=sleep)
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._decreased = None  # when rate and limit were last decreased, None if never
+        self.calls = 0  #: number of calls made to pypi
+        self.throttled = 0  #: number of those calls which were throttled
+        self.slow = 0  #: number of those calls which took longer than max_latency
+        self.waited = 0.0  #: total seconds calls waited for a token
+    
+    @property
+    def rate(self):
+        '''
+        Current maximum number of calls per second
+        '''
+        return self._bucket.rate
+    
+    @property
+    def limit(self):
+        '''
+        Current maximum number of concurrent calls
+        '''
+        return self._limit
+    
+    def metrics(self):
+        '''
+        Get current state and counters
+        
+        Returns
+        -------
+        {name :: str : int or float}
+        '''
+        with self._condition:
+            return {
+                'rate': self.rate,
+                'limit': self._limit,
+                'in_flight': self._in_flight,
+                'calls': self.calls,
+                'throttled': self.throttled,
+                'slow': self.slow,
+                'waited': self.waited,
+            }
+    
+    def __getattr__(self, name):
+        method = getattr(self._pypi, name)
+        def call(*args):
+            return self._call(name, method, args)
+        return call
+    
+    def _call(self, name, method, args):
+        for attempt in range(self._settings.attempts):
+            with self._condition:
+                while self._in_flight >= max(1, int(self._limit)):
+                    self._condition.wait()
+                self._in_flight += 1
+            try:
+                waited = self._bucket.acquire()
+                start = self._clock()
+                try:
+                    result = method(*args)
+                except Exception as ex:
+                    if not is_throttled(ex):
+                        raise
+                    self._on_throttled(name, ex, start, waited)
+                    if attempt == self._settings.attempts - 1:
+                        raise
+                    continue
+                self._on_success(start, waited)
+                return result
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify()
+    
+    def _on_throttled(self, name, exception, start, waited):
+        with self._condition:
+            self.calls += 1
+            self.throttled += 1
+            self.waited += waited
+            decreased = self._decrease(start)
+        self._bucket.drain()  # so the retry waits for the decreased rate
+        if decreased:
+            logger.info(
+                'PyPI throttled {}, decreased to {:.2f} calls/s, {:.0f} concurrent: {}'
+                .format(name, self.rate, self._limit, exception)
+            )
+        else:
+            logger.debug('PyPI throttled {}, already decreased: {}'.format(name, exception))
+    
+    def _on_success(self, start, waited):
+        settings = self._settings
+        latency = self._clock() - start
+        with self._condition:
+            self.calls += 1
+            self.waited += waited
+            if latency > settings.max_latency:
+                self.slow += 1
+                self._decrease(start)
+            else:
+                rate = self.rate
+                self._bucket.rate = min(settings.max_rate, rate + settings.rate_increase / rate)
+                self._limit = min(settings.max_limit, self._limit + 1 / self._limit)
+                self._condition.notify_all()
+    
+    def _decrease(self, start):
+        '''
+        Decrease rate and limit, unless already decreased since call started
+        
+        Parameters
+        ----------
+        start : float
+            When the call which got throttled or was slow started
+        
+        Returns
+        -------
+        bool
+            Whether decreased
+        '''
+        if self._decreased is not None and start < self._decreased:
+            return False
+        settings = self._settings
+        self._bucket.rate = max(settings.min_rate, self.rate * settings.decrease)
+        self._limit = max(1.0, self._limit * settings.decrease)
+        self._decreased = self._clock()
+        return True
@@ -16,13 +16,31 @@
 # along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
 
 import re
+import os
 from lxml.builder import ElementMaker
 
 zi_nsmap = {None: 'http://zero-install.sourceforge.net/2004/injector/interface'}
 zi = ElementMaker(namespace=zi_nsmap[None], nsmap=zi_nsmap)
 
+_separators = re.compile(r"[-_.]+")
+
 def canonical_name(pypi_name):
     '''
     Get canonical ZI name
     '''
-    return re.sub(r"[-_.]+", "-", pypi_name).lower()
\ No newline at end of file
+    return _separators.sub("-", pypi_name).lower()
+
+def write_file(path, contents):
+    '''
+    Write file by swapping it with a temporary file
+    
+    This way a file is never left half written.
+    
+    Parameters
+    ----------
+    path : pathlib.Path
+    contents : bytes
+    '''
+    temporary_file = path.with_name(path.name + '.tmp')
+    temporary_file.write_bytes(contents)
+    os.replace(str(temporary_file), str(path))
\ No newline at end of file
@@ -0,0 +1,196 @@
+# Copyright (C) 2017 Tim Diels <timdiels.m@gmail.com>
+# 
+# This file is part of PyPI to 0install.
+# 
+# PyPI to 0install is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# PyPI to 0install is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public License
+# along with PyPI to 0install.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Scratch space for downloading and unpacking distributions
+'''
+
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import tempfile
+import logging
+import shutil
+import time
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+class WorkspaceFull(Exception):
+    
+    '''
+    Workspace usage stayed above its cap for too long
+    '''
+
+class Workspace(object):
+    
+    '''
+    Scratch space, divided in reusable directories, one per worker
+    
+    Each worker borrows a directory with `directory`, which is wiped when it is
+    returned and then handed to the next worker instead of being recreated.
+    Directories are named after the process, so multiple processes can share a
+    root (e.g. a tmpfs); directories left behind by processes which no longer
+    run are removed on creation.
+    
+    Parameters
+    ----------
+    root : pathlib.Path or None
+        Directory to create worker directories in. Defaults to a directory in
+        the system's temporary directory.
+    max_usage : int or None
+        If not None, `directory` waits while the files in `root` take up at
+        least this many bytes. Usage is measured at most once per
+        `poll_interval`, so a borrow rarely has to walk `root`.
+    timeout : float
+        Maximum number of seconds to wait for usage to drop below `max_usage`
+    poll_interval : float
+        Seconds between usage checks while waiting
+    clock : () -> float
+        Monotonic clock in seconds
+    sleep : (float) -> None
+    '''
+    
+    def __init__(self, root=None, max_usage=None, timeout=600.0, poll_interval=1.0, clock=time.monotonic, sleep=time.sleep):
+        if root is None:
+            root = Path(tempfile.gettempdir()) / 'pypi_to_0install'
+        self._root = root
+        self._max_usage = max_usage
+        self._timeout = timeout
+        self._poll_interval = poll_interval
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._usage_lock = threading.Lock()
+        self._usage = None  # (time :: float, usage :: int) of the last measurement, None if none yet
+        self._free = []  # [Path], wiped directories ready for reuse
+        self._count = 0  # number of directories created
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._remove_stale()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exception_type, exception, traceback):
+        self.close()
+    
+    @property
+    def root(self):
+        return self._root
+    
+    def close(self):
+        '''
+        Remove the directories of this workspace
+        '''
+        with self._lock:
+            for directory in self._root.glob('worker-{}-*'.format(os.getpid())):
+                shutil.rmtree(str(directory), ignore_errors=True)
+            self._free = []
+    
+    def _remove_stale(self):
+        for directory in self._root.glob('worker-*'):
+            match = re.fullmatch(r'worker-(\d+)-\d+', directory.name)
+            if match and not _is_running(int(match.group(1))):
+                logger.info('Removing stale scratch directory {}'.format(directory))
+                shutil.rmtree(str(directory), ignore_errors=True)
+    
+    def usage(self):
+        '''
+        Number of bytes taken up by the files in the root
+        '''
+        usage = 0
+        for parent, _, file_names in os.walk(str(self._root)):
+            for name in file_names:
+                try:
+                    usage += os.lstat(os.path.join(parent, name)).st_size
+                except FileNotFoundError:
+                    pass  # removed meanwhile
+        self._usage = (self._clock(), usage)
+        return usage
+    
+    def _recent_usage(self):
+        '''
+        Usage, measured at most once per poll interval
+        '''
+        with self._usage_lock:  # Note: concurrent borrowers wait for one measurement instead of each walking the root
+            if self._usage is None or self._clock() - self._usage[0] >= self._poll_interval:
+                return self.usage()
+            return self._usage[1]
+    
+    def _wait_for_space(self):
+        if self._max_usage is None:
+            return
+        deadline = self._clock() + self._timeout
+        usage = self._recent_usage()
+        if usage >= self._max_usage:
+            logger.info('Scratch space usage is {} bytes, waiting for it to drop below {}'.format(usage, self._max_usage))
+        while usage >= self._max_usage:
+            if self._clock() >= deadline:
+                raise WorkspaceFull(
+                    'Scratch space usage stayed at or above {} bytes for {:.0f}s: {}'
+                    .format(self._max_usage, self._timeout, self._root)
+                )
+            self._sleep(self._poll_interval)
+            usage = self.usage()
+    
+    @contextmanager
+    def directory(self):
+        '''
+        Borrow an empty directory
+        
+        Waits while usage is at or above the cap. The directory is wiped on
+        return, even if an exception is raised.
+        
+        Yields
+        ------
+        pathlib.Path
+        '''
+        self._wait_for_space()
+        with self._lock:
+            if self._free:
+                directory = self._free.pop()
+            else:
+                self._count += 1
+                directory = self._root / 'worker-{}-{}'.format(os.getpid(), self._count)
+                directory.mkdir(exist_ok=True)  # Note: may exist when left behind by an earlier process with the same pid
+                _wipe(directory)
+        try:
+            yield directory
+        finally:
+            _wipe(directory)
+            with self._lock:
+                self._free.append(directory)
+
+def _wipe(directory):
+    '''
+    Remove the contents of directory
+    '''
+    for path in directory.iterdir():
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(str(path))
+        else:
+            path.unlink()
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, but is not ours
+    return True